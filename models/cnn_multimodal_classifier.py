@@ -1,26 +1,28 @@
 from tensorflow.keras import Input, Model, layers
 
-def CNN_multimodal_class(image_shape=(25, 20, 1), categorical_input_shape=(4,)):
+def CNN_multimodal_class(image_shape=(25, 20, 1), categorical_input_shape=(4,),
+                         conv1_filters=16, conv1_kernel=(2, 12), conv2_filters=32, conv2_kernel=(2, 1),
+                         conv_dropout=0.4, dense_units=128, dense_dropout=0.4, cat_units=32, cat_dropout=0.3):
     # Image input branch
     image_input = Input(shape=image_shape, name="image_input")
-    x = layers.Conv2D(filters=16, kernel_size=(2, 12))(image_input)
+    x = layers.Conv2D(filters=conv1_filters, kernel_size=tuple(conv1_kernel))(image_input)
     x = layers.BatchNormalization()(x)
     x = layers.Activation('relu')(x)
-    x = layers.Dropout(0.4)(x)
+    x = layers.Dropout(conv_dropout)(x)
 
-    x = layers.Conv2D(filters=32, kernel_size=(2, 1))(x)
+    x = layers.Conv2D(filters=conv2_filters, kernel_size=tuple(conv2_kernel))(x)
     x = layers.BatchNormalization()(x)
     x = layers.Activation('relu')(x)
     x = layers.MaxPool2D(pool_size=(2, 1), strides=(2, 1))(x)
 
     x = layers.Flatten()(x)
-    x = layers.Dense(128, activation='relu')(x)
-    x = layers.Dropout(0.4)(x)
+    x = layers.Dense(dense_units, activation='relu')(x)
+    x = layers.Dropout(dense_dropout)(x)
 
     # Categorical input branch
     cat_input = Input(shape=categorical_input_shape, name="categorical_input")
-    y = layers.Dense(32, activation='relu')(cat_input)
-    y = layers.Dropout(0.3)(y)
+    y = layers.Dense(cat_units, activation='relu')(cat_input)
+    y = layers.Dropout(cat_dropout)(y)
 
     # Combine both branches
     combined = layers.concatenate([x, y])
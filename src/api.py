@@ -0,0 +1,117 @@
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+import pandas as pd
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from src.autotune import apply_inference_threads
+from src.job_queue import JobQueue, JobWorkerPool
+from src.model_registry import get_registry
+
+
+class JobRequest(BaseModel):
+    peptides: List[str]
+    mhc_classes: Optional[List[str]] = None
+    ids: Optional[List[str]] = None
+    model: Optional[str] = None
+    threshold: Optional[float] = None
+
+
+state = {}
+
+
+@asynccontextmanager
+async def lifespan(app):
+    apply_inference_threads()
+    state['queue'] = JobQueue()
+    state['workers'] = JobWorkerPool(state['queue'])
+    state['workers'].start()
+    yield
+    state['workers'].stop()
+    state['queue'].close()
+
+
+app = FastAPI(title="immuno-ready", lifespan=lifespan)
+
+
+def _status_or_404(job_id):
+    status = state['queue'].status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return status
+
+
+@app.post("/jobs", status_code=202)
+def submit_job(request: JobRequest):
+    """
+    Queues peptides for scoring and returns the job id to poll.
+    """
+    candidates = pd.DataFrame({'peptide': request.peptides})
+    if request.model is not None and request.model not in get_registry().names():
+        raise HTTPException(status_code=404, detail=f"Unknown model {request.model}")
+    for column, values in (('MHC Restriction - Class', request.mhc_classes), ('id', request.ids)):
+        if values is not None:
+            if len(values) != len(request.peptides):
+                raise HTTPException(status_code=422, detail=f"{column} must have one value per peptide")
+            candidates[column] = values
+    return state['queue'].submit(candidates, model_name=request.model, threshold=request.threshold)
+
+
+@app.get("/models")
+def list_models():
+    registry = get_registry()
+    return [registry.info(name) for name in registry.names()]
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    return _status_or_404(job_id)
+
+
+@app.get("/jobs/{job_id}/results")
+def job_results(job_id: str, offset: int = 0, limit: int = 1000):
+    """
+    Returns one page of results; pages are available while the job is still running.
+    """
+    status = _status_or_404(job_id)
+    limit = max(1, min(limit, 10_000))
+    page = state['queue'].results(job_id, offset=offset, limit=limit)
+    next_offset = offset + len(page)
+    return {
+        'status': status['status'],
+        'offset': offset,
+        'next_offset': next_offset if next_offset < status['n_rows'] else None,
+        'results': page.astype(object).where(page.notna(), None).to_dict(orient='records')
+    }
+
+
+@app.get("/jobs/{job_id}/download")
+def download_results(job_id: str, page_size: int = 10_000):
+    """
+    Streams all results of a finished job as CSV, reading them page by page.
+    """
+    status = _status_or_404(job_id)
+    if status['status'] != 'done':
+        raise HTTPException(status_code=409, detail=f"Job is {status['status']}")
+
+    def pages():
+        offset = 0
+        while True:
+            page = state['queue'].results(job_id, offset=offset, limit=page_size)
+            if page.empty:
+                return
+            yield page.to_csv(index=False, header=(offset == 0))
+            offset += len(page)
+
+    return StreamingResponse(pages(), media_type="text/csv",
+                             headers={'Content-Disposition': f'attachment; filename="{job_id}.csv"'})
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    _status_or_404(job_id)
+    if not state['queue'].cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job already finished")
+    return _status_or_404(job_id)
@@ -0,0 +1,135 @@
+import numpy as np
+import tensorflow as tf
+
+from src.scoring import deduplicate_inputs, encode_inputs, score_candidates
+
+
+ATTRIBUTION_METHODS = ['integrated_gradients', 'occlusion']
+
+
+def _first_output(outputs):
+    # Ensembles return (mean, variance); attributions explain the mean
+    return outputs[0] if isinstance(outputs, (list, tuple)) else outputs
+
+
+def integrated_gradients(model, inputs, steps=32, max_batch=8192):
+    """
+    Integrated gradients of the predicted probability with respect to the peptide
+    embedding, summed over the feature axis into one value per position.
+
+    The baseline is the all-zero embedding used for padding. For each chunk of
+    peptides, all `steps` interpolation points of all peptides are evaluated as one
+    batch with a single gradient computation (midpoint Riemann sum).
+
+    Parameters:
+        model (keras.Model): Trained model.
+        inputs (list of np.ndarray): [embeddings (n, 25, 20, 1), categorical features (n, 4)].
+        steps (int): Interpolation steps per peptide.
+        max_batch (int): Maximum number of interpolated inputs per batch.
+
+    Returns:
+        np.ndarray: Float32 attributions of shape (n, 25). Padding positions get 0,
+        and each row sums approximately to the score minus the baseline score.
+    """
+    X, X_cat = inputs
+    n, length = X.shape[0], X.shape[1]
+    chunk = max(1, max_batch // steps)
+    alphas = tf.constant((np.arange(steps) + 0.5) / steps, dtype=tf.float32)
+    attributions = np.zeros((n, length), dtype=np.float32)
+
+    @tf.function(reduce_retracing=True)
+    def chunk_attributions(x, x_cat):
+        b = tf.shape(x)[0]
+        # (steps, b, 25, 20, 1) -> (steps * b, 25, 20, 1)
+        interpolated = tf.reshape(alphas[:, None, None, None, None] * x[None], tf.concat([[-1], tf.shape(x)[1:]], 0))
+        categorical = tf.tile(x_cat, [steps, 1])
+        with tf.GradientTape() as tape:
+            tape.watch(interpolated)
+            probs = _first_output(model([interpolated, categorical], training=False))
+        gradients = tape.gradient(probs, interpolated)
+        mean_gradients = tf.reduce_mean(tf.reshape(gradients, tf.concat([[steps, b], tf.shape(x)[1:]], 0)), axis=0)
+        return tf.reduce_sum(mean_gradients * x, axis=[2, 3])
+
+    for start in range(0, n, chunk):
+        x = tf.constant(np.asarray(X[start:start + chunk], dtype=np.float32))
+        x_cat = tf.constant(np.asarray(X_cat[start:start + chunk], dtype=np.float32))
+        attributions[start:start + chunk] = chunk_attributions(x, x_cat).numpy()
+    return attributions
+
+
+def occlusion(model, inputs, window=1, max_batch=8192):
+    """
+    Occlusion attributions: the drop in predicted probability when a window of
+    positions is replaced by the zero (padding) embedding.
+
+    For each chunk of peptides, the original inputs and every occluded variant
+    (one per position) are scored as one batch. With `window` > 1, the drop of each
+    window is spread evenly over the positions it covers.
+
+    Parameters:
+        model (keras.Model): Trained model.
+        inputs (list of np.ndarray): [embeddings (n, 25, 20, 1), categorical features (n, 4)].
+        window (int): Number of consecutive positions occluded together.
+        max_batch (int): Maximum number of inputs per batch.
+
+    Returns:
+        np.ndarray: Float32 attributions of shape (n, 25); padding positions get 0.
+    """
+    X, X_cat = inputs
+    n, length = X.shape[0], X.shape[1]
+    n_windows = length - window + 1
+    # masks[0] keeps everything; masks[1 + w] zeroes positions w .. w + window - 1
+    masks = np.ones((n_windows + 1, length), dtype=np.float32)
+    for w in range(n_windows):
+        masks[1 + w, w:w + window] = 0
+    coverage = np.zeros((n_windows, length), dtype=np.float32)
+    for w in range(n_windows):
+        coverage[w, w:w + window] = 1.0 / window
+
+    chunk = max(1, max_batch // (n_windows + 1))
+    attributions = np.zeros((n, length), dtype=np.float32)
+    for start in range(0, n, chunk):
+        x = np.asarray(X[start:start + chunk], dtype=np.float32)
+        x_cat = np.asarray(X_cat[start:start + chunk], dtype=np.float32)
+        b = len(x)
+        variants = (x[:, None] * masks[None, :, :, None, None]).reshape((-1,) + x.shape[1:])
+        probs = _first_output(model([variants, np.repeat(x_cat, n_windows + 1, axis=0)], training=False))
+        probs = np.asarray(probs).reshape(b, n_windows + 1)
+        attributions[start:start + b] = (probs[:, :1] - probs[:, 1:]) @ coverage
+    return attributions
+
+
+def attribute_candidates(model, data_frame, method='integrated_gradients', threshold=0.4,
+                         tokenizer='AA_index_tokenizer', steps=32, window=1, max_batch=8192, **scoring_kwargs):
+    """
+    Scores candidate peptides (see `score_candidates`) and computes per-position
+    attributions for the valid ones.
+
+    Each distinct (peptide, MHC class, mhc_status) input is attributed once.
+    Position i of a row is residue i of its peptide (embeddings are padded at the
+    end), so positions past the peptide length are 0.
+
+    Parameters:
+        method (str): 'integrated_gradients' or 'occlusion'.
+        steps (int): Interpolation steps for integrated gradients.
+        window (int): Occlusion window for occlusion.
+
+    Returns:
+        tuple: (scored DataFrame, float32 array of shape (n_rows, 25) aligned with it,
+        NaN for invalid peptides)
+    """
+    if method not in ATTRIBUTION_METHODS:
+        raise ValueError(f"Unknown attribution method '{method}'. Use one of {ATTRIBUTION_METHODS}.")
+
+    scored = score_candidates(model, data_frame, threshold=threshold, tokenizer=tokenizer, **scoring_kwargs)
+    valid = scored['valid'].to_numpy(dtype=bool)
+    attributions = np.full((len(scored), 25), np.nan, dtype=np.float32)
+    if valid.any():
+        unique_df, inverse = deduplicate_inputs(scored[valid])
+        inputs = encode_inputs(unique_df, tokenizer)
+        if method == 'integrated_gradients':
+            unique_attributions = integrated_gradients(model, inputs, steps=steps, max_batch=max_batch)
+        else:
+            unique_attributions = occlusion(model, inputs, window=window, max_batch=max_batch)
+        attributions[valid] = unique_attributions[inverse]
+    return scored, attributions
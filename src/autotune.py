@@ -0,0 +1,293 @@
+import json
+import math
+import multiprocessing
+import os
+import time
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from src.config import INFERENCE_PROFILE_FILE, AUTOTUNE_BATCH_SIZES
+
+
+# Used when no profile has been written (None: TensorFlow / driver default)
+DEFAULT_INFERENCE_PROFILE = {
+    'batch_size': 1024,
+    'n_workers': None,
+    'intra_op_threads': None,
+    'inter_op_threads': None
+}
+WARMUP_CALLS = 3
+MIN_TIMED_CALLS = 30
+MIN_TIMED_ROWS = 16_384
+
+
+def _powers_of_two(limit):
+    values = [1 << i for i in range(int(math.log2(limit)) + 1)] if limit >= 1 else []
+    return values + [limit] if values and values[-1] != limit else values
+
+
+def autotune_grid(n_cpus=None, worker_counts=None, inter_op_threads=(1, 2)):
+    """
+    Thread configurations to benchmark on a node with `n_cpus` cores.
+
+    Worker counts and intra-op threads per worker are powers of two (plus the exact
+    share of the cores), and only combinations that fit on the node without
+    oversubscription (`n_workers * intra_op_threads <= n_cpus`) are kept.
+
+    Returns:
+        list of dict: 'n_workers', 'intra_op_threads' and 'inter_op_threads'.
+    """
+    n_cpus = n_cpus or os.cpu_count() or 1
+    worker_counts = worker_counts or _powers_of_two(n_cpus)
+    return [{'n_workers': n_workers, 'intra_op_threads': intra, 'inter_op_threads': inter}
+            for n_workers in worker_counts
+            for intra in _powers_of_two(n_cpus // n_workers)
+            for inter in inter_op_threads]
+
+
+def synthetic_inputs(n_rows, tokenizer='AA_index_tokenizer', seed=0):
+    """
+    Random valid candidates (8-25 residues, class I/II, both mhc_status values),
+    tokenized and encoded like real ones.
+
+    Returns:
+        list of np.ndarray: [peptide embeddings, categorical features]
+    """
+    from src.scoring import encode_inputs
+
+    rng = np.random.default_rng(seed)
+    residues = np.array(list("ACDEFGHIKLMNPQRSTVWY"))
+    lengths = rng.integers(8, 26, size=n_rows)
+    candidates = pd.DataFrame({
+        'Epitope - Name': [''.join(rng.choice(residues, size=length)) for length in lengths],
+        'MHC Restriction - Class': rng.choice(['I', 'II'], size=n_rows),
+        'mhc_status': rng.choice(['peptide not shared', 'peptide shared in MHC I and II'], size=n_rows)
+    })
+    return encode_inputs(candidates, tokenizer)
+
+
+def _benchmark_worker(model_path, config, inputs, batch_sizes, barrier, results, worker_id):
+    """
+    Times the model in one process with the thread settings of `config`. Workers of
+    the same configuration start each batch size together, so they compete for the
+    cores as they would in production.
+    """
+    try:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(config['intra_op_threads'])
+        tf.config.threading.set_inter_op_parallelism_threads(config['inter_op_threads'])
+        from src.model_registry import _load_keras_model
+
+        model = _load_keras_model(model_path)
+        run = model.predict_on_batch if hasattr(model, 'predict_on_batch') else model.predict
+        timings = {}
+        for batch_size in batch_sizes:
+            batch = [inputs[0][:batch_size], inputs[1][:batch_size]]
+            for _ in range(WARMUP_CALLS):
+                run(batch)
+            n_calls = max(MIN_TIMED_CALLS, math.ceil(MIN_TIMED_ROWS / batch_size))
+            latencies = np.empty(n_calls)
+            barrier.wait()
+            start = time.perf_counter()
+            for i in range(n_calls):
+                call_start = time.perf_counter()
+                run(batch)
+                latencies[i] = time.perf_counter() - call_start
+            timings[batch_size] = (time.perf_counter() - start, latencies)
+        results.put((worker_id, timings))
+    except Exception as error:
+        barrier.abort()
+        results.put((worker_id, error))
+
+
+def benchmark_configuration(model_path, config, inputs, batch_sizes=AUTOTUNE_BATCH_SIZES):
+    """
+    Benchmarks one thread configuration, with `config['n_workers']` processes each
+    running the model on every batch size.
+
+    Returns:
+        list of dict: One row per batch size with the node throughput (rows/s over
+        all workers) and the p50/p99 latency of one batch, in milliseconds.
+    """
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(config['n_workers'])
+    results = context.Queue()
+    workers = [context.Process(target=_benchmark_worker,
+                               args=(model_path, config, inputs, batch_sizes, barrier, results, i))
+               for i in range(config['n_workers'])]
+    for worker in workers:
+        worker.start()
+    timings = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    for _, result in timings:
+        if isinstance(result, Exception):
+            raise RuntimeError(f"Benchmark of {config} failed") from result
+
+    rows = []
+    for batch_size in batch_sizes:
+        elapsed = max(result[batch_size][0] for _, result in timings)
+        latencies = np.concatenate([result[batch_size][1] for _, result in timings])
+        rows.append({
+            **config,
+            'batch_size': batch_size,
+            'throughput': len(latencies) * batch_size / elapsed,
+            'p50_ms': float(np.percentile(latencies, 50) * 1000),
+            'p99_ms': float(np.percentile(latencies, 99) * 1000)
+        })
+    return rows
+
+
+def select_profile(results, max_p99_ms=None):
+    """
+    Picks the configuration with the highest throughput among those whose p99
+    batch latency is within `max_p99_ms` (the lowest-latency one if none is).
+    """
+    results = pd.DataFrame(results)
+    eligible = results if max_p99_ms is None else results[results['p99_ms'] <= max_p99_ms]
+    if eligible.empty:
+        print(f"⚠️ No configuration meets p99 <= {max_p99_ms} ms, using the lowest-latency one")
+        best = results.loc[results['p99_ms'].idxmin()]
+    else:
+        best = eligible.loc[eligible['throughput'].idxmax()]
+    return {
+        'batch_size': int(best['batch_size']),
+        'n_workers': int(best['n_workers']),
+        'intra_op_threads': int(best['intra_op_threads']),
+        'inter_op_threads': int(best['inter_op_threads']),
+        'throughput': float(best['throughput']),
+        'p99_ms': float(best['p99_ms'])
+    }
+
+
+def autotune(model_name=None, batch_sizes=AUTOTUNE_BATCH_SIZES, worker_counts=None, inter_op_threads=(1, 2),
+             max_p99_ms=None, profile_path=INFERENCE_PROFILE_FILE):
+    """
+    Benchmarks a registered model over batch sizes, TensorFlow thread pools and
+    worker processes on this node, and writes the fastest setting as the inference
+    profile.
+
+    Every thread configuration runs in fresh processes (TensorFlow fixes its thread
+    pools when it starts), on synthetic tokenized candidates. The profile is read at
+    startup by the scorer (batch size), the batch drivers (workers and threads) and
+    the API (threads), see `load_inference_profile`.
+
+    Parameters:
+        model_name (str): Registered model (see `get_registry`; default model if None).
+        batch_sizes (sequence of int): Batch sizes to try.
+        worker_counts (sequence of int): Worker processes to try (default: powers of
+            two up to the number of cores).
+        inter_op_threads (sequence of int): Inter-op thread counts to try.
+        max_p99_ms (float): Latency budget for one batch; faster settings above it are skipped.
+        profile_path (str): Where to write the profile.
+
+    Returns:
+        tuple: (profile dict, pd.DataFrame of all benchmarked settings)
+    """
+    from src.model_registry import get_registry
+
+    info = get_registry().info(model_name)
+    n_cpus = os.cpu_count() or 1
+    grid = autotune_grid(n_cpus, worker_counts, inter_op_threads)
+    inputs = synthetic_inputs(max(batch_sizes), info['tokenizer'])
+    print(f"⏱️ Benchmarking '{info['name']}' on {n_cpus} cores: {len(grid)} thread settings x "
+          f"{len(batch_sizes)} batch sizes")
+
+    results = []
+    for config in grid:
+        rows = benchmark_configuration(info['path'], config, inputs, batch_sizes)
+        results.extend(rows)
+        best = max(rows, key=lambda row: row['throughput'])
+        print(f"  {config['n_workers']} workers x {config['intra_op_threads']}+{config['inter_op_threads']} threads: "
+              f"{best['throughput']:.0f} rows/s at batch {best['batch_size']} (p99 {best['p99_ms']:.1f} ms)")
+
+    profile = select_profile(results, max_p99_ms)
+    profile.update({
+        'model': info['name'],
+        'model_hash': info['model_hash'],
+        'n_cpus': n_cpus,
+        'max_p99_ms': max_p99_ms,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'results': results
+    })
+    os.makedirs(os.path.dirname(profile_path) or '.', exist_ok=True)
+    with open(profile_path + ".tmp", 'w') as handle:
+        json.dump(profile, handle, indent=2)
+    os.replace(profile_path + ".tmp", profile_path)
+    load_inference_profile.cache_clear()
+    print(f"✅ Profile written to {profile_path}: batch {profile['batch_size']}, {profile['n_workers']} workers x "
+          f"{profile['intra_op_threads']}+{profile['inter_op_threads']} threads, "
+          f"{profile['throughput']:.0f} rows/s, p99 {profile['p99_ms']:.1f} ms")
+    return profile, pd.DataFrame(results)
+
+
+@lru_cache(maxsize=None)
+def load_inference_profile(profile_path=INFERENCE_PROFILE_FILE):
+    """
+    Reads the profile written by `autotune`, falling back to
+    `DEFAULT_INFERENCE_PROFILE` when there is none or when it was tuned on a node
+    with a different number of cores.
+
+    Returns:
+        dict: 'batch_size', 'n_workers', 'intra_op_threads' and 'inter_op_threads'.
+    """
+    profile = dict(DEFAULT_INFERENCE_PROFILE)
+    if not os.path.exists(profile_path):
+        return profile
+    with open(profile_path) as handle:
+        tuned = json.load(handle)
+    if tuned.get('n_cpus') != (os.cpu_count() or 1):
+        print(f"⚠️ Inference profile was tuned on {tuned.get('n_cpus')} cores, not {os.cpu_count()}; "
+              f"using defaults")
+        return profile
+    profile.update({key: tuned[key] for key in DEFAULT_INFERENCE_PROFILE})
+    return profile
+
+
+def inference_batch_size(batch_size=None):
+    """
+    `batch_size`, or the tuned one if it is None.
+    """
+    return load_inference_profile()['batch_size'] if batch_size is None else batch_size
+
+
+def apply_inference_threads(profile=None, n_processes=1):
+    """
+    Sets the TensorFlow thread pools of this process from the profile. It must run
+    before TensorFlow executes anything; afterwards the pools can no longer change
+    and the current ones are kept.
+
+    The tuned intra-op threads are a per-worker budget, so they only apply when this
+    process is one of `n_processes` scorers sharing the node and `n_processes` is the
+    tuned number of workers (as in `predict_file_sharded`). Otherwise each process
+    gets an equal share of the cores, and a single process keeps the TensorFlow
+    default (all cores).
+
+    Parameters:
+        profile (dict): Inference profile (default: `load_inference_profile()`).
+        n_processes (int): Scoring processes running on the node, this one included.
+    """
+    import tensorflow as tf
+
+    profile = profile or load_inference_profile()
+    if n_processes == profile['n_workers']:
+        intra_op_threads = profile['intra_op_threads']
+    elif n_processes > 1:
+        intra_op_threads = max(1, (os.cpu_count() or 1) // n_processes)
+    else:
+        intra_op_threads = None
+    settings = [(intra_op_threads, tf.config.threading.get_intra_op_parallelism_threads,
+                 tf.config.threading.set_intra_op_parallelism_threads),
+                (profile['inter_op_threads'], tf.config.threading.get_inter_op_parallelism_threads,
+                 tf.config.threading.set_inter_op_parallelism_threads)]
+    for value, get, set_threads in settings:
+        if value is None or get() == value:
+            continue
+        try:
+            set_threads(value)
+        except RuntimeError:
+            print("⚠️ TensorFlow is already running; the tuned thread pools apply from the next start")
+            return
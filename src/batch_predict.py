@@ -0,0 +1,324 @@
+import glob
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from src.config import BATCH_PREDICTION_PATH
+from src.candidate_io import read_candidates, candidate_separator
+from src.utils import file_fingerprint, fingerprint_matches
+from src.autotune import apply_inference_threads, inference_batch_size, load_inference_profile
+
+
+RUN_MANIFEST_FILE = "run.json"
+
+
+def prepare_work_dir(work_dir, input_path, settings):
+    """
+    Makes `work_dir` ready for a sharded run, keeping its shards and scored shards
+    only if they were produced from the same input file (same fingerprint) with the
+    same `settings` (model hash, threshold, ...). Otherwise the directory is cleared
+    and the run starts over.
+
+    Parameters:
+        work_dir (str): Directory of the run.
+        input_path (str): Candidate file.
+        settings (dict): JSON-serializable settings that determine the results.
+    """
+    manifest_path = os.path.join(work_dir, RUN_MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as handle:
+            recorded = json.load(handle)
+        if recorded['settings'] == settings and fingerprint_matches(input_path, recorded['input']):
+            return
+        print(f"♻️ Input or settings changed since the last run in {work_dir}, starting over")
+    elif os.path.isdir(work_dir) and os.listdir(work_dir):
+        print(f"♻️ {work_dir} holds results of an unknown run, starting over")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    with open(manifest_path + ".tmp", 'w') as handle:
+        json.dump({'input': file_fingerprint(input_path), 'settings': settings}, handle, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def split_into_shards(input_path, shard_dir, shard_size=250_000):
+    """
+    Splits a candidate file into CSV shards of `shard_size` rows, streaming the input.
+
+    Shards are only written once: if `shard_dir` already holds a complete set
+    (marked by a '_SHARDS_DONE' file), they are reused, so a restarted job does not
+    split the input again.
+
+    Returns:
+        list of str: Shard paths, in input order.
+    """
+    done_marker = os.path.join(shard_dir, "_SHARDS_DONE")
+    if not os.path.exists(done_marker):
+        os.makedirs(shard_dir, exist_ok=True)
+        for i, chunk in enumerate(read_candidates(input_path, chunksize=shard_size)):
+            shard_path = os.path.join(shard_dir, f"shard_{i:05d}.csv")
+            chunk.to_csv(shard_path + ".tmp", index=False)
+            os.replace(shard_path + ".tmp", shard_path)
+        open(done_marker, 'w').close()
+    return sorted(glob.glob(os.path.join(shard_dir, "shard_*.csv")))
+
+
+def _init_worker(model_name, model_path, intra_op_threads, inter_op_threads):
+    """
+    Configures TensorFlow threading and loads the model once per worker process.
+    """
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    from src.model_registry import get_registry
+    registry = get_registry()
+    registry.register(model_name, model_path)
+    registry.get(model_name)
+
+
+def _score_shard(shard_path, output_path, model_name, threshold, batch_size, tokenizer):
+    """
+    Scores one shard in a worker and writes its results atomically.
+
+    Returns:
+        dict: Worker id, number of rows and elapsed seconds.
+    """
+    from src.scoring import score_candidates
+    from src.model_registry import get_registry
+
+    start = time.perf_counter()
+    model, _ = get_registry().get(model_name)
+    shard = pd.read_csv(shard_path)
+    scored = score_candidates(model, shard, threshold=threshold, tokenizer=tokenizer, batch_size=batch_size)
+    scored.to_csv(output_path + ".tmp", index=False)
+    os.replace(output_path + ".tmp", output_path)
+    return {'worker': os.getpid(), 'rows': len(shard), 'seconds': time.perf_counter() - start}
+
+
+def merge_shard_outputs(output_paths, output_path):
+    """
+    Concatenates scored shards, in order, into a single CSV/TSV file with one header.
+    """
+    sep = candidate_separator(output_path)
+    with open(output_path + ".tmp", 'w') as out:
+        for i, path in enumerate(output_paths):
+            if sep == ',':
+                with open(path) as shard:
+                    if i > 0:
+                        shard.readline()
+                    shutil.copyfileobj(shard, out)
+            else:
+                pd.read_csv(path).to_csv(out, sep=sep, index=False, header=(i == 0))
+    os.replace(output_path + ".tmp", output_path)
+
+
+def predict_file_sharded(input_path, output_path, model_name=None,
+                         n_workers=None, shard_size=250_000, intra_op_threads=None, inter_op_threads=None,
+                         threshold=None, batch_size=None, max_retries=2, work_dir=None):
+    """
+    Scores a large candidate file with a pool of worker processes.
+
+    The input is split into shards (see `split_into_shards`); each worker loads the
+    model once with its own TensorFlow thread budget, then tokenizes and scores whole
+    shards with the tokenizer the model was registered with. Per-shard results are
+    written atomically, so finished shards are skipped when the job is rerun with the
+    same input file, model, tokenizer and threshold (see
+    `prepare_work_dir`; any change starts the run over), and a shard whose worker fails or dies is retried up to
+    `max_retries` times without redoing the others. Results are merged in input order.
+
+    Workers, threads and batch size that are not given come from the inference
+    profile written by `autotune`, when there is one.
+
+    Parameters:
+        input_path (str): CSV/TSV of candidates (see `prepare_candidates` for columns).
+        output_path (str): Merged output file.
+        model_name (str): Registered model (see `get_registry`; default model if None).
+        n_workers (int): Worker processes (default: tuned, else number of CPUs).
+        shard_size (int): Rows per shard; bounds the memory of each worker.
+        intra_op_threads (int): TensorFlow intra-op threads per worker (default: tuned
+            for the tuned number of workers, else CPUs divided by workers, at least 1).
+        inter_op_threads (int): TensorFlow inter-op threads per worker (default: tuned, else 1).
+        threshold (float): Probability threshold for 'target_strength'
+            (default: the model's registered threshold).
+        batch_size (int): Batch size for `model.predict` (default: tuned).
+        max_retries (int): Retries per failed shard.
+        work_dir (str): Directory for shards (default: under BATCH_PREDICTION_PATH).
+
+    Returns:
+        dict: Rows per worker, total rows and overall throughput.
+    """
+    from src.model_registry import get_registry
+
+    model_info = get_registry().info(model_name)
+    if threshold is None:
+        threshold = model_info['threshold']
+    profile = load_inference_profile()
+    n_cpus = os.cpu_count() or 1
+    n_workers = n_workers or profile['n_workers'] or n_cpus
+    if intra_op_threads is None and n_workers == profile['n_workers']:
+        intra_op_threads = profile['intra_op_threads']
+    intra_op_threads = intra_op_threads or max(1, n_cpus // n_workers)
+    inter_op_threads = inter_op_threads or profile['inter_op_threads'] or 1
+    batch_size = inference_batch_size(batch_size)
+
+    if work_dir is None:
+        work_dir = os.path.join(BATCH_PREDICTION_PATH, os.path.splitext(os.path.basename(input_path))[0])
+    prepare_work_dir(work_dir, input_path, {'model_hash': model_info['model_hash'], 'threshold': threshold,
+                                            'shard_size': shard_size, 'tokenizer': model_info['tokenizer']})
+    shard_paths = split_into_shards(input_path, os.path.join(work_dir, "shards"), shard_size)
+    os.makedirs(os.path.join(work_dir, "scored"), exist_ok=True)
+    outputs = {shard: os.path.join(work_dir, "scored", os.path.basename(shard)) for shard in shard_paths}
+
+    pending = [shard for shard in shard_paths if not os.path.exists(outputs[shard])]
+    print(f"🧩 {len(shard_paths)} shards, {len(shard_paths) - len(pending)} already scored, "
+          f"{n_workers} workers x {intra_op_threads} threads")
+
+    attempts = defaultdict(int)
+    worker_rows = defaultdict(int)
+    worker_seconds = defaultdict(float)
+    n_done = len(shard_paths) - len(pending)
+    start = time.perf_counter()
+
+    while pending:
+        # A crashed worker breaks the whole pool, so each round starts a fresh one
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker,
+                                 initargs=(model_info['name'], model_info['path'],
+                                           intra_op_threads, inter_op_threads)) as pool:
+            futures = {pool.submit(_score_shard, shard, outputs[shard], model_info['name'], threshold, batch_size,
+                                   model_info['tokenizer']): shard
+                       for shard in pending}
+            pending = []
+            for future in as_completed(futures):
+                shard = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as error:
+                    attempts[shard] += 1
+                    if attempts[shard] > max_retries:
+                        raise RuntimeError(f"Shard {shard} failed {attempts[shard]} times") from error
+                    print(f"⚠️ {os.path.basename(shard)} failed ({error!r}), retrying")
+                    pending.append(shard)
+                    continue
+
+                n_done += 1
+                worker = stats['worker']
+                worker_rows[worker] += stats['rows']
+                worker_seconds[worker] += stats['seconds']
+                print(f"✅ {os.path.basename(shard)} ({n_done}/{len(shard_paths)}) by worker {worker}: "
+                      f"{stats['rows']} rows at {stats['rows'] / stats['seconds']:.0f} rows/s "
+                      f"(worker average {worker_rows[worker] / worker_seconds[worker]:.0f} rows/s)")
+
+    merge_shard_outputs([outputs[shard] for shard in shard_paths], output_path)
+
+    elapsed = time.perf_counter() - start
+    total_rows = sum(worker_rows.values())
+    print(f"📈 Scored {total_rows} rows in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):.0f} rows/s), "
+          f"results in {output_path}")
+    return {'rows_per_worker': dict(worker_rows), 'rows': total_rows, 'seconds': elapsed}
+
+
+def _prefetch(chunks, depth=1):
+    """
+    Reads chunks from `chunks` in a background thread, keeping at most `depth`
+    chunks ahead of the consumer, so parsing overlaps with scoring.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    done = object()
+
+    def produce():
+        try:
+            for chunk in chunks:
+                buffer.put(chunk)
+        except Exception as error:
+            buffer.put(error)
+        buffer.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = buffer.get()
+        if item is done:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def predict_file_streaming(input_path, output_path, model_name=None,
+                           chunksize=50_000, threshold=None, batch_size=None, use_cache=False, prefetch=1):
+    """
+    Scores a candidate file chunk by chunk in a single process, with bounded memory.
+
+    Each chunk of the CSV/TSV/FASTA input is validated, annotated, tokenized (with
+    the tokenizer the model was registered with) and scored with `score_candidates`, and its rows are appended to `output_path` right
+    away, so peak memory depends on `chunksize` and not on the size of the input.
+    The next chunk is read in the background while the current one is scored.
+
+    If the input has no 'mhc_status' column, it is looked up in the reference
+    containment index (see `prepare_candidates`); only when no index has been built
+    is it computed among the candidates of each chunk.
+
+    The batch size and the inter-op threads come from the inference profile written
+    by `autotune`, when there is one; as the only scoring process, it keeps the
+    TensorFlow default intra-op pool (see `apply_inference_threads`).
+
+    Parameters:
+        input_path (str): CSV/TSV/FASTA of candidates (see `prepare_candidates` for columns).
+        output_path (str): Output CSV/TSV, overwritten.
+        model_name (str): Registered model (see `get_registry`; default model if None).
+        chunksize (int): Rows per chunk.
+        threshold (float): Probability threshold for 'target_strength'
+            (default: the model's registered threshold).
+        batch_size (int): Batch size for `model.predict` (default: tuned).
+        use_cache (bool): Reuse scores from the persistent `ScoreCache`.
+        prefetch (int): Chunks read ahead of the one being scored.
+
+    Returns:
+        dict: Number of chunks, rows and scored (valid) rows, and elapsed seconds.
+    """
+    from src.scoring import score_candidates
+    from src.score_cache import ScoreCache
+    from src.model_registry import get_registry
+
+    apply_inference_threads()
+    registry = get_registry()
+    model, model_hash = registry.get(model_name)
+    if threshold is None:
+        threshold = registry.threshold(model_name)
+    tokenizer = registry.tokenizer(model_name)
+    if not use_cache:
+        model_hash = None
+    cache = ScoreCache() if use_cache else None
+
+    sep = candidate_separator(output_path)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    stats = {'chunks': 0, 'rows': 0, 'valid_rows': 0}
+    start = time.perf_counter()
+    try:
+        with open(output_path, 'w') as out:
+            for chunk in _prefetch(read_candidates(input_path, chunksize=chunksize), depth=prefetch):
+                scored = score_candidates(model, chunk, threshold=threshold, model_hash=model_hash,
+                                          cache=cache, tokenizer=tokenizer, batch_size=batch_size)
+                scored.to_csv(out, sep=sep, index=False, header=(stats['chunks'] == 0))
+                out.flush()
+
+                stats['chunks'] += 1
+                stats['rows'] += len(scored)
+                stats['valid_rows'] += int(scored['valid'].sum())
+                print(f"✅ Chunk {stats['chunks']}: {stats['rows']} rows written "
+                      f"({stats['rows'] / (time.perf_counter() - start):.0f} rows/s)")
+    finally:
+        if cache is not None:
+            cache.close()
+
+    stats['seconds'] = time.perf_counter() - start
+    print(f"📈 Scored {stats['rows']} rows ({stats['valid_rows']} valid) in {stats['seconds']:.1f}s, "
+          f"results in {output_path}")
+    return stats
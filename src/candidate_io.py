@@ -0,0 +1,64 @@
+import os
+
+import pandas as pd
+
+
+FASTA_EXTENSIONS = ('.fasta', '.fa', '.faa')
+
+
+def candidate_separator(path):
+    """
+    Column separator implied by a candidate file's extension ('.tsv'/'.txt' are tab-separated).
+    """
+    return '\t' if os.path.splitext(path)[1].lower() in ('.tsv', '.txt') else ','
+
+
+def read_fasta_candidates(path, chunksize=100_000):
+    """
+    Reads peptides from a FASTA file in chunks, one record per peptide.
+
+    The record identifier (first word of the header) goes to an 'id' column and the
+    sequence, joined across lines, to a 'peptide' column.
+
+    Yields:
+        pd.DataFrame: Chunks of at most `chunksize` records.
+    """
+    ids, peptides = [], []
+    record_id, sequence = None, []
+    with open(path) as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('>'):
+                if record_id is not None:
+                    ids.append(record_id)
+                    peptides.append(''.join(sequence))
+                    if len(ids) == chunksize:
+                        yield pd.DataFrame({'id': ids, 'peptide': peptides})
+                        ids, peptides = [], []
+                record_id, sequence = (line[1:].split() or [''])[0], []
+            else:
+                sequence.append(line)
+    if record_id is not None:
+        ids.append(record_id)
+        peptides.append(''.join(sequence))
+    if ids:
+        yield pd.DataFrame({'id': ids, 'peptide': peptides})
+
+
+def read_candidates(path, chunksize=100_000):
+    """
+    Reads a CSV, TSV or FASTA file of candidate peptides in chunks.
+
+    Parameters:
+        path (str): Input file; the format is chosen from the extension.
+        chunksize (int): Rows per chunk.
+
+    Yields:
+        pd.DataFrame: Consecutive chunks of the file.
+    """
+    if os.path.splitext(path)[1].lower() in FASTA_EXTENSIONS:
+        yield from read_fasta_candidates(path, chunksize=chunksize)
+    else:
+        yield from pd.read_csv(path, sep=candidate_separator(path), chunksize=chunksize)
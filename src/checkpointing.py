@@ -0,0 +1,126 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+from tensorflow.keras.callbacks import Callback
+
+
+EARLY_STOPPING_STATE = ['wait', 'best', 'best_weights', 'best_epoch', 'stopped_epoch']
+
+
+def atomic_dump(obj, path):
+    """
+    Writes `obj` with joblib to a temporary file, flushes it to disk and renames it
+    over `path`, so readers only ever see a complete previous or new file.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as handle:
+        joblib.dump(obj, handle)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+
+def _optimizer_variables(optimizer):
+    variables = optimizer.variables
+    return variables() if callable(variables) else variables
+
+
+class TrainingCheckpoint(Callback):
+    """
+    Keras callback that periodically saves everything needed to resume training.
+
+    Each checkpoint holds the model weights, the optimizer state, the EarlyStopping
+    counters (including its best weights), the next epoch and the loss history.
+    The state is copied to host memory on the training thread and written to disk
+    by a background thread with an atomic rename, so a preempted run leaves either
+    the previous or the new checkpoint, never a partial one. At most one write is in
+    flight; the next checkpoint waits for it.
+
+    Parameters:
+        path (str): Checkpoint file.
+        early_stopping (EarlyStopping): Callback whose state is saved and restored.
+        every (int): Save every `every` epochs.
+    """
+
+    def __init__(self, path, early_stopping=None, every=1):
+        super().__init__()
+        self.path = path
+        self.early_stopping = early_stopping
+        self.every = every
+        self.history = {}
+        self._restored_early_stopping = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = None
+
+    def restore(self, model):
+        """
+        Loads the checkpoint into `model` (which must already be compiled).
+
+        Returns:
+            int: Epoch to pass as `initial_epoch` to `model.fit` (0 if there is no checkpoint).
+        """
+        if not os.path.exists(self.path):
+            print("⚠️ No checkpoint found, training from scratch.")
+            return 0
+
+        state = joblib.load(self.path)
+        model.set_weights(state['model_weights'])
+        model.optimizer.build(model.trainable_variables)
+        for variable, value in zip(_optimizer_variables(model.optimizer), state['optimizer_variables']):
+            variable.assign(value)
+
+        self.history = state['history']
+        self._restored_early_stopping = state['early_stopping']
+        print(f"♻️ Resuming from checkpoint at epoch {state['epoch']}")
+        return state['epoch']
+
+    def on_train_begin(self, logs=None):
+        # EarlyStopping resets its counters in its own on_train_begin, which runs first
+        if self.early_stopping is not None and self._restored_early_stopping:
+            for name, value in self._restored_early_stopping.items():
+                setattr(self.early_stopping, name, value)
+
+    def on_epoch_end(self, epoch, logs=None):
+        for name, value in (logs or {}).items():
+            self.history.setdefault(name, []).append(float(value))
+        if (epoch + 1) % self.every == 0:
+            self.save(epoch + 1)
+
+    def on_train_end(self, logs=None):
+        self.wait()
+
+    def save(self, next_epoch):
+        """
+        Snapshots the training state and schedules it to be written in the background.
+        """
+        self.wait()
+        early_stopping = {}
+        if self.early_stopping is not None:
+            early_stopping = {name: getattr(self.early_stopping, name)
+                              for name in EARLY_STOPPING_STATE if hasattr(self.early_stopping, name)}
+        state = {
+            'epoch': next_epoch,
+            'model_weights': self.model.get_weights(),
+            'optimizer_variables': [v.numpy() for v in _optimizer_variables(self.model.optimizer)],
+            'early_stopping': early_stopping,
+            'history': {name: list(values) for name, values in self.history.items()}
+        }
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._pending = self._executor.submit(atomic_dump, state, self.path)
+
+    def wait(self):
+        """
+        Blocks until the last scheduled checkpoint write has finished.
+        """
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    def clear(self):
+        """
+        Removes the checkpoint once the final model has been saved.
+        """
+        self.wait()
+        if os.path.exists(self.path):
+            os.remove(self.path)
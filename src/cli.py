@@ -0,0 +1,155 @@
+import argparse
+
+from src.model_registry import get_registry
+
+
+def main(argv=None):
+    """
+    Command-line entry point: `python -m src.cli score|variants|scan|epitopes|autotune|models ...`.
+    """
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="Score candidate peptides.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    score = commands.add_parser('score', help="Score a CSV/TSV/FASTA file of candidates.")
+    score.add_argument('input_path')
+    score.add_argument('output_path')
+    score.add_argument('--model', default=None, help="Registered model name (default model if omitted).")
+    score.add_argument('--threshold', type=float, default=None,
+                       help="Probability threshold (default: the model's registered threshold).")
+    score.add_argument('--chunksize', type=int, default=50_000)
+    score.add_argument('--workers', type=int, default=1,
+                       help="Worker processes; more than 1 uses the sharded driver.")
+    score.add_argument('--cache', action='store_true', help="Reuse scores from the persistent score cache.")
+
+    variants = commands.add_parser('variants', help="Score protein variants by their mutant windows.")
+    variants.add_argument('input_path', help="CSV/TSV with 'protein' and 'mutation' columns.")
+    variants.add_argument('output_path', help="Best windows per variant.")
+    variants.add_argument('--model', default=None, help="Registered model name (default model if omitted).")
+    variants.add_argument('--threshold', type=float, default=None,
+                          help="Probability threshold (default: the model's registered threshold).")
+    variants.add_argument('--top', type=int, default=1, help="Best windows kept per variant.")
+    variants.add_argument('--windows', default=None, help="Optional file for all scored windows.")
+
+    scan = commands.add_parser('scan', help="Score every window of a set of proteins.")
+    scan.add_argument('input_path', help="FASTA (or CSV/TSV with 'id' and 'sequence') of proteins.")
+    scan.add_argument('output_path')
+    scan.add_argument('--model', default=None, help="Registered model name (default model if omitted).")
+    scan.add_argument('--threshold', type=float, default=None,
+                      help="Probability threshold (default: the model's registered threshold).")
+    scan.add_argument('--lengths', default='8-11', help="Window lengths, as 'MIN-MAX' or a comma-separated list.")
+    scan.add_argument('--mhc-class', default='I')
+    scan.add_argument('--chunksize', type=int, default=1_000, help="Proteins read at a time.")
+
+    epitopes = commands.add_parser('epitopes', help="Find the known epitopes nearest to high-scoring candidates.")
+    epitopes.add_argument('input_path', nargs='?', help="Scored candidates (output of 'score').")
+    epitopes.add_argument('output_path', nargs='?')
+    epitopes.add_argument('--k', type=int, default=5, help="Known epitopes per candidate.")
+    epitopes.add_argument('--min-prob', type=float, default=None,
+                          help="Search candidates with at least this probability (default: predicted positives).")
+    epitopes.add_argument('--build', metavar='EMBEDDING', default=None,
+                          help="(Re)build the index first, from a tokenizer name or 'penultimate'.")
+    epitopes.add_argument('--model', default=None, help="Registered model for 'penultimate' (default model if omitted).")
+
+    autotune = commands.add_parser('autotune', help="Tune batch size, threads and workers for this node.")
+    autotune.add_argument('--model', default=None, help="Registered model name (default model if omitted).")
+    autotune.add_argument('--batch-sizes', default=None, help="Comma-separated batch sizes to try.")
+    autotune.add_argument('--workers', default=None, help="Comma-separated worker counts to try.")
+    autotune.add_argument('--max-p99-ms', type=float, default=None, help="Latency budget for one batch.")
+
+    models = commands.add_parser('models', help="List or register models.")
+    models.add_argument('--register', nargs=2, metavar=('NAME', 'PATH'))
+    models.add_argument('--threshold', type=float, default=None)
+    models.add_argument('--tokenizer', default=None,
+                        help="Tokenizer of the registered model (default: from its training manifest).")
+    models.add_argument('--export', nargs=2, metavar=('NAME', 'DIR'),
+                        help="Export a registered model as a serving SavedModel.")
+
+    args = parser.parse_args(argv)
+    registry = get_registry()
+
+    if args.command == 'score':
+        from src.batch_predict import predict_file_streaming, predict_file_sharded
+        if args.workers > 1:
+            predict_file_sharded(args.input_path, args.output_path, model_name=args.model,
+                                 n_workers=args.workers, shard_size=args.chunksize, threshold=args.threshold)
+        else:
+            predict_file_streaming(args.input_path, args.output_path, model_name=args.model,
+                                   chunksize=args.chunksize, threshold=args.threshold, use_cache=args.cache)
+
+    elif args.command == 'variants':
+        import pandas as pd
+        from src.candidate_io import candidate_separator
+        from src.neoantigen import score_variants
+        from src.autotune import apply_inference_threads
+        apply_inference_threads()
+        model, _ = registry.get(args.model)
+        threshold = args.threshold if args.threshold is not None else registry.threshold(args.model)
+        variant_table = pd.read_csv(args.input_path, sep=candidate_separator(args.input_path))
+        best, windows = score_variants(model, variant_table, threshold=threshold, top_n=args.top,
+                                       tokenizer=registry.tokenizer(args.model))
+        best.to_csv(args.output_path, sep=candidate_separator(args.output_path), index=False)
+        if args.windows:
+            windows.to_csv(args.windows, sep=candidate_separator(args.windows), index=False)
+        print(f"✅ Best windows of {len(variant_table)} variants written to {args.output_path}")
+
+    elif args.command == 'scan':
+        from src.candidate_io import read_candidates, candidate_separator
+        from src.window_scan import IncrementalWindowScorer, scan_proteins
+        from src.autotune import apply_inference_threads
+        apply_inference_threads()
+        model, _ = registry.get(args.model)
+        threshold = args.threshold if args.threshold is not None else registry.threshold(args.model)
+        if '-' in args.lengths:
+            low, high = (int(value) for value in args.lengths.split('-'))
+            lengths = range(low, high + 1)
+        else:
+            lengths = [int(value) for value in args.lengths.split(',')]
+        scorer = IncrementalWindowScorer(model, tokenizer=registry.tokenizer(args.model))
+        sep = candidate_separator(args.output_path)
+        with open(args.output_path, 'w') as out:
+            for i, proteins in enumerate(read_candidates(args.input_path, chunksize=args.chunksize)):
+                windows = scan_proteins(model, proteins, lengths=lengths, mhc_class=args.mhc_class,
+                                        threshold=threshold, scorer=scorer)
+                windows.to_csv(out, sep=sep, index=False, header=(i == 0))
+        print(f"✅ Windows written to {args.output_path}")
+
+    elif args.command == 'epitopes':
+        from src.epitope_index import EpitopeIndex, nearest_known_epitopes
+        index = EpitopeIndex.build(embedding=args.build, model_name=args.model) if args.build else None
+        if args.input_path:
+            import pandas as pd
+            from src.candidate_io import candidate_separator
+            scored = pd.read_csv(args.input_path, sep=candidate_separator(args.input_path))
+            neighbours = nearest_known_epitopes(scored, k=args.k, min_prob=args.min_prob, index=index)
+            neighbours.to_csv(args.output_path, sep=candidate_separator(args.output_path), index=False)
+            print(f"✅ Nearest known epitopes written to {args.output_path}")
+
+    elif args.command == 'autotune':
+        from src.autotune import autotune
+        kwargs = {}
+        if args.batch_sizes:
+            kwargs['batch_sizes'] = [int(value) for value in args.batch_sizes.split(',')]
+        if args.workers:
+            kwargs['worker_counts'] = [int(value) for value in args.workers.split(',')]
+        autotune(args.model, max_p99_ms=args.max_p99_ms, **kwargs)
+
+    elif args.command == 'models':
+        if args.register:
+            name, path = args.register
+            threshold = args.threshold if args.threshold is not None else 0.4
+            model_hash = registry.register(name, path, threshold=threshold, save=True, tokenizer=args.tokenizer)
+            print(f"✅ Registered '{name}' ({model_hash[:12]}) with threshold {threshold} and "
+                  f"{registry.tokenizer(name)}")
+        if args.export:
+            from src.serving import ServingModel
+            name, path = args.export
+            model, _ = registry.get(name)
+            ServingModel(model).export(path)
+        for name in registry.names():
+            info = registry.info(name)
+            model_hash = info['model_hash'][:12] if info['model_hash'] else 'missing'
+            print(f"{name}\t{model_hash}\tthreshold={info['threshold']}\t{info['tokenizer']}\t{info['path']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,3 +2,18 @@ RAW_DATA_PATH = "data/raw/"
 PROCESSED_DATA_PATH = "data/processed/"
 IEDB_API_BASE_URL = "https://query-api.iedb.org"
 SAVED_MODELS_PATH = "models/saved_models/"
+CACHE_PATH = "data/cache/"
+SCORE_CACHE_MAX_ENTRIES = 5_000_000
+BATCH_PREDICTION_PATH = "data/batch_prediction/"
+JOBS_PATH = "data/jobs/"
+SMALL_JOB_MAX_ROWS = 5_000
+DEFAULT_MODEL_NAME = "cnn_multimodal_class"
+MODEL_REGISTRY_FILE = SAVED_MODELS_PATH + "registry.json"
+MODEL_REGISTRY_MAX_LOADED = 3
+REFERENCE_INDEX_PATH = PROCESSED_DATA_PATH + "reference_index/"
+HPARAM_SEARCH_PATH = "models/hparam_search/"
+SERVING_BUCKETS = (1, 8, 64, 512, 4096)
+SERVING_JIT_COMPILE = False
+INFERENCE_PROFILE_FILE = SAVED_MODELS_PATH + "inference_profile.json"
+AUTOTUNE_BATCH_SIZES = (64, 256, 1024, 4096)
+EPITOPE_INDEX_PATH = PROCESSED_DATA_PATH + "epitope_index/"
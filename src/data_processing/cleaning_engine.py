@@ -0,0 +1,217 @@
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.data_processing.feature_engineering import fill_group_II_status
+
+
+PEPTIDE_COLUMN = 'Epitope - Name'
+MHC_CLASS_COLUMN = 'MHC Restriction - Class'
+WEIGHT_COLUMN = 'averaged_number_positive_subjects_tested'
+VALID_AA = "ACDEFGHIKLMNPQRSTVWY"
+
+
+@dataclass
+class CleaningSpec:
+    """
+    Declarative description of how one peptide source is cleaned.
+
+    Rows go through three groups of filters. Each group is a list of callables that
+    take the working frame and return a boolean mask:
+
+    - `context_filters` (plus deduplication of the raw rows and the length bounds)
+      select the rows the sample weights are aggregated over.
+    - `annotation_filters` select, among those, the reference peptides used to
+      compute `mhc_status`.
+    - `output_filters` select, among those, the rows that are returned.
+
+    Attributes:
+        load (callable): Returns the raw DataFrame.
+        columns (dict): Raw column name -> output column name for the columns kept.
+        value_maps (dict): Output column -> mapping applied to its values.
+        deduplicate_raw (bool): Ignore rows duplicated on the selected raw columns.
+        fix_peptides (callable): Optional transform of the peptide column.
+        context_filters (list): See above.
+        aggregate (callable): Computes the sample weight column from the working
+            frame and the context mask.
+        annotation_filters (list): See above.
+        output_filters (list): See above.
+        constants (dict): Output column -> constant value.
+        output_columns (list): Output columns, in order.
+    """
+    load: Callable[[], pd.DataFrame]
+    columns: dict
+    output_columns: list
+    value_maps: dict = field(default_factory=dict)
+    deduplicate_raw: bool = True
+    fix_peptides: Optional[Callable[[pd.Series], pd.Series]] = None
+    context_filters: list = field(default_factory=list)
+    aggregate: Optional[Callable[[pd.DataFrame, np.ndarray], pd.Series]] = None
+    annotation_filters: list = field(default_factory=list)
+    output_filters: list = field(default_factory=list)
+    constants: dict = field(default_factory=dict)
+
+
+def column_not_equal(column, value):
+    """
+    Filter keeping rows where `column` differs from `value` (missing values are kept).
+    """
+    return lambda frame: (frame[column] != value).to_numpy()
+
+
+def column_equal(column, value):
+    """
+    Filter keeping rows where `column` equals `value`.
+    """
+    return lambda frame: (frame[column] == value).to_numpy()
+
+
+def column_in(column, values):
+    """
+    Filter keeping rows where `column` takes one of `values`.
+    """
+    return lambda frame: frame[column].isin(values).to_numpy()
+
+
+def column_not_null(column):
+    """
+    Filter keeping rows where `column` is not missing.
+    """
+    return lambda frame: frame[column].notna().to_numpy()
+
+
+def only_valid_amino_acids(frame):
+    """
+    Filter keeping peptides made only of the 20 standard amino acids.
+    """
+    peptides = frame[PEPTIDE_COLUMN]
+    is_str = peptides.map(lambda x: isinstance(x, str), na_action=None).to_numpy(dtype=bool)
+    return is_str & peptides.str.fullmatch(f"[{VALID_AA}]*").fillna(False).to_numpy(dtype=bool)
+
+
+def no_unknown_residues(frame):
+    """
+    Filter dropping peptides that contain 'U' or 'X'.
+    """
+    return ~frame[PEPTIDE_COLUMN].str.contains('[UX]', regex=True).fillna(True).to_numpy(dtype=bool)
+
+
+def length_between(min_length, max_length):
+    """
+    Filter keeping peptides whose length lies in [min_length, max_length].
+    """
+    def mask(frame):
+        lengths = frame[PEPTIDE_COLUMN].astype(str).str.len().to_numpy()
+        return (lengths >= min_length) & (lengths <= max_length)
+    return mask
+
+
+def strip_modifications(peptides):
+    """
+    Removes the part of a peptide name after '+' (modification annotations).
+    """
+    return peptides.str.split('+').str[0].str.strip()
+
+
+def sum_positive_subjects(frame, context):
+    """
+    Sums, per peptide, the number of positive subjects (response frequency times
+    subjects tested, with a missing frequency counted as 100%) over the context rows.
+
+    Peptides without any subject count get a weight of 1.
+    """
+    positive = (frame['Assay - Response Frequency (%)'].fillna(100) * 0.01
+                * frame['Assay - Number of Subjects Tested'])
+    totals = positive[context].groupby(frame[PEPTIDE_COLUMN][context]).sum(min_count=1)
+    return round(frame[PEPTIDE_COLUMN].map(totals)).fillna(1)
+
+
+def count_unique_donors(frame, context):
+    """
+    Counts, per peptide, the distinct donors in which it was observed over the context rows.
+    """
+    counts = frame['donor'][context].groupby(frame[PEPTIDE_COLUMN][context]).nunique()
+    return frame[PEPTIDE_COLUMN].map(counts)
+
+
+def _combine(frame, filters, mask):
+    for row_filter in filters:
+        mask &= row_filter(frame)
+    return mask
+
+
+def annotate_mhc_status(peptides, mhc_classes, reference):
+    """
+    Computes `mhc_status` for every row from the distinct (peptide, class) pairs of
+    the reference rows, so `fill_group_II_status` runs once per distinct pair.
+
+    Returns:
+        np.ndarray: Object array of statuses aligned with `peptides`.
+    """
+    pairs = pd.DataFrame({
+        PEPTIDE_COLUMN: peptides[reference],
+        MHC_CLASS_COLUMN: mhc_classes[reference]
+    }).drop_duplicates()
+    statuses = fill_group_II_status(pairs.reset_index(drop=True)).set_index([PEPTIDE_COLUMN, MHC_CLASS_COLUMN])
+    row_keys = pd.MultiIndex.from_arrays([peptides, mhc_classes])
+    return statuses['mhc_status'].reindex(row_keys).to_numpy()
+
+
+def clean_source(spec, min_length=None, max_length=None):
+    """
+    Cleans one peptide source according to its `CleaningSpec`.
+
+    All filters of a group are combined into a single boolean mask on the selected
+    columns, and rows are only copied once, when the output is assembled. Duplicated
+    output rows are dropped once at the end, keeping the first occurrence.
+
+    Parameters:
+        spec (CleaningSpec): Description of the source.
+        min_length (int): Minimum peptide length to retain (no bound if None).
+        max_length (int): Maximum peptide length to retain (no bound if None).
+
+    Returns:
+        pd.DataFrame: Cleaned DataFrame with `spec.output_columns`, indexed like the raw rows.
+    """
+    raw = spec.load()
+
+    # Build the working frame from the selected columns only
+    frame = pd.DataFrame({new: raw[old] for old, new in spec.columns.items()})
+    del raw
+
+    context = np.ones(len(frame), dtype=bool)
+    if spec.deduplicate_raw:
+        context &= ~frame.duplicated().to_numpy()
+    for column, mapping in spec.value_maps.items():
+        frame[column] = frame[column].map(mapping)
+    if spec.fix_peptides is not None:
+        frame[PEPTIDE_COLUMN] = spec.fix_peptides(frame[PEPTIDE_COLUMN])
+
+    context_filters = list(spec.context_filters)
+    if min_length is not None and max_length is not None:
+        context_filters.append(length_between(min_length, max_length))
+    context = _combine(frame, context_filters, context)
+
+    if spec.aggregate is not None:
+        frame[WEIGHT_COLUMN] = spec.aggregate(frame, context)
+
+    reference = _combine(frame, spec.annotation_filters, context.copy())
+    keep = _combine(frame, spec.output_filters, reference.copy())
+
+    peptides = frame[PEPTIDE_COLUMN].to_numpy()
+    mhc_classes = frame[MHC_CLASS_COLUMN].to_numpy()
+    statuses = annotate_mhc_status(peptides, mhc_classes, reference)
+
+    output_columns = {}
+    for column in spec.output_columns:
+        if column == 'mhc_status':
+            output_columns[column] = statuses[keep]
+        elif column in spec.constants:
+            output_columns[column] = spec.constants[column]
+        else:
+            output_columns[column] = frame[column].to_numpy()[keep]
+
+    data_frame = pd.DataFrame(output_columns, index=frame.index[keep])
+    return data_frame.drop_duplicates()
@@ -0,0 +1,359 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from src.config import REFERENCE_INDEX_PATH
+from src.data_processing.homology import peptide_kmers
+
+
+CONTAINMENT_K = 8
+MAX_SEGMENTS = 8
+SHARED_STATUS = 'peptide shared in MHC I and II'
+NOT_SHARED_STATUS = 'peptide not shared'
+SEGMENT_ARRAYS = ['sequences', 'offsets', 'lengths', 'codes', 'owners', 'positions']
+
+
+def _pack(peptides):
+    """
+    Concatenates peptides into one uint8 buffer.
+
+    Returns:
+    --------
+    tuple of np.ndarray
+        - flat : ASCII codes of all residues
+        - starts : start of each peptide in `flat`
+        - lengths : length of each peptide
+    """
+    lengths = np.fromiter((len(p) for p in peptides), dtype=np.int64, count=len(peptides))
+    flat = np.frombuffer(''.join(peptides).encode('ascii'), dtype=np.uint8)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    return flat, starts, lengths
+
+
+def _expand_ranges(lo, hi):
+    """
+    Expands [lo, hi) row ranges into (range index, row) pairs.
+    """
+    counts = hi - lo
+    which = np.repeat(np.arange(len(lo)), counts)
+    rows = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+    return which, rows
+
+
+def _equal_from(a, a_starts, b, b_starts, lengths, k):
+    """
+    Compares `lengths` residues of `a` and `b` at the given starts, skipping the
+    first `k` residues, which are known to match through their k-mer code.
+    """
+    equal = np.ones(len(lengths), dtype=bool)
+    for j in range(k, int(lengths.max(initial=0))):
+        active = np.flatnonzero(equal & (j < lengths))
+        equal[active] = a[a_starts[active] + j] == b[b_starts[active] + j]
+    return equal
+
+
+def _build_segment(peptides, k, all_kmers):
+    """
+    Builds the arrays of one segment from a list of distinct peptides.
+
+    Class II segments index every k-mer of every peptide, class I segments only the
+    first k-mer, which is enough to find the peptides a query contains.
+    """
+    sequences, offsets, lengths = _pack(peptides)
+    codes, owners, positions = peptide_kmers(peptides, k)
+    if not all_kmers:
+        first = positions == 0
+        codes, owners, positions = codes[first], owners[first], positions[first]
+    order = np.argsort(codes, kind='stable')
+    return {
+        'sequences': sequences,
+        'offsets': offsets,
+        'lengths': lengths,
+        'codes': codes[order],
+        'owners': owners[order].astype(np.int64),
+        'positions': positions[order].astype(np.int64)
+    }
+
+
+class _Segment:
+    """
+    Immutable part of a `ContainmentIndex` for one MHC class.
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self._joined = None
+        self._short = None
+
+    def __len__(self):
+        return len(self.arrays['lengths'])
+
+    def __getattr__(self, name):
+        if name in SEGMENT_ARRAYS:
+            return self.arrays[name]
+        raise AttributeError(name)
+
+    def peptides(self):
+        text = bytes(self.sequences).decode('ascii')
+        return [text[start:start + length] for start, length in zip(self.offsets, self.lengths)]
+
+    def joined(self):
+        # Newline-separated peptides, for substring searches of queries shorter than k
+        if self._joined is None:
+            self._joined = '\n'.join(self.peptides())
+        return self._joined
+
+    def short_peptides(self, k):
+        if self._short is None:
+            self._short = [p for p, length in zip(self.peptides(), self.lengths) if length < k]
+        return self._short
+
+
+class ContainmentIndex:
+    """
+    Persistent index of reference class I and class II peptides that answers, for
+    any peptide, whether it is contained in a known class II peptide (class I
+    queries) or contains a known class I peptide (class II queries).
+
+    Class II peptides are indexed by every k-mer and class I peptides by their
+    first k-mer, as sorted int64 codes. A query is answered with one binary search
+    per k-mer followed by a residue-by-residue check of the few candidates, for a
+    whole batch of queries at once. Queries shorter than k fall back to a substring
+    search.
+
+    The index is stored as a list of segments of `.npy` files, loaded memory-mapped
+    by default. `insert` writes the new peptides to a new segment without touching
+    the existing ones, and segments are merged once there are more than
+    `MAX_SEGMENTS` of them.
+
+    Parameters:
+        path (str): Directory of the index.
+        k (int): K-mer length; only used when a new index is created.
+        mmap_mode (str): Passed to `np.load` for the segment arrays.
+    """
+
+    def __init__(self, path=REFERENCE_INDEX_PATH, k=CONTAINMENT_K, mmap_mode='r'):
+        self.path = path
+        self.mmap_mode = mmap_mode
+        self.manifest = {'k': k, 'next_segment': 0, 'segments': []}
+        manifest_path = os.path.join(path, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as handle:
+                self.manifest = json.load(handle)
+        self.k = self.manifest['k']
+        self.segments = {'I': [], 'II': []}
+        for name in self.manifest['segments']:
+            self._load_segment(name)
+
+    def __len__(self):
+        return sum(len(segment) for segments in self.segments.values() for segment in segments)
+
+    def _load_segment(self, name):
+        for mhc_class in self.segments:
+            prefix = os.path.join(self.path, name, mhc_class + "_")
+            if os.path.exists(prefix + "codes.npy"):
+                arrays = {array: np.load(prefix + array + ".npy", mmap_mode=self.mmap_mode)
+                          for array in SEGMENT_ARRAYS}
+                self.segments[mhc_class].append(_Segment(arrays))
+
+    def _write_manifest(self):
+        manifest_path = os.path.join(self.path, "manifest.json")
+        with open(manifest_path + ".tmp", 'w') as handle:
+            json.dump(self.manifest, handle, indent=2)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def _write_segment(self, peptides_by_class):
+        name = f"segment_{self.manifest['next_segment']:05d}"
+        os.makedirs(os.path.join(self.path, name), exist_ok=True)
+        for mhc_class, peptides in peptides_by_class.items():
+            if len(peptides):
+                arrays = _build_segment(list(peptides), self.k, all_kmers=(mhc_class == 'II'))
+                for array, values in arrays.items():
+                    np.save(os.path.join(self.path, name, f"{mhc_class}_{array}.npy"), values)
+        self.manifest['next_segment'] += 1
+        return name
+
+    def _exact_members(self, peptides, mhc_class):
+        """
+        Flags the peptides already present in the index for `mhc_class`.
+        """
+        flat, starts, lengths = _pack(peptides)
+        found = np.zeros(len(peptides), dtype=bool)
+        long = np.flatnonzero(lengths >= self.k)
+        codes, owners, positions = peptide_kmers([peptides[i] for i in long], self.k)
+        first_codes = codes[positions == 0]
+        for segment in self.segments[mhc_class]:
+            lo = np.searchsorted(segment.codes, first_codes, side='left')
+            hi = np.searchsorted(segment.codes, first_codes, side='right')
+            which, rows = _expand_ranges(lo, hi)
+            query, owner = long[which], segment.owners[rows]
+            fit = (segment.positions[rows] == 0) & (segment.lengths[owner] == lengths[query])
+            query, owner = query[fit], owner[fit]
+            equal = _equal_from(flat, starts[query], segment.sequences, segment.offsets[owner], lengths[query], self.k)
+            found[query[equal]] = True
+
+            short = set(segment.short_peptides(self.k))
+            if short:
+                found |= np.fromiter((p in short for p in peptides), dtype=bool, count=len(peptides))
+        return found
+
+    def insert(self, peptides, mhc_classes):
+        """
+        Adds reference peptides to the index. Peptides already indexed for the same
+        class, and classes other than 'I' and 'II', are ignored.
+
+        Returns:
+            int: Number of peptides added.
+        """
+        peptides = np.asarray(peptides, dtype=str)
+        mhc_classes = np.asarray(mhc_classes, dtype=str)
+        new = {}
+        for mhc_class in self.segments:
+            candidates = list(np.unique(peptides[mhc_classes == mhc_class]))
+            if candidates:
+                is_known = self._exact_members(candidates, mhc_class)
+                new[mhc_class] = [p for p, known in zip(candidates, is_known) if not known]
+        n_new = sum(len(p) for p in new.values())
+        if n_new == 0:
+            return 0
+
+        os.makedirs(self.path, exist_ok=True)
+        name = self._write_segment(new)
+        self.manifest['segments'].append(name)
+        self._write_manifest()
+        self._load_segment(name)
+
+        if len(self.manifest['segments']) > MAX_SEGMENTS:
+            self.compact()
+        return n_new
+
+    def compact(self):
+        """
+        Merges all segments into one.
+        """
+        peptides = {mhc_class: [p for segment in segments for p in segment.peptides()]
+                    for mhc_class, segments in self.segments.items()}
+        old_segments = list(self.manifest['segments'])
+        name = self._write_segment(peptides)
+        self.manifest['segments'] = [name]
+        self._write_manifest()
+
+        self.segments = {'I': [], 'II': []}
+        self._load_segment(name)
+        for old in old_segments:
+            shutil.rmtree(os.path.join(self.path, old), ignore_errors=True)
+
+    def contained_in_class_II(self, peptides):
+        """
+        Returns:
+            np.ndarray: True for each peptide that is a substring of a reference class II peptide.
+        """
+        peptides = [str(p) for p in peptides]
+        flat, starts, lengths = _pack(peptides)
+        found = np.zeros(len(peptides), dtype=bool)
+        long = np.flatnonzero(lengths >= self.k)
+        codes, _, positions = peptide_kmers([peptides[i] for i in long], self.k)
+        first_codes = codes[positions == 0]
+
+        for segment in self.segments['II']:
+            lo = np.searchsorted(segment.codes, first_codes, side='left')
+            hi = np.searchsorted(segment.codes, first_codes, side='right')
+            which, rows = _expand_ranges(lo, hi)
+            query, owner, position = long[which], segment.owners[rows], segment.positions[rows]
+            fit = ~found[query] & (position + lengths[query] <= segment.lengths[owner])
+            query, owner, position = query[fit], owner[fit], position[fit]
+            equal = _equal_from(flat, starts[query], segment.sequences, segment.offsets[owner] + position,
+                                lengths[query], self.k)
+            found[query[equal]] = True
+
+        for i in np.flatnonzero(lengths < self.k):
+            found[i] = any(peptides[i] in segment.joined() for segment in self.segments['II'])
+        return found
+
+    def contains_class_I(self, peptides):
+        """
+        Returns:
+            np.ndarray: True for each peptide that contains a reference class I peptide.
+        """
+        peptides = [str(p) for p in peptides]
+        flat, starts, lengths = _pack(peptides)
+        found = np.zeros(len(peptides), dtype=bool)
+        codes, owners, positions = peptide_kmers(peptides, self.k)
+
+        for segment in self.segments['I']:
+            lo = np.searchsorted(segment.codes, codes, side='left')
+            hi = np.searchsorted(segment.codes, codes, side='right')
+            which, rows = _expand_ranges(lo, hi)
+            query, position, reference = owners[which], positions[which], segment.owners[rows]
+            fit = ~found[query] & (position + segment.lengths[reference] <= lengths[query])
+            query, position, reference = query[fit], position[fit], reference[fit]
+            equal = _equal_from(segment.sequences, segment.offsets[reference], flat, starts[query] + position,
+                                segment.lengths[reference], self.k)
+            found[query[equal]] = True
+
+            short = segment.short_peptides(self.k)
+            if short:
+                for i in np.flatnonzero(~found):
+                    found[i] = any(s in peptides[i] for s in short)
+        return found
+
+    def mhc_status(self, peptides, mhc_classes):
+        """
+        Computes `mhc_status` against the reference peptides, with the same rules as
+        `fill_group_II_status`: a class I peptide is shared if it is contained in a
+        reference class II peptide, and a class II peptide if it contains a
+        reference class I peptide. Other classes get None.
+
+        Returns:
+            np.ndarray: Object array of statuses.
+        """
+        peptides = np.asarray(peptides, dtype=object)
+        mhc_classes = np.asarray(mhc_classes, dtype=object)
+        statuses = np.full(len(peptides), None, dtype=object)
+        for mhc_class, query in (('I', self.contained_in_class_II), ('II', self.contains_class_I)):
+            rows = np.flatnonzero((mhc_classes == mhc_class) & np.array([isinstance(p, str) for p in peptides]))
+            if len(rows):
+                shared = query(peptides[rows])
+                statuses[rows] = np.where(shared, SHARED_STATUS, NOT_SHARED_STATUS)
+        return statuses
+
+
+_reference_index = None
+
+
+def load_reference_index(path=REFERENCE_INDEX_PATH):
+    """
+    Returns the reference containment index at `path`, memory-mapped and cached
+    per process, or None if it has not been built.
+    """
+    global _reference_index
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        return None
+    if _reference_index is None or _reference_index.path != path:
+        _reference_index = ContainmentIndex(path)
+    return _reference_index
+
+
+def update_reference_index(path=REFERENCE_INDEX_PATH):
+    """
+    Adds the peptides of the cleaned IEDB and HLA Ligand Atlas data to the reference
+    containment index, creating it if needed. Only peptides not yet indexed are written.
+
+    Returns:
+        int: Number of peptides added.
+    """
+    global _reference_index
+    from src.data_processing.iedb_data_cleaning import load_clean_iedb
+    from src.data_processing.normal_data_cleaning import load_clean_normal
+
+    print("🧬 Updating reference containment index...")
+    index = ContainmentIndex(path)
+    n_added = 0
+    for reference in (load_clean_iedb(), load_clean_normal()):
+        reference = reference.dropna(subset=['Epitope - Name', 'MHC Restriction - Class'])
+        n_added += index.insert(reference['Epitope - Name'], reference['MHC Restriction - Class'])
+    _reference_index = index
+    print(f"✅ Reference index: {n_added} peptides added, {len(index)} in total")
+    return n_added
@@ -3,6 +3,8 @@ from src.config import PROCESSED_DATA_PATH
 
 import pandas as pd
 
+CANCER_FILE_NAME = "benchmark_cancer_positive_negative_tcell_table_export_1753627681.csv"
+PCA_FILE_NAME = "dataset3_pca.csv"
 
 def load_raw_hla_ligand_atlas(normal_file_name = "hla_2020.12_HLA_aggregated.tsv",
                           metadata_file = "hla_2020.12_HLA_sample_hits.tsv"):
@@ -21,14 +23,14 @@ def load_raw_iedb(positive_file_name = "tcell_table_export_1751306060.csv"):
     return iedb_df
 
 
-def load_raw_cancer(cancer_file_name = "benchmark_cancer_positive_negative_tcell_table_export_1753627681.csv"):
+def load_raw_cancer(cancer_file_name = CANCER_FILE_NAME):
     """
     Load IEDB cancer T-cell dataset (positive and negative results) from CSV.
     """
     cancer_df = pd.read_csv(RAW_DATA_PATH + cancer_file_name, sep=',', low_memory=False)
     return cancer_df
 
-def load_dataset3_pca(file_name="dataset3_pca.csv"):
+def load_dataset3_pca(file_name=PCA_FILE_NAME):
     """
     Load the PCA-reduced AA index dataset developed by Ben Galet, PhD, from a CSV file.
     """
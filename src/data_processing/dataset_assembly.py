@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+
+from src.data_processing.feature_engineering import CATEGORICAL_COLUMNS, encode_categorical_features
+from src.data_processing.peptide_store import PeptideStore
+from src.data_processing.sequence_tokenizer import MAX_PEPTIDE_LENGTH, tokenizer_lookup_table
+
+
+# Peptides decoded into a residue index matrix at a time while filling the buffers
+ASSEMBLY_CHUNK_ROWS = 65_536
+
+
+def encode_into(out, table, peptide_store, rows=None):
+    """
+    Writes the encoding of peptides with a tokenizer lookup table into `out`,
+    `ASSEMBLY_CHUNK_ROWS` peptides at a time, without building the full encoding
+    in a temporary array.
+
+    Parameters
+    ----------
+    out : np.ndarray
+        (n, 25, n_features) float32 buffer (or a slice of one).
+    table : np.ndarray
+        Lookup table (see `tokenizer_lookup_table`).
+    peptide_store : PeptideStore
+        Peptides to encode.
+    rows : np.ndarray, optional
+        Rows of `peptide_store` to encode (default: all of them).
+    """
+    rows = np.arange(len(peptide_store)) if rows is None else np.asarray(rows)
+    for start in range(0, len(rows), ASSEMBLY_CHUNK_ROWS):
+        chunk = rows[start:start + ASSEMBLY_CHUNK_ROWS]
+        index_matrix = peptide_store.index_matrix(chunk, maxlen=MAX_PEPTIDE_LENGTH)
+        np.take(table, index_matrix, axis=0, out=out[start:start + len(chunk)], mode='clip')
+
+
+class TrainingSetAssembler:
+    """
+    Builds the training arrays in buffers allocated once at their final size.
+
+    The final row count is known up front, so every output is preallocated with
+    its final dtype: one float32 embedding tensor per tokenizer, the float32
+    one-hot features (columns named as in `CATEGORICAL_COLUMNS`), the float32 labels
+    and sample weights, and the peptides. Each source is then encoded straight into
+    its rows of the buffers, and saved rows can be copied in the same way, so the
+    peak memory of assembling a training set is close to its final size.
+
+    Parameters
+    ----------
+    n_rows : int
+        Final number of rows.
+    tokenizers : list of str
+        Registered tokenizers to encode peptides with.
+    """
+
+    def __init__(self, n_rows, tokenizers):
+        self.n_rows = n_rows
+        self.tables = {name: tokenizer_lookup_table(name) for name in tokenizers}
+        self.embeddings = {name: np.empty((n_rows, MAX_PEPTIDE_LENGTH, table.shape[1]), dtype=np.float32)
+                           for name, table in self.tables.items()}
+        self.categorical = np.empty((n_rows, len(CATEGORICAL_COLUMNS)), dtype=np.float32)
+        self.labels = np.empty(n_rows, dtype=np.float32)
+        self.weights = np.empty(n_rows, dtype=np.float32)
+        self.peptides = np.empty(n_rows, dtype=object)
+        self.filled = 0
+
+    def _claim(self, n):
+        if self.filled + n > self.n_rows:
+            raise ValueError(f"Adding {n} rows to {self.filled} exceeds the {self.n_rows} allocated")
+        rows = slice(self.filled, self.filled + n)
+        self.filled += n
+        return rows
+
+    def add(self, frame, weights):
+        """
+        Encodes one source into the next `len(frame)` rows.
+
+        Parameters
+        ----------
+        frame : pd.DataFrame
+            Labelled rows with 'Epitope - Name', 'target_strength' and the
+            categorical features.
+        weights : np.ndarray
+            Scaled sample weight of every row of `frame`.
+        """
+        rows = self._claim(len(frame))
+        peptides = frame['Epitope - Name'].to_numpy(dtype=object)
+        store = PeptideStore.from_peptides(peptides)
+        for name, table in self.tables.items():
+            encode_into(self.embeddings[name][rows], table, store)
+        self.categorical[rows] = encode_categorical_features(frame).to_numpy()
+        self.labels[rows] = frame['target_strength'].astype(np.float32).to_numpy()
+        self.weights[rows] = weights
+        self.peptides[rows] = peptides
+
+    def add_saved(self, keep, embeddings, categorical, labels, weights, peptides):
+        """
+        Copies the rows of a saved training set where `keep` is True into the next
+        rows, reading each array once (saved embeddings can be memory-mapped).
+
+        Parameters
+        ----------
+        keep : np.ndarray
+            Boolean mask over the saved rows.
+        embeddings : dict
+            Tokenizer name -> saved encoding, for every tokenizer of the assembler.
+        categorical, labels, weights, peptides : array-like
+            Saved features, labels, scaled weights and peptides.
+        """
+        keep = np.asarray(keep, dtype=bool)
+        rows = self._claim(int(keep.sum()))
+        for name, out in self.embeddings.items():
+            np.compress(keep, np.asarray(embeddings[name], dtype=np.float32), axis=0, out=out[rows])
+        self.categorical[rows] = np.asarray(categorical, dtype=np.float32)[keep]
+        self.labels[rows] = np.asarray(labels).astype(np.float32)[keep]
+        self.weights[rows] = np.asarray(weights, dtype=np.float32)[keep]
+        self.peptides[rows] = np.asarray(peptides, dtype=object)[keep]
+
+    def categorical_frame(self):
+        """
+        Returns:
+        --------
+        pd.DataFrame
+            The one-hot features with the `CATEGORICAL_COLUMNS` names, over the buffer.
+        """
+        return pd.DataFrame(self.categorical, columns=CATEGORICAL_COLUMNS, copy=False)
+
+    def check_complete(self):
+        if self.filled != self.n_rows:
+            raise ValueError(f"Only {self.filled} of {self.n_rows} rows were filled")
+
+
+def split_views(arrays, train_idx, val_idx):
+    """
+    Splits arrays into training and validation rows with one gather per array.
+
+    Each array is gathered once into a float32 buffer holding its training rows
+    followed by its validation rows; the training and validation parts returned
+    are views of that buffer, so no further copy is made (and memory-mapped inputs
+    are read once).
+
+    Parameters
+    ----------
+    arrays : list of array-like
+        Arrays with one row per sample.
+    train_idx, val_idx : np.ndarray
+        Row indices of each side.
+
+    Returns
+    -------
+    list of np.ndarray
+        (train, val) views for every array, in order.
+    """
+    order = np.concatenate([train_idx, val_idx])
+    n_train = len(train_idx)
+    views = []
+    for array in arrays:
+        array = np.asarray(array)
+        if array.dtype != np.float32:
+            array = array.astype(np.float32)
+        gathered = np.empty((len(order),) + array.shape[1:], dtype=np.float32)
+        np.take(array, order, axis=0, out=gathered, mode='clip')
+        views += [gathered[:n_train], gathered[n_train:]]
+    return views
@@ -39,3 +39,35 @@ def fill_group_II_status(data_frame):
                 data_frame.at[idx, 'mhc_status'] = 'peptide not shared'
 
     return data_frame
+
+
+# One-hot columns in the order produced by `pd.get_dummies` in `prepare_training_set`
+CATEGORICAL_FEATURES = ['MHC Restriction - Class', 'mhc_status']
+CATEGORICAL_COLUMNS = [
+    'MHC Restriction - Class_I',
+    'MHC Restriction - Class_II',
+    'mhc_status_peptide not shared',
+    'mhc_status_peptide shared in MHC I and II'
+]
+
+
+def encode_categorical_features(data_frame):
+    """
+    One-hot encodes 'MHC Restriction - Class' and 'mhc_status' into the fixed set of
+    columns the model was trained on.
+
+    Levels absent from `data_frame` are filled with zeros, so the output always has
+    the four `CATEGORICAL_COLUMNS` in training order.
+
+    Parameters:
+    -----------
+    data_frame : pd.DataFrame
+        DataFrame with 'MHC Restriction - Class' and 'mhc_status' columns.
+
+    Returns:
+    --------
+    pd.DataFrame
+        Float32 DataFrame with one column per entry in `CATEGORICAL_COLUMNS`.
+    """
+    encoded = pd.get_dummies(data_frame[CATEGORICAL_FEATURES], columns=CATEGORICAL_FEATURES)
+    return encoded.reindex(columns=CATEGORICAL_COLUMNS, fill_value=0).astype('float32')
@@ -0,0 +1,322 @@
+import numpy as np
+import pandas as pd
+
+
+RESIDUE_BITS = 5
+WILDCARD = (1 << RESIDUE_BITS) - 1
+
+
+def peptide_kmers(peptides, k):
+    """
+    Extracts every k-mer of every peptide as an integer code.
+
+    Residues are packed at 5 bits each, so k can be up to 12. Peptides shorter
+    than k contribute no k-mers.
+
+    Parameters:
+    -----------
+    peptides : sequence of str
+        Upper-case peptide sequences.
+    k : int
+        K-mer length.
+
+    Returns:
+    --------
+    tuple of np.ndarray
+        - codes : int64 code of each k-mer
+        - owners : index of the peptide each k-mer comes from
+        - positions : start position of each k-mer inside its peptide
+    """
+    peptides = [str(p) for p in peptides]
+    lengths = np.fromiter((len(p) for p in peptides), dtype=np.int64, count=len(peptides))
+    flat = np.frombuffer(''.join(peptides).encode('ascii'), dtype=np.uint8).astype(np.int64) - ord('A')
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+    n_kmers = np.maximum(lengths - k + 1, 0)
+    owners = np.repeat(np.arange(len(peptides)), n_kmers)
+    positions = np.arange(n_kmers.sum()) - np.repeat(np.cumsum(n_kmers) - n_kmers, n_kmers)
+    starts = offsets[owners] + positions
+
+    codes = np.zeros(len(starts), dtype=np.int64)
+    for j in range(k):
+        codes = (codes << RESIDUE_BITS) | flat[starts + j]
+    return codes, owners, positions
+
+
+def _masked_kmers(codes, k):
+    """
+    Expands each k-mer into k seeds, each with one position replaced by a wildcard,
+    so that k-mers differing by a single substitution share a seed.
+
+    Returns:
+    --------
+    tuple of np.ndarray
+        - seeds : int64 seed codes, k per input k-mer
+        - source : index of the k-mer each seed comes from
+    """
+    seeds = []
+    for j in range(k):
+        shift = RESIDUE_BITS * (k - 1 - j)
+        seeds.append((codes & ~(np.int64(WILDCARD) << shift)) | (np.int64(WILDCARD) << shift))
+    # The wildcard code never occurs as a residue, so seeds masked at different
+    # positions cannot collide
+    return np.stack(seeds, axis=1).ravel(), np.repeat(np.arange(len(codes)), k)
+
+
+def _shared_key_edges(keys, owners):
+    """
+    Links each owner to the next owner sharing the same key, after one sort.
+
+    Returns:
+    --------
+    tuple of np.ndarray
+        Endpoints (a, b) of the edges.
+    """
+    order = np.lexsort((owners, keys))
+    keys, owners = keys[order], owners[order]
+    same = (keys[1:] == keys[:-1]) & (owners[1:] != owners[:-1])
+    return owners[:-1][same], owners[1:][same]
+
+
+def connected_components(n_nodes, a, b):
+    """
+    Labels the connected components of an undirected graph given as an edge list.
+
+    Uses vectorized min-label hooking with pointer jumping, so it runs in a few
+    passes over the edges instead of a Python loop per edge.
+
+    Returns:
+    --------
+    np.ndarray
+        Component label (smallest node index of the component) for every node.
+    """
+    labels = np.arange(n_nodes)
+    if len(a) == 0:
+        return labels
+    while True:
+        la, lb = labels[a], labels[b]
+        if np.array_equal(la, lb):
+            return labels
+        low = np.minimum(la, lb)
+        np.minimum.at(labels, la, low)
+        np.minimum.at(labels, lb, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+
+def cluster_peptides(peptides, k=8, mismatches=0):
+    """
+    Clusters peptides by shared k-mers.
+
+    Two peptides end up in the same cluster if they are linked by a chain of
+    peptides sharing at least one k-mer. With the default k=8 (the minimum peptide
+    length), identical and nested peptides, such as the class I peptides contained
+    in class II peptides, always fall in the same cluster. With `mismatches=1`,
+    k-mers that differ by a single substitution are also linked.
+
+    The index is built with one sort of all k-mer codes, so the cost grows with
+    the total number of k-mers, not with the number of peptide pairs.
+
+    Parameters:
+    -----------
+    peptides : sequence of str
+        Peptide sequences.
+    k : int, optional
+        K-mer length (at most 12).
+    mismatches : int, optional
+        0 for exact k-mers, 1 to tolerate one substitution per k-mer.
+
+    Returns:
+    --------
+    np.ndarray
+        Cluster label for every peptide.
+    """
+    peptides = list(peptides)
+    codes, owners, _ = peptide_kmers(peptides, k)
+    a, b = _shared_key_edges(codes, owners)
+    if mismatches:
+        seeds, source = _masked_kmers(codes, k)
+        a_masked, b_masked = _shared_key_edges(seeds, owners[source])
+        a, b = np.concatenate([a, a_masked]), np.concatenate([b, b_masked])
+
+    # Identical peptides shorter than k share no k-mer but must stay together
+    _, first = np.unique(np.asarray(peptides, dtype=object).astype(str), return_inverse=True)
+    a_same, b_same = _shared_key_edges(first.ravel(), np.arange(len(peptides)))
+    a, b = np.concatenate([a, a_same]), np.concatenate([b, b_same])
+
+    return connected_components(len(peptides), a, b)
+
+
+def assign_cluster_folds(clusters, n_folds=5, random_state=42):
+    """
+    Assigns whole clusters to folds while balancing the number of rows per fold.
+
+    Clusters are visited from largest to smallest (ties in random order) and each
+    one goes to the fold with the fewest rows so far.
+
+    Parameters:
+    -----------
+    clusters : array-like
+        Cluster label of every row.
+    n_folds : int, optional
+        Number of folds.
+    random_state : int, optional
+        Seed for the tie-breaking order.
+
+    Returns:
+    --------
+    np.ndarray
+        Fold index of every row.
+    """
+    rng = np.random.default_rng(random_state)
+    labels, inverse, sizes = np.unique(clusters, return_inverse=True, return_counts=True)
+    order = np.lexsort((rng.random(len(labels)), -sizes))
+
+    fold_sizes = np.zeros(n_folds, dtype=np.int64)
+    cluster_fold = np.empty(len(labels), dtype=np.int64)
+    for cluster in order:
+        fold = np.argmin(fold_sizes)
+        cluster_fold[cluster] = fold
+        fold_sizes[fold] += sizes[cluster]
+    return cluster_fold[inverse.ravel()]
+
+
+def grouped_train_val_indices(peptides, val_size=0.2, random_state=42, k=8, mismatches=0, tolerance=0.02):
+    """
+    Splits rows into training and validation sets without splitting homology clusters.
+
+    Clusters from `cluster_peptides` are visited in random order and moved to
+    validation until it holds at least `val_size` of the rows. A cluster that would
+    take validation more than `tolerance` (a fraction of all rows) past `val_size`
+    is skipped, so a giant cluster cannot empty the training set.
+
+    Returns:
+    --------
+    tuple of np.ndarray
+        Sorted row indices of the training and validation sets.
+    """
+    clusters = cluster_peptides(peptides, k=k, mismatches=mismatches)
+    labels, inverse, sizes = np.unique(clusters, return_inverse=True, return_counts=True)
+    n_rows = len(clusters)
+    target = val_size * n_rows
+    limit = target + tolerance * n_rows
+
+    rng = np.random.default_rng(random_state)
+    is_val_cluster = np.zeros(len(labels), dtype=bool)
+    n_val = 0
+    for cluster in rng.permutation(len(labels)):
+        if n_val >= target:
+            break
+        if n_val + sizes[cluster] <= limit:
+            is_val_cluster[cluster] = True
+            n_val += sizes[cluster]
+
+    print(f"🧬 Homology split: {n_val / max(n_rows, 1):.1%} of rows in validation (target {val_size:.1%}), "
+          f"{len(labels)} clusters, largest holds {sizes.max(initial=0) / max(n_rows, 1):.1%} of rows")
+    is_val = is_val_cluster[inverse.ravel()]
+    return np.flatnonzero(~is_val), np.flatnonzero(is_val)
+
+
+def _short_containment(short, others):
+    """
+    Finds which of the `others` peptides contain one of the `short` peptides, by
+    looking up every window of each `short` length in a set.
+
+    Returns:
+    --------
+    tuple of np.ndarray
+        - short_hits : whether each `short` peptide occurs in some of `others`
+        - other_hits : whether each of `others` contains some `short` peptide
+    """
+    short_hits = np.zeros(len(short), dtype=bool)
+    other_hits = np.zeros(len(others), dtype=bool)
+    lengths = np.array([len(p) for p in short], dtype=np.int64)
+    for length in np.unique(lengths):
+        members = np.flatnonzero(lengths == length)
+        needles = {short[i] for i in members}
+        found = set()
+        for j, peptide in enumerate(others):
+            hits = {peptide[i:i + length] for i in range(len(peptide) - length + 1)} & needles
+            if hits:
+                other_hits[j] = True
+                found |= hits
+        short_hits[members] = [short[i] in found for i in members]
+    return short_hits, other_hits
+
+
+def leakage_report(train_peptides, test_peptides, k=8):
+    """
+    Measures how many test peptides have close homologs in the training set.
+
+    Parameters:
+    -----------
+    train_peptides : sequence of str
+        Training peptides.
+    test_peptides : sequence of str
+        Test (e.g. cancer benchmark) peptides.
+    k : int, optional
+        K-mer length used to detect shared subsequences.
+
+    Returns:
+    --------
+    pd.DataFrame
+        One row per leakage type ('identical', 'contained', 'shared_kmer') with the
+        number and fraction of distinct test peptides affected. Categories are
+        cumulative: identical peptides are also counted as contained and sharing a k-mer.
+
+    Notes:
+    ------
+    'contained' means the test peptide is a substring of a training peptide or the
+    other way round. Pairs whose shorter peptide has at least `k` residues are found
+    through their shared k-mers; peptides shorter than `k` have no k-mer, so they are
+    checked by direct substring lookup instead, and a contained one also counts as
+    sharing a k-mer.
+    """
+    train = np.unique(np.asarray(list(train_peptides), dtype=str))
+    test = np.unique(np.asarray(list(test_peptides), dtype=str))
+
+    identical = np.isin(test, train)
+
+    train_codes, train_owners, train_positions = peptide_kmers(train, k)
+    test_codes, test_owners, test_positions = peptide_kmers(test, k)
+    shared = identical.copy()
+    shared[test_owners[np.isin(test_codes, train_codes)]] = True
+
+    # Containment implies sharing the first k-mer of the shorter peptide, so only
+    # the peptides holding that k-mer are compared as strings
+    contained = identical.copy()
+    train_by_code = np.argsort(train_codes, kind='stable')
+    sorted_train_codes = train_codes[train_by_code]
+    for code, owner in zip(test_codes[test_positions == 0], test_owners[test_positions == 0]):
+        if contained[owner] or not shared[owner]:
+            continue
+        lo, hi = np.searchsorted(sorted_train_codes, [code, code + 1])
+        contained[owner] = any(test[owner] in train[t] for t in train_owners[train_by_code[lo:hi]])
+
+    test_by_code = np.argsort(test_codes, kind='stable')
+    sorted_test_codes = test_codes[test_by_code]
+    for code, owner in zip(train_codes[train_positions == 0], train_owners[train_positions == 0]):
+        lo, hi = np.searchsorted(sorted_test_codes, [code, code + 1])
+        for t in test_owners[test_by_code[lo:hi]]:
+            if not contained[t] and train[owner] in test[t]:
+                contained[t] = True
+
+    # Peptides shorter than k have no k-mers to match on
+    short_test = np.flatnonzero(np.char.str_len(test) < k)
+    if len(short_test):
+        contained[short_test] |= _short_containment(test[short_test], train)[0]
+    short_train = np.char.str_len(train) < k
+    if short_train.any():
+        contained |= _short_containment(train[short_train], test)[1]
+    shared |= contained
+
+    n_test = len(test)
+    counts = {'identical': int(identical.sum()), 'contained': int(contained.sum()), 'shared_kmer': int(shared.sum())}
+    return pd.DataFrame({
+        'leakage': list(counts),
+        'n_test_peptides': list(counts.values()),
+        'fraction': [c / n_test if n_test else 0.0 for c in counts.values()]
+    })
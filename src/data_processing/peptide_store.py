@@ -0,0 +1,148 @@
+import json
+import os
+
+import numpy as np
+
+
+ALPHABET = "ACDEFGHIKLMNPQRSTVWY"
+BITS_PER_RESIDUE = 5
+PAD_INDEX = 0
+
+# ASCII byte -> residue index (1..20), 0 for any other byte
+_ASCII_TO_INDEX = np.zeros(256, dtype=np.uint8)
+_ASCII_TO_INDEX[np.frombuffer(ALPHABET.encode('ascii'), dtype=np.uint8)] = np.arange(1, len(ALPHABET) + 1)
+_INDEX_TO_ASCII = np.frombuffer(b'-' + ALPHABET.encode('ascii'), dtype=np.uint8)
+
+
+class PeptideStore:
+    """
+    Compact, memory-mappable store of peptide sequences.
+
+    Residues are stored as their index in `ALPHABET` (1 to 20) packed at 5 bits
+    each into one byte array, and an int64 offsets array gives the first residue of
+    every peptide, so a million 15-mers take about 10 MB instead of the ~70 MB of
+    Python strings. Any peptide can be read in O(1), and `index_matrix` decodes a
+    batch of peptides directly into the padded uint8 index matrix that tokenizers
+    turn into embeddings.
+
+    On disk, a store is a directory with 'packed.npy', 'offsets.npy' and
+    'store.json'; `load` memory-maps the arrays by default.
+    """
+
+    def __init__(self, packed, offsets):
+        self.packed = packed
+        self.offsets = offsets
+
+    @classmethod
+    def from_peptides(cls, peptides):
+        """
+        Packs a sequence of peptides made of the 20 standard amino acids.
+
+        Raises:
+            ValueError: If a peptide contains another character.
+        """
+        peptides = [str(p) for p in peptides]
+        lengths = np.fromiter((len(p) for p in peptides), dtype=np.int64, count=len(peptides))
+        indices = _ASCII_TO_INDEX[np.frombuffer(''.join(peptides).encode('ascii', errors='replace'), dtype=np.uint8)]
+        if np.any(indices == PAD_INDEX):
+            first_bad = np.repeat(np.arange(len(peptides)), lengths)[indices == PAD_INDEX][0]
+            raise ValueError(f"Peptide {peptides[first_bad]!r} contains characters outside {ALPHABET}")
+
+        shifts = np.arange(BITS_PER_RESIDUE - 1, -1, -1, dtype=np.uint8)
+        bits = ((indices[:, None] >> shifts) & 1).astype(np.uint8).ravel()
+        # One spare byte lets every residue be read as a 16-bit window
+        packed = np.concatenate([np.packbits(bits), np.zeros(1, dtype=np.uint8)])
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        return cls(packed, offsets)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        return cls(np.load(os.path.join(path, "packed.npy"), mmap_mode=mmap_mode),
+                   np.load(os.path.join(path, "offsets.npy"), mmap_mode=mmap_mode))
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "packed.npy"), np.asarray(self.packed))
+        np.save(os.path.join(path, "offsets.npy"), np.asarray(self.offsets))
+        with open(os.path.join(path, "store.json"), 'w') as handle:
+            json.dump({'alphabet': ALPHABET, 'bits_per_residue': BITS_PER_RESIDUE,
+                       'n_peptides': len(self), 'n_residues': int(self.offsets[-1])}, handle, indent=2)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return _INDEX_TO_ASCII[self._residues(np.arange(start, end))].tobytes().decode('ascii')
+
+    def _residues(self, positions):
+        """
+        Residue indices at the given global residue positions.
+        """
+        bit = np.asarray(positions, dtype=np.int64) * BITS_PER_RESIDUE
+        byte = bit >> 3
+        window = (self.packed[byte].astype(np.uint16) << 8) | self.packed[byte + 1]
+        return ((window >> (16 - BITS_PER_RESIDUE - (bit & 7)).astype(np.uint16)) & 0x1F).astype(np.uint8)
+
+    def _rows(self, rows):
+        return np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+
+    def lengths(self, rows=None):
+        """
+        Returns:
+            np.ndarray: Length of each requested peptide.
+        """
+        rows = self._rows(rows)
+        return self.offsets[rows + 1] - self.offsets[rows]
+
+    def index_matrix(self, rows=None, maxlen=25):
+        """
+        Decodes peptides into a (n, maxlen) uint8 matrix of residue indices
+        (1-20 in `ALPHABET` order), padded with 0 at the end. Like
+        `pad_sequences`, peptides longer than `maxlen` keep their last `maxlen` residues.
+        """
+        rows = self._rows(rows)
+        lengths = self.lengths(rows)
+        starts = self.offsets[rows] + np.maximum(lengths - maxlen, 0)
+        positions = np.arange(maxlen)
+        present = positions[None, :] < np.minimum(lengths, maxlen)[:, None]
+        matrix = np.zeros((len(rows), maxlen), dtype=np.uint8)
+        matrix[present] = self._residues((starts[:, None] + positions[None, :])[present])
+        return matrix
+
+    def decode(self, rows=None):
+        """
+        Returns:
+            list of str: The requested peptides.
+        """
+        rows = self._rows(rows)
+        lengths = self.lengths(rows)
+        text = _INDEX_TO_ASCII[self._residues(
+            np.repeat(self.offsets[rows] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        )].tobytes().decode('ascii')
+        ends = np.cumsum(lengths)
+        return [text[end - length:end] for end, length in zip(ends.tolist(), lengths.tolist())]
+
+    def composition(self, rows=None):
+        """
+        Returns:
+            np.ndarray: (n, 20) count of each residue of `ALPHABET` in each peptide.
+        """
+        rows = self._rows(rows)
+        lengths = self.lengths(rows)
+        owners = np.repeat(np.arange(len(rows)), lengths)
+        residues = self._residues(np.repeat(self.offsets[rows] - np.cumsum(lengths) + lengths, lengths)
+                                  + np.arange(lengths.sum()))
+        counts = np.zeros((len(rows), len(ALPHABET) + 1), dtype=np.int32)
+        np.add.at(counts, (owners, residues), 1)
+        return counts[:, 1:]
+
+    def contains_any(self, residues, rows=None):
+        """
+        Returns:
+            np.ndarray: True for each peptide containing at least one of `residues` (e.g. 'CM').
+        """
+        columns = [ALPHABET.index(residue) for residue in residues]
+        return self.composition(rows)[:, columns].sum(axis=1) > 0
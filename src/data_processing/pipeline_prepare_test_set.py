@@ -0,0 +1,154 @@
+import json
+import os
+import re
+
+import numpy as np
+
+from src.config import RAW_DATA_PATH, PROCESSED_DATA_PATH
+from src.utils import file_fingerprint, fingerprint_matches
+from src.data_processing.data_loader import CANCER_FILE_NAME, PCA_FILE_NAME
+from src.data_processing.cancer_data_cleaning import load_clean_cancer
+from src.data_processing.target_engineering import create_target_features
+from src.scoring import INPUT_KEY_COLUMNS, deduplicate_inputs, encode_inputs
+
+
+# Bump when the preparation steps change so existing caches are rebuilt
+TEST_SET_VERSION = 1
+VALID_PEPTIDE_PATTERN = r'^[ACDEFGHIKLMNPQRSTVWY]{9,20}$'
+TEST_SET_ARRAYS = ['X_tokenized', 'X_categorical', 'inverse', 'y', 'peptides', 'mhc_classes', 'mhc_statuses']
+
+
+def test_set_dir(tokenizer='AA_index_tokenizer'):
+    return PROCESSED_DATA_PATH + "cancer_test_set_" + tokenizer + "/"
+
+
+def _test_set_inputs():
+    return {
+        'cancer': RAW_DATA_PATH + CANCER_FILE_NAME,
+        'pca_table': PROCESSED_DATA_PATH + PCA_FILE_NAME
+    }
+
+
+def prepare_test_set(tokenizer='AA_index_tokenizer'):
+    """
+    Prepares and saves the cancer benchmark test set.
+
+    This function performs the following steps:
+    1. Loads and cleans the IEDB cancer benchmark with `load_clean_cancer`.
+    2. Generates target labels using `create_target_features`.
+    3. Keeps peptides of 9 to 20 standard amino acids.
+    4. Deduplicates (peptide, MHC class, mhc_status) inputs.
+    5. Tokenizes and one-hot encodes each distinct input once.
+    6. Saves the arrays as uncompressed `.npy` files plus a manifest with the
+       fingerprints of the raw inputs.
+
+    Parameters
+    ----------
+    tokenizer : str, optional
+        Registered tokenizer to use for sequence embedding (see `TOKENIZERS`);
+        each tokenizer gets its own test set directory. Default 'AA_index_tokenizer'.
+
+    Saved Files
+    -----------
+    - X_tokenized.npy : embeddings of the distinct inputs, (n_unique, 25, 20, 1)
+    - X_categorical.npy : one-hot features of the distinct inputs, (n_unique, 4)
+    - inverse.npy : row -> distinct input mapping, (n_rows,)
+    - y.npy : binary labels per row, (n_rows,)
+    - peptides.npy, mhc_classes.npy, mhc_statuses.npy : distinct input tuples
+    - manifest.json : input fingerprints and array shapes
+
+    Returns
+    -------
+    None
+    """
+    print("🧪 Preparing cancer benchmark test set...")
+    inputs = _test_set_inputs()
+
+    cancer_df = load_clean_cancer()
+    target_cancer = create_target_features(cancer_df)
+
+    valid_aa_pattern = re.compile(VALID_PEPTIDE_PATTERN)
+    target_cancer = target_cancer[target_cancer['Epitope - Name'].apply(lambda x: bool(valid_aa_pattern.match(str(x))))]
+
+    unique_df, inverse = deduplicate_inputs(target_cancer)
+    X_tokenized, X_categorical = encode_inputs(unique_df, tokenizer)
+
+    arrays = {
+        'X_tokenized': X_tokenized.astype(np.float32),
+        'X_categorical': X_categorical.astype(np.float32),
+        'inverse': inverse.astype(np.int64),
+        'y': target_cancer['target_strength'].astype(int).to_numpy(),
+        'peptides': unique_df[INPUT_KEY_COLUMNS[0]].to_numpy().astype(str),
+        'mhc_classes': unique_df[INPUT_KEY_COLUMNS[1]].to_numpy().astype(str),
+        'mhc_statuses': unique_df[INPUT_KEY_COLUMNS[2]].to_numpy().astype(str)
+    }
+
+    output_dir = test_set_dir(tokenizer)
+    os.makedirs(output_dir, exist_ok=True)
+    if os.path.exists(output_dir + "manifest.json"):
+        os.remove(output_dir + "manifest.json")
+    for name, array in arrays.items():
+        np.save(output_dir + name + ".npy", array)
+
+    manifest = {
+        'version': TEST_SET_VERSION,
+        'tokenizer': tokenizer,
+        'valid_peptide_pattern': VALID_PEPTIDE_PATTERN,
+        'inputs': {name: file_fingerprint(path) for name, path in inputs.items()},
+        'shapes': {name: list(array.shape) for name, array in arrays.items()}
+    }
+    # Written last, so an interrupted run never leaves a manifest over partial arrays
+    with open(output_dir + "manifest.json.tmp", 'w') as handle:
+        json.dump(manifest, handle, indent=2)
+    os.replace(output_dir + "manifest.json.tmp", output_dir + "manifest.json")
+
+    print(f"✅ Test set saved: {len(arrays['y'])} rows, {len(arrays['peptides'])} unique inputs")
+
+
+def test_set_is_current(tokenizer='AA_index_tokenizer'):
+    """
+    Checks that a saved test set exists and was built from the current raw inputs.
+
+    Returns
+    -------
+    bool
+        False if the manifest is missing, was written by another pipeline version,
+        or any input file changed since it was built.
+    """
+    manifest_path = test_set_dir(tokenizer) + "manifest.json"
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path) as handle:
+        manifest = json.load(handle)
+
+    if manifest.get('version') != TEST_SET_VERSION or manifest.get('valid_peptide_pattern') != VALID_PEPTIDE_PATTERN:
+        return False
+    recorded = manifest.get('inputs', {})
+    return all(name in recorded and fingerprint_matches(path, recorded[name])
+               for name, path in _test_set_inputs().items())
+
+
+def load_or_create_test_set(tokenizer='AA_index_tokenizer', mmap_mode='r'):
+    """
+    Loads the prepared cancer test set, rebuilding it first if it is missing or stale.
+
+    Parameters
+    ----------
+    tokenizer : str, optional
+        Name of the tokenizer used to generate amino acid embeddings.
+    mmap_mode : str or None, optional
+        Passed to `np.load`; the default memory-maps the arrays read-only.
+
+    Returns
+    -------
+    dict
+        Arrays keyed by the names listed in `TEST_SET_ARRAYS`.
+    """
+    if test_set_is_current(tokenizer):
+        print("✅ Prepared test set found. Loading...")
+    else:
+        print("⚠️ Test set missing or out of date. Running prepare_test_set()...")
+        prepare_test_set(tokenizer)
+
+    output_dir = test_set_dir(tokenizer)
+    return {name: np.load(output_dir + name + ".npy", mmap_mode=mmap_mode) for name in TEST_SET_ARRAYS}
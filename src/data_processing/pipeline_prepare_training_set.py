@@ -12,89 +12,194 @@ from src.config import PROCESSED_DATA_PATH
 from src.data_processing.iedb_data_cleaning import load_clean_iedb
 from src.data_processing.normal_data_cleaning import load_clean_normal
 from src.data_processing.target_engineering import create_target_features
-from src.data_processing.sequence_tokenizer import AA_index_tokenizer
+from src.data_processing.sequence_tokenizer import MAX_PEPTIDE_LENGTH, TOKENIZERS, tokenizer_lookup_table
+from src.data_processing.peptide_store import PeptideStore
+from src.data_processing.dataset_assembly import TrainingSetAssembler, encode_into, split_views
+from src.data_processing.homology import grouped_train_val_indices, leakage_report
+from src.data_processing.pipeline_prepare_test_set import load_or_create_test_set
 
-def prepare_training_set(tokenizer='AA_index_tokenizer'):
+
+PEPTIDE_STORE_PATH = PROCESSED_DATA_PATH + "peptide_store/"
+
+# Columns identifying a training row; a change in any of them makes it a new row
+ROW_KEY_COLUMNS = [
+    'Epitope - Name', 'MHC Restriction - Class', 'mhc_status',
+    'target_strength', 'averaged_number_positive_subjects_tested'
+]
+WEIGHT_COLUMN = 'averaged_number_positive_subjects_tested'
+
+
+def training_sources():
     """
-    Prepares and saves the training dataset for immunogenicity prediction.
+    Loads and cleans the HLA Ligand Atlas and IEDB data, each labelled with
+    `create_target_features`.
 
-    This function performs the following steps:
-    1. Loads and cleans positive (IEDB) and negative/control (HLA Ligand Atlas) peptide datasets.
-    2. Merges datasets into one DataFrame.
-    3. Generates target labels using `create_target_features`.
-    4. One-hot encodes categorical variables: 'MHC Restriction - Class' and 'mhc_status'.
-    5. Tokenizes peptide sequences using the specified tokenizer (default: AA_index).
-    6. Extracts one-hot encoded features from the DataFrame.
-    7. Extracts the target label (`target_strength`) and sample weights.
-    8. Scales the sample weights to a fixed range using MinMaxScaler (e.g., [0.1, 0.2]).
-    9. Saves all preprocessed components as `.joblib` files for reuse.
+    Returns
+    -------
+    list of pd.DataFrame
+        The normal and IEDB rows, in training set order.
+    """
+    return [create_target_features(load_clean_normal()), create_target_features(load_clean_iedb())]
 
-    Parameters
-    ----------
-    tokenizer : str, optional
-        Tokenizer to use for sequence embedding. Currently supports:
-        - 'AA_index_tokenizer' (default)
 
-    Saved Files
-    -----------
-    - X_pca_aa_<tokenizer>.joblib : PCA-transformed amino acid embeddings
-    - X_categorical.joblib : One-hot encoded categorical features
-    - Y.joblib : Target labels (binary)
-    - scaled_sample_weights.joblib : Normalized sample weights
+def build_training_frame():
+    """
+    Loads and cleans the IEDB and HLA Ligand Atlas data and merges them into one
+    labelled DataFrame.
 
     Returns
     -------
-    None
+    pd.DataFrame
+        Combined dataset with a 'target_strength' column.
+    """
+    return pd.concat(training_sources(), ignore_index=True)
+
+
+def training_row_keys(data_frame):
+    """
+    Hashes the `ROW_KEY_COLUMNS` of every row into a 64-bit key.
+
+    Returns
+    -------
+    np.ndarray
+        uint64 key per row.
     """
+    return pd.util.hash_pandas_object(data_frame[ROW_KEY_COLUMNS], index=False).to_numpy()
 
-    normals  = load_clean_normal()
-    iedb_df = load_clean_iedb()
 
+def sources_row_keys(sources):
+    """
+    Row keys of the rows of `sources`, in training set order. The key columns are
+    merged first, so the keys match those of `build_training_frame`.
+    """
+    return training_row_keys(pd.concat([source[ROW_KEY_COLUMNS] for source in sources], ignore_index=True))
 
 
-    # Combine the IEDB and normal dataframes
-    full_df= pd.concat([normals, iedb_df], ignore_index=True)
-    target_df = create_target_features(full_df)
+def _dump(obj, path, compress=3):
+    # Written next to the target and renamed, so a memory-mapped previous version stays readable
+    joblib.dump(obj, path + ".tmp", compress=compress)
+    os.replace(path + ".tmp", path)
 
-    # Define the categorical features to be one-hot encoded
-    categorical_features = ['MHC Restriction - Class', 'mhc_status']
 
-    # One-hot encode the categorical features and append them to the dataframe
-    target_encoded = pd.get_dummies(target_df, columns=categorical_features)
+def tokenized_data_path(tokenizer):
+    """
+    Returns the path of the saved encoding of the training peptides with `tokenizer`.
+    """
+    if tokenizer == 'AA_index_tokenizer':
+        return PROCESSED_DATA_PATH + 'X_pca_aa_index_tokenized.joblib'
+    return PROCESSED_DATA_PATH + 'X_' + tokenizer + '.joblib'
 
 
+def saved_tokenizers():
+    """
+    Returns the registered tokenizers whose encoding of the training set is saved.
+    """
+    return [name for name in TOKENIZERS if os.path.exists(tokenized_data_path(name))]
 
-    # Extract the last 4 columns which correspond to the one-hot encoded categorical variables
-    X_categorical = target_encoded.iloc[:, -4:]  # Assumes exactly 2 categorical features with 2 levels each
 
-    # Extract the target variable representing immunogenicity strength
-    Y = target_encoded['target_strength']
+def encode_training_set(tokenizers, peptide_store=None):
+    """
+    Encodes the training peptides with one or more tokenizers and saves each
+    encoding next to the others (see `tokenized_data_path`).
 
-    # Extract the raw sample weights (number of individuals supporting the observation)
-    sample_weights = target_encoded['averaged_number_positive_subjects_tested']
+    Every encoding is a lookup over the residue index matrix of the `PeptideStore`,
+    written chunk by chunk into its final buffer (see `encode_into`), so adding an
+    encoding does not clean or process the raw data again. Encodings are saved
+    uncompressed, so they can be memory-mapped.
+
+    Parameters
+    ----------
+    tokenizers : str or list of str
+        Registered tokenizer names.
+    peptide_store : PeptideStore, optional
+        Training peptides (default: the saved store).
+    """
+    if peptide_store is None:
+        peptide_store = PeptideStore.load(PEPTIDE_STORE_PATH)
+    for name in [tokenizers] if isinstance(tokenizers, str) else tokenizers:
+        table = tokenizer_lookup_table(name)
+        X_tokenized = np.empty((len(peptide_store), MAX_PEPTIDE_LENGTH, table.shape[1]), dtype=np.float32)
+        encode_into(X_tokenized, table, peptide_store)
+        _dump(X_tokenized, tokenized_data_path(name), compress=0)
+        print(f"✅ Saved '{name}' encoding of {len(X_tokenized)} peptides")
+
+
+def save_training_set(assembler, row_keys):
+    """
+    Saves the arrays of a complete `TrainingSetAssembler`, with the row keys of its
+    rows (see `prepare_training_set` for the files). Encodings are saved
+    uncompressed, so they can be memory-mapped.
+    """
+    assembler.check_complete()
+    for name, X_tokenized in assembler.embeddings.items():
+        _dump(X_tokenized, tokenized_data_path(name), compress=0)
+    _dump(assembler.categorical_frame(), PROCESSED_DATA_PATH + 'X_categorical.joblib')
+    _dump(pd.Series(assembler.labels, name='target_strength'), PROCESSED_DATA_PATH + 'Y.joblib')
+    _dump(assembler.weights, PROCESSED_DATA_PATH + 'scaled_sample_weights.joblib')
+    PeptideStore.from_peptides(assembler.peptides).save(PEPTIDE_STORE_PATH)
+    _dump(row_keys, PROCESSED_DATA_PATH + 'row_keys.joblib')
 
-    # Scale the sample weights to a fixed range (e.g., [0.1, 0.2]) to avoid large disparities in loss contribution
-    scaler = MinMaxScaler(feature_range=(0.1, 0.2))
-    array_weights = sample_weights.to_numpy().reshape(-1, 1)
-    scaled_sample_weights = scaler.fit_transform(array_weights).flatten()
 
-    # Save the processed datasets and scaled weights for future reuse
+def prepare_training_set(tokenizer='AA_index_tokenizer'):
+    """
+    Prepares and saves the training dataset for immunogenicity prediction.
+
+    This function performs the following steps:
+    1. Loads and cleans positive (IEDB) and negative/control (HLA Ligand Atlas) peptide datasets.
+    2. Generates target labels of each using `create_target_features`.
+    3. Fits the MinMaxScaler of the sample weights to a fixed range (e.g., [0.1, 0.2])
+       over both sources.
+    4. Allocates every output at its final size once (see `TrainingSetAssembler`) and
+       fills it source by source: peptide embeddings for the specified tokenizers
+       (default: AA_index) plus any other encoding already saved, the one-hot
+       'MHC Restriction - Class' and 'mhc_status' columns (by name), the target label
+       (`target_strength`) and the scaled sample weights.
+    5. Saves all preprocessed components as `.joblib` files for reuse.
+
+    The sources are never concatenated and no intermediate copy of the embeddings
+    is made, so peak memory is close to the size of the final dataset.
 
-    joblib.dump(X_categorical, PROCESSED_DATA_PATH + 'X_categorical.joblib', compress=3)
-    joblib.dump(Y, PROCESSED_DATA_PATH + 'Y.joblib', compress=3)
-    joblib.dump(scaled_sample_weights, PROCESSED_DATA_PATH + 'scaled_sample_weights.joblib', compress=3)
+    Parameters
+    ----------
+    tokenizer : str or list of str, optional
+        Registered tokenizers (see `TOKENIZERS`) to encode peptides with:
+        - 'AA_index_tokenizer' (default)
+        - 'one_hot_tokenizer'
+        - 'BLOSUM62_tokenizer'
 
-    #TOKENIZER CHOICE:
+    Saved Files
+    -----------
+    - X_pca_aa_index_tokenized.joblib, X_<tokenizer>.joblib : Peptide embeddings,
+      one file per tokenizer (see `tokenized_data_path`)
+    - X_categorical.joblib : One-hot encoded categorical features
+    - Y.joblib : Target labels (binary)
+    - scaled_sample_weights.joblib : Normalized sample weights
+    - peptide_store/ : Peptide sequences as a `PeptideStore`, used for homology-aware splitting
+    - row_keys.joblib : Row hashes, used to detect new rows for incremental training
+    - weight_scaler.joblib : The fitted MinMaxScaler
 
-    if tokenizer=='AA_index_tokenizer':
-        # Generate amino acid PCA embeddings for each peptide sequence (as a list of matrices)
-        X_pca_aa_index = AA_index_tokenizer(target_encoded)
-        joblib.dump(X_pca_aa_index, PROCESSED_DATA_PATH + 'X_pca_aa_index_tokenized.joblib', compress=3)
+    Returns
+    -------
+    None
+    """
 
+    sources = training_sources()
 
+    # Encodings saved earlier are rebuilt too, so they stay aligned with the new rows
+    tokenizers = [tokenizer] if isinstance(tokenizer, str) else list(tokenizer)
+    tokenizers += [name for name in saved_tokenizers() if name not in tokenizers]
 
+    # Scale the sample weights to a fixed range (e.g., [0.1, 0.2]) to avoid large disparities in loss contribution
+    scaler = MinMaxScaler(feature_range=(0.1, 0.2))
+    scaler.fit(np.concatenate([source[[WEIGHT_COLUMN]].to_numpy(dtype=np.float64) for source in sources]))
 
+    assembler = TrainingSetAssembler(sum(len(source) for source in sources), tokenizers)
+    for source in sources:
+        assembler.add(source, scaler.transform(source[[WEIGHT_COLUMN]].to_numpy(dtype=np.float64)).flatten())
+    print(f"✅ Assembled {assembler.n_rows} training rows with {', '.join(tokenizers)}")
 
+    save_training_set(assembler, sources_row_keys(sources))
+    joblib.dump(scaler, PROCESSED_DATA_PATH + 'weight_scaler.joblib', compress=3)
 
 
 def load_or_create_training_data(tokenizer='AA_index_tokenizer'):
@@ -102,18 +207,25 @@ def load_or_create_training_data(tokenizer='AA_index_tokenizer'):
     Loads preprocessed training data from disk if available; otherwise, generates it.
 
     This function attempts to load four joblib files:
-    - X_pca_aa_<tokenizer>.joblib : Tokenized and embedded peptide features
+    - X_pca_aa_index_tokenized.joblib or X_<tokenizer>.joblib : Tokenized and embedded
+      peptide features (see `tokenized_data_path`)
     - X_categorical.joblib : One-hot encoded categorical variables
     - Y.joblib : Target labels
     - scaled_sample_weights.joblib : Normalized sample weights
 
+    The peptide sequences and row keys saved next to them must also exist,
+    otherwise the training set is regenerated.
+
     If any file is missing, it automatically calls `prepare_training_set()` to generate them.
+    If only the encoding for `tokenizer` is missing, the saved peptides are encoded
+    with `encode_training_set` instead, without processing the raw data again.
+    The encoding is memory-mapped (read-only) when it was saved uncompressed.
 
     Parameters
     ----------
     tokenizer : str, optional
-        Name of the tokenizer used to generate amino acid embeddings. Default is 'AA_index_tokenizer'.
-        This affects the filename of the PCA-encoded peptide feature file.
+        Name of the registered tokenizer used to generate amino acid embeddings.
+        Default is 'AA_index_tokenizer'.
 
     Returns
     -------
@@ -128,39 +240,139 @@ def load_or_create_training_data(tokenizer='AA_index_tokenizer'):
         - scaled_sample_weights : np.ndarray
             Scaled sample weights to balance contribution during training
     """
-    if tokenizer == "AA_index_tokenizer":
-        tokenized_data = 'pca_aa_index_tokenized'
-
     files = {
-        "X_tokenized": PROCESSED_DATA_PATH + "X_" + tokenized_data +".joblib",
         "X_categorical": PROCESSED_DATA_PATH + "X_categorical.joblib",
         "Y": PROCESSED_DATA_PATH + "Y.joblib",
-        "sample_weights": PROCESSED_DATA_PATH + "scaled_sample_weights.joblib"
+        "sample_weights": PROCESSED_DATA_PATH + "scaled_sample_weights.joblib",
+        "peptides": PEPTIDE_STORE_PATH + "offsets.npy",
+        "row_keys": PROCESSED_DATA_PATH + "row_keys.joblib",
+        "weight_scaler": PROCESSED_DATA_PATH + "weight_scaler.joblib"
     }
 
     # Check if all files exist
     if all(os.path.exists(path) for path in files.values()):
+        if not os.path.exists(tokenized_data_path(tokenizer)):
+            print(f"⚠️ No '{tokenizer}' encoding saved. Encoding the saved training peptides...")
+            encode_training_set(tokenizer)
         print("✅ All joblib files found. Loading...")
-        X = joblib.load(files["X_tokenized"])
-        X_categorical = joblib.load(files["X_categorical"])
-        Y = joblib.load(files["Y"])
-        sample_weights = joblib.load(files["sample_weights"])
     else:
         print("⚠️ One or more files missing. Running prepare_training_set()...")
-        prepare_training_set()
-        # Now load them
-        X = joblib.load(files["X_tokenized"])
-        X_categorical = joblib.load(files["X_categorical"])
-        Y = joblib.load(files["Y"])
-        sample_weights = joblib.load(files["sample_weights"])
+        prepare_training_set(tokenizer)
+
+    X = joblib.load(tokenized_data_path(tokenizer), mmap_mode='r')
+    X_categorical = joblib.load(files["X_categorical"])
+    Y = joblib.load(files["Y"])
+    sample_weights = joblib.load(files["sample_weights"])
 
 
     return X, X_categorical, Y, sample_weights
 
 
+def load_training_peptides():
+    """
+    Loads the peptide sequences of the training set, aligned with the rows returned
+    by `load_or_create_training_data`.
+
+    Returns
+    -------
+    np.ndarray
+        Peptide sequences, decoded from the training `PeptideStore`.
+    """
+    return np.asarray(PeptideStore.load(PEPTIDE_STORE_PATH).decode(), dtype=object)
+
+
+def load_training_row_keys():
+    """
+    Loads the row keys of the training set, aligned with the rows returned by
+    `load_or_create_training_data`.
+
+    Returns
+    -------
+    np.ndarray
+        uint64 key per row (see `training_row_keys`).
+    """
+    return joblib.load(PROCESSED_DATA_PATH + "row_keys.joblib")
+
+
+def update_training_set(scaler, tokenizer='AA_index_tokenizer'):
+    """
+    Brings the saved training set up to date with the current raw data, tokenizing
+    only the rows that are new.
+
+    Rows of the freshly cleaned data whose key (see `ROW_KEY_COLUMNS`) is not in the
+    saved set are tokenized, encoded and appended; saved rows whose key disappeared
+    (for example because their weight or `mhc_status` changed) are dropped. Every
+    saved encoding is updated: kept rows are copied and new rows encoded straight
+    into buffers of the final size (see `TrainingSetAssembler`). Weights of
+    the new rows are scaled with `scaler`, the one the current model was trained with,
+    and clipped to its range so they stay comparable with the existing weights.
+
+    Parameters
+    ----------
+    scaler : MinMaxScaler
+        Fitted weight scaler.
+    tokenizer : str, optional
+        Tokenizer to use for sequence embedding; it is encoded even if not saved yet.
+
+    Returns
+    -------
+    int
+        Number of rows added.
+    """
+    X, X_categorical, Y, sample_weights = load_or_create_training_data(tokenizer)
+    peptides = load_training_peptides()
+    row_keys = load_training_row_keys()
+
+    sources = training_sources()
+    new_keys = sources_row_keys(sources)
+
+    keep = np.isin(row_keys, new_keys)
+    is_added = ~np.isin(new_keys, row_keys)
+    n_added = int(is_added.sum())
+    print(f"🆕 {n_added} new rows, {int((~keep).sum())} outdated rows removed")
+    if n_added == 0 and keep.all():
+        return 0
+
+    # Kept rows are copied from the saved (memory-mapped) arrays and new rows encoded
+    # straight into buffers of the final size
+    tokenizers = [tokenizer] + [name for name in saved_tokenizers() if name != tokenizer]
+    embeddings = {name: X if name == tokenizer else joblib.load(tokenized_data_path(name), mmap_mode='r')
+                  for name in tokenizers}
+    assembler = TrainingSetAssembler(int(keep.sum()) + n_added, tokenizers)
+    assembler.add_saved(keep, embeddings, X_categorical, Y, sample_weights, peptides)
+
+    low, high = scaler.feature_range
+    source_ends = np.cumsum([len(source) for source in sources])
+    for source, source_added in zip(sources, np.split(is_added, source_ends[:-1])):
+        added = source[source_added]
+        if len(added):
+            weights = scaler.transform(added[[WEIGHT_COLUMN]].to_numpy(dtype=np.float64)).flatten()
+            assembler.add(added, np.clip(weights, low, high))
+
+    save_training_set(assembler, np.concatenate([row_keys[keep], new_keys[is_added]]))
+    return n_added
+
+
+def report_benchmark_leakage(k=8):
+    """
+    Prints how many cancer benchmark peptides are identical to, nested in/around,
+    or share a k-mer with a training peptide.
+
+    Returns
+    -------
+    pd.DataFrame
+        The table from `leakage_report`.
+    """
+    train_peptides = load_training_peptides()
+    test_peptides = load_or_create_test_set()['peptides']
+    report = leakage_report(train_peptides, test_peptides, k=k)
+    print("🧬 Homology between training set and cancer benchmark:")
+    print(report.to_string(index=False, float_format='{:.3f}'.format))
+    return report
 
 
-def separate_train_val(val_size=0.2, random_state=42):
+def separate_train_val(val_size=0.2, random_state=42, grouping='random', k=8, mismatches=0,
+                       tokenizer='AA_index_tokenizer'):
     """
     Loads or generates the processed dataset and splits it into training and validation sets.
 
@@ -169,7 +381,11 @@ def separate_train_val(val_size=0.2, random_state=42):
       - val_size fraction of the data is reserved for validation.
 
     All inputs (peptide embeddings, categorical features, target labels, and sample weights)
-    are split in a consistent way using sklearn's `train_test_split`.
+    are split in a consistent way, each with a single float32 gather (see `split_views`):
+    the training and validation arrays are views of it. With grouping='random' rows are split with sklearn's
+    `train_test_split`. With grouping='homology' peptides are first clustered by shared
+    k-mers (`cluster_peptides`), and whole clusters go to either side, so identical,
+    nested or near-identical peptides never straddle the split.
 
     Parameters
     ----------
@@ -177,6 +393,14 @@ def separate_train_val(val_size=0.2, random_state=42):
         Fraction of the data to use as validation (default is 0.2, i.e. 20%).
     random_state : int, optional
         Random seed for reproducibility (default is 42).
+    grouping : str, optional
+        'random' (default) or 'homology'.
+    k : int, optional
+        K-mer length used to cluster peptides when grouping='homology'.
+    mismatches : int, optional
+        Substitutions tolerated per shared k-mer when grouping='homology' (0 or 1).
+    tokenizer : str, optional
+        Registered tokenizer whose saved encoding is used (see `load_or_create_training_data`).
 
     Returns
     -------
@@ -199,30 +423,25 @@ def separate_train_val(val_size=0.2, random_state=42):
         - w_val : np.ndarray
             Sample weights for validation
     """
-    X, X_categorical, Y, scaled_sample_weights = load_or_create_training_data()
+    X, X_categorical, Y, scaled_sample_weights = load_or_create_training_data(tokenizer)
+
+    if grouping == 'homology':
+        train_idx, val_idx = grouped_train_val_indices(
+            load_training_peptides(), val_size=val_size, random_state=random_state,
+            k=k, mismatches=mismatches
+        )
+    else:
+        train_idx, val_idx = train_test_split(np.arange(len(Y)), test_size=val_size, random_state=random_state)
 
+    # One float32 gather per input; both sides are views of it
     X_train, X_val, \
     X_cat_train, X_cat_val, \
     y_train, y_val, \
-    w_train, w_val = train_test_split(
-        X, X_categorical, Y, scaled_sample_weights,
-        test_size=val_size,
-        random_state=random_state
-    )
-
-    # Convert peptide input (list of 2D arrays) → (n_samples, 25, 20, 1)
-    X_train = np.stack(X_train).astype(np.float32)[..., np.newaxis]
-    X_val = np.stack(X_val).astype(np.float32)[..., np.newaxis]
-
-    # Convert categorical inputs → (n_samples, n_features)
-    X_cat_train = np.asarray(X_cat_train).astype(np.float32)
-    X_cat_val = np.asarray(X_cat_val).astype(np.float32)
+    w_train, w_val = split_views([X, X_categorical, Y, scaled_sample_weights], train_idx, val_idx)
 
-    # Targets and weights as arrays
-    y_train = np.asarray(y_train).astype(np.float32)
-    y_val = np.asarray(y_val).astype(np.float32)
-    w_train = np.asarray(w_train).astype(np.float32)
-    w_val = np.asarray(w_val).astype(np.float32)
+    # Peptide input → (n_samples, 25, 20, 1)
+    X_train = X_train[..., np.newaxis]
+    X_val = X_val[..., np.newaxis]
 
 
     return (
@@ -0,0 +1,288 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.config import RAW_DATA_PATH, PROCESSED_DATA_PATH
+from src.data_processing.data_loader import CANCER_FILE_NAME
+
+
+PROFILES_PATH = PROCESSED_DATA_PATH + "profiles/"
+MAX_EXACT_CATEGORIES = 200
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+# Raw files profiled by `profile_raw_sources`, with their separator and peptide columns
+RAW_SOURCES = {
+    'iedb': ("tcell_table_export_1751306060.csv", ',', ['Epitope - Name']),
+    'cancer': (CANCER_FILE_NAME, ',', ['Epitope - Name']),
+    'hla_ligand_atlas': ("hla_2020.12_HLA_aggregated.tsv", '\t', ['peptide_sequence']),
+    'hla_ligand_atlas_hits': ("hla_2020.12_HLA_sample_hits.tsv", '\t', [])
+}
+
+
+class HyperLogLog:
+    """
+    HyperLogLog sketch of the number of distinct values, with 2**p one-byte
+    registers (16 KiB for the default p=14, about 0.8% standard error).
+    """
+
+    def __init__(self, p=14):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        """
+        Adds uint64 hashes of values (e.g. from `pd.util.hash_pandas_object`).
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        buckets = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes << np.uint64(self.p)
+        # Exact bit length of `rest`: float64 is only exact below 2**53, so the high
+        # and low parts are measured separately
+        high = (rest >> np.uint64(11)).astype(np.float64)
+        low = (rest & np.uint64(0x7FF)).astype(np.float64)
+        bit_length = np.where(high > 0, np.frexp(high)[1] + 11, np.frexp(low)[1])
+        ranks = np.minimum(64 - bit_length + 1, 64 - self.p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if raw <= 2.5 * m and zeros:
+            return float(m * np.log(m / zeros))
+        return float(raw)
+
+
+class QuantileSketch:
+    """
+    Streaming quantile sketch with relative accuracy `relative_accuracy` (a
+    DDSketch-style log-bucket histogram). Memory grows with the logarithm of the
+    value range, not with the number of values.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _add_buckets(self, store, values):
+        keys, counts = np.unique(np.ceil(np.log(values) / self.log_gamma).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.min, self.max = min(self.min, values.min()), max(self.max, values.max())
+        self.zeros += int(np.count_nonzero(values == 0))
+        self._add_buckets(self.positive, values[values > 0])
+        self._add_buckets(self.negative, -values[values < 0])
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        buckets = ([(-2 * self.gamma ** key / (1 + self.gamma), count)
+                    for key, count in sorted(self.negative.items(), reverse=True)]
+                   + [(0.0, self.zeros)]
+                   + [(2 * self.gamma ** key / (1 + self.gamma), count)
+                      for key, count in sorted(self.positive.items())])
+        seen = 0
+        for value, count in buckets:
+            seen += count
+            if seen > rank:
+                return float(min(max(value, self.min), self.max))
+        return float(self.max)
+
+
+def canonical_values(present):
+    """
+    Canonical form of the non-null values of a chunk, independent of the dtype
+    `read_csv` inferred for that chunk: numbers are compared as float64 (so 0 read
+    as int64 in one chunk and 0.0 in another are the same value), whether the chunk
+    came out numeric or as strings.
+
+    Returns:
+        tuple: (pd.Series of string keys, np.ndarray of the float64 numeric values)
+    """
+    if pd.api.types.is_bool_dtype(present):
+        return present.astype(str), np.empty(0)
+    if pd.api.types.is_numeric_dtype(present):
+        numbers = present.astype(np.float64)
+        return numbers.astype(str), numbers.to_numpy()
+    keys = present.astype(str)
+    numbers = pd.to_numeric(keys, errors='coerce')
+    is_number = numbers.notna().to_numpy()
+    if is_number.any():
+        keys = keys.where(~is_number, numbers.astype(str))
+    return keys, numbers.to_numpy()[is_number]
+
+
+class ColumnProfile:
+    """
+    Streaming summary of one column: null count, approximate distinct count, exact
+    value counts while there are at most `MAX_EXACT_CATEGORIES` distinct values,
+    quantiles of numeric values and, for peptide columns, a length histogram.
+    """
+
+    def __init__(self, is_peptide=False):
+        self.is_peptide = is_peptide
+        self.n_values = 0
+        self.n_null = 0
+        self.distinct = HyperLogLog()
+        self.counts = {}
+        self.counts_exact = True
+        self.numeric = QuantileSketch()
+        self.lengths = {}
+
+    def update(self, column):
+        self.n_values += len(column)
+        present = column.dropna()
+        self.n_null += len(column) - len(present)
+        if len(present) == 0:
+            return
+        keys, numbers = canonical_values(present)
+        self.distinct.add_hashes(pd.util.hash_pandas_object(keys, index=False).to_numpy())
+
+        if self.counts_exact:
+            for value, count in keys.value_counts().items():
+                self.counts[value] = self.counts.get(value, 0) + int(count)
+            if len(self.counts) > MAX_EXACT_CATEGORIES:
+                self.counts, self.counts_exact = {}, False
+
+        if len(numbers):
+            self.numeric.add(numbers)
+
+        if self.is_peptide:
+            lengths = present.astype(str).str.len().value_counts()
+            for length, count in lengths.items():
+                self.lengths[int(length)] = self.lengths.get(int(length), 0) + int(count)
+
+    def to_dict(self):
+        profile = {
+            'n_null': self.n_null,
+            'null_fraction': self.n_null / self.n_values if self.n_values else 0.0,
+            'distinct_estimate': round(self.distinct.estimate())
+        }
+        if self.counts_exact:
+            profile['counts'] = dict(sorted(self.counts.items()))
+        if self.numeric.count:
+            profile['numeric'] = {
+                'count': self.numeric.count,
+                'min': float(self.numeric.min),
+                'max': float(self.numeric.max),
+                'quantiles': {str(q): self.numeric.quantile(q) for q in QUANTILES}
+            }
+        if self.is_peptide:
+            profile['length_histogram'] = {str(k): v for k, v in sorted(self.lengths.items())}
+        return profile
+
+
+def profile_file(path, sep=',', peptide_columns=(), chunksize=200_000):
+    """
+    Profiles a raw CSV/TSV file in one streaming pass, holding one chunk at a time.
+
+    Returns:
+        dict: File size, row count and a `ColumnProfile` summary per column.
+    """
+    columns = {}
+    n_rows = 0
+    for chunk in pd.read_csv(path, sep=sep, chunksize=chunksize, low_memory=False):
+        n_rows += len(chunk)
+        for name in chunk.columns:
+            if name not in columns:
+                columns[name] = ColumnProfile(is_peptide=name in peptide_columns)
+            columns[name].update(chunk[name])
+
+    return {
+        'file': os.path.basename(path),
+        'size_bytes': os.path.getsize(path),
+        'profiled_at': datetime.now().isoformat(timespec='seconds'),
+        'n_rows': n_rows,
+        'columns': {name: profile.to_dict() for name, profile in columns.items()}
+    }
+
+
+def profile_raw_sources(sources=None, output_dir=PROFILES_PATH, chunksize=200_000):
+    """
+    Profiles the raw input files listed in `RAW_SOURCES` and writes one JSON profile
+    per source to `output_dir`, named after the source and the raw file.
+
+    Returns:
+        dict: Profile per source name.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    profiles = {}
+    for name in sources or RAW_SOURCES:
+        file_name, sep, peptide_columns = RAW_SOURCES[name]
+        path = RAW_DATA_PATH + file_name
+        if not os.path.exists(path):
+            print(f"⚠️ {path} not found, skipping {name}")
+            continue
+        print(f"🔎 Profiling {name} ({file_name})...")
+        profiles[name] = profile_file(path, sep=sep, peptide_columns=peptide_columns, chunksize=chunksize)
+        output_path = os.path.join(output_dir, f"{name}__{os.path.splitext(file_name)[0]}.profile.json")
+        with open(output_path, 'w') as handle:
+            json.dump(profiles[name], handle, indent=2, sort_keys=True)
+        print(f"✅ {profiles[name]['n_rows']} rows, profile saved to {output_path}")
+    return profiles
+
+
+def compare_profiles(old, new, tolerance=0.05):
+    """
+    Lists the summaries that changed by more than `tolerance` (relative) between
+    two profiles, e.g. of two IEDB releases.
+
+    Parameters:
+        old, new (dict or str): Profiles or paths to profile JSON files.
+
+    Returns:
+        pd.DataFrame: One row per drifted metric: 'column', 'metric', 'old', 'new', 'relative_change'.
+    """
+    def load(profile):
+        if isinstance(profile, str):
+            with open(profile) as handle:
+                return json.load(handle)
+        return profile
+
+    def flatten(profile):
+        metrics = {('', 'n_rows'): profile['n_rows']}
+        for column, summary in profile['columns'].items():
+            metrics[(column, 'null_fraction')] = summary['null_fraction']
+            metrics[(column, 'distinct_estimate')] = summary['distinct_estimate']
+            n_values = max(1, profile['n_rows'] - summary['n_null'])
+            for value, count in summary.get('counts', {}).items():
+                metrics[(column, f'fraction[{value}]')] = count / n_values
+            for q, value in summary.get('numeric', {}).get('quantiles', {}).items():
+                metrics[(column, f'quantile[{q}]')] = value
+            histogram = summary.get('length_histogram', {})
+            total = max(1, sum(histogram.values()))
+            for length, count in histogram.items():
+                metrics[(column, f'length_fraction[{length}]')] = count / total
+        return metrics
+
+    old_metrics, new_metrics = flatten(load(old)), flatten(load(new))
+    rows = []
+    for key in sorted(set(old_metrics) | set(new_metrics)):
+        before, after = old_metrics.get(key, 0.0), new_metrics.get(key, 0.0)
+        before, after = before or 0.0, after or 0.0
+        change = abs(after - before) / max(abs(before), 1e-12) if before else (np.inf if after else 0.0)
+        # Fractions are compared in absolute terms so that rare categories do not dominate
+        if 'fraction' in key[1]:
+            change = abs(after - before)
+        if change > tolerance:
+            rows.append({'column': key[0], 'metric': key[1], 'old': before, 'new': after,
+                         'relative_change': change})
+    return pd.DataFrame(rows, columns=['column', 'metric', 'old', 'new', 'relative_change'])
@@ -1,7 +1,35 @@
 import pandas as pd
 import numpy as np
 from src.data_processing.data_loader import load_dataset3_pca
-from tensorflow.keras.preprocessing.sequence import pad_sequences
+from src.data_processing.peptide_store import PeptideStore, ALPHABET
+
+
+MAX_PEPTIDE_LENGTH = 25
+
+# BLOSUM62 substitution scores, rows and columns in BLOSUM62_ORDER
+BLOSUM62_ORDER = "ARNDCQEGHILKMFPSTWYV"
+BLOSUM62 = [
+    [4, -1, -2, -2, 0, -1, -1, 0, -2, -1, -1, -1, -1, -2, -1, 1, 0, -3, -2, 0],
+    [-1, 5, 0, -2, -3, 1, 0, -2, 0, -3, -2, 2, -1, -3, -2, -1, -1, -3, -2, -3],
+    [-2, 0, 6, 1, -3, 0, 0, 0, 1, -3, -3, 0, -2, -3, -2, 1, 0, -4, -2, -3],
+    [-2, -2, 1, 6, -3, 0, 2, -1, -1, -3, -4, -1, -3, -3, -1, 0, -1, -4, -3, -3],
+    [0, -3, -3, -3, 9, -3, -4, -3, -3, -1, -1, -3, -1, -2, -3, -1, -1, -2, -2, -1],
+    [-1, 1, 0, 0, -3, 5, 2, -2, 0, -3, -2, 1, 0, -3, -1, 0, -1, -2, -1, -2],
+    [-1, 0, 0, 2, -4, 2, 5, -2, 0, -3, -3, 1, -2, -3, -1, 0, -1, -3, -2, -2],
+    [0, -2, 0, -1, -3, -2, -2, 6, -2, -4, -4, -2, -3, -3, -2, 0, -2, -2, -3, -3],
+    [-2, 0, 1, -1, -3, 0, 0, -2, 8, -3, -3, -1, -2, -1, -2, -1, -2, -2, 2, -3],
+    [-1, -3, -3, -3, -1, -3, -3, -4, -3, 4, 2, -3, 1, 0, -3, -2, -1, -3, -1, 3],
+    [-1, -2, -3, -4, -1, -2, -3, -4, -3, 2, 4, -2, 2, 0, -3, -2, -1, -2, -1, 1],
+    [-1, 2, 0, -1, -3, 1, 1, -2, -1, -3, -2, 5, -1, -3, -1, 0, -1, -3, -2, -2],
+    [-1, -1, -2, -3, -1, 0, -2, -3, -2, 1, 2, -1, 5, 0, -2, -1, -1, -1, -1, 1],
+    [-2, -3, -3, -3, -2, -3, -3, -3, -1, 0, 0, -3, 0, 6, -4, -2, -2, 1, 3, -1],
+    [-1, -2, -2, -1, -3, -1, -1, -2, -2, -3, -3, -1, -2, -4, 7, -1, -1, -4, -3, -2],
+    [1, -1, 1, 0, -1, 0, 0, 0, -1, -2, -2, 0, -1, -2, -1, 4, 1, -3, -2, -2],
+    [0, -1, 0, -1, -1, -1, -1, -2, -2, -1, -1, -1, -1, -2, -1, 1, 5, -2, -2, 0],
+    [-3, -3, -4, -4, -2, -2, -3, -2, -2, -3, -2, -3, -1, 1, -4, -3, -2, 11, 2, -3],
+    [-2, -2, -2, -3, -2, -1, -2, -3, 2, -1, -1, -2, -1, 3, -3, -2, -2, 2, 7, -1],
+    [0, -3, -3, -3, -1, -2, -2, -3, -3, 3, 1, -2, 1, -1, -2, -2, 0, -3, -1, 4]
+]
 
 
 def generate_matrix_for_peptide(peptide, pca_table):
@@ -24,32 +52,140 @@ def generate_matrix_for_peptide(peptide, pca_table):
     np.ndarray
         A 2D NumPy array where each row corresponds to the PCA vector of an amino acid.
     """
-    pca_table = load_dataset3_pca()
-
     return np.stack([pca_table[aa] for aa in peptide])
 
 
 
+def aa_index_lookup_table(pca_table):
+    """
+    Builds the embedding lookup table of the AA index tokenizer.
+
+    Returns:
+    --------
+    np.ndarray
+        (21, n_features) float32 table: row 0 is the zero padding vector and row i
+        the PCA vector of the i-th amino acid of `ALPHABET`, matching the indices of
+        `PeptideStore.index_matrix`.
+    """
+    table = np.zeros((len(ALPHABET) + 1, len(pca_table)), dtype=np.float32)
+    for i, aa in enumerate(ALPHABET, start=1):
+        table[i] = pca_table[aa].to_numpy()
+    return table
+
+
+def one_hot_lookup_table():
+    """
+    Builds the embedding lookup table of the one-hot tokenizer.
+
+    Returns:
+    --------
+    np.ndarray
+        (21, 20) float32 table: row 0 is the zero padding vector and row i the
+        indicator vector of the i-th amino acid of `ALPHABET`.
+    """
+    return np.vstack([np.zeros(len(ALPHABET)), np.eye(len(ALPHABET))]).astype(np.float32)
+
+
+def blosum62_lookup_table():
+    """
+    Builds the embedding lookup table of the BLOSUM62 tokenizer.
+
+    Returns:
+    --------
+    np.ndarray
+        (21, 20) float32 table: row 0 is the zero padding vector and row i the
+        BLOSUM62 scores of the i-th amino acid of `ALPHABET` against every amino
+        acid, columns in `ALPHABET` order.
+    """
+    order = [BLOSUM62_ORDER.index(aa) for aa in ALPHABET]
+    scores = np.asarray(BLOSUM62, dtype=np.float32)[np.ix_(order, order)]
+    return np.vstack([np.zeros((1, len(ALPHABET)), dtype=np.float32), scores])
+
+
+# Tokenizer name -> function building its (21, n_features) lookup table over the
+# residue indices of `PeptideStore.index_matrix`
+TOKENIZERS = {
+    'AA_index_tokenizer': lambda: aa_index_lookup_table(load_dataset3_pca()),
+    'one_hot_tokenizer': one_hot_lookup_table,
+    'BLOSUM62_tokenizer': blosum62_lookup_table
+}
+
+
+def register_tokenizer(name, build_table):
+    """
+    Registers an encoding under `name`, e.g. another AAindex PCA table.
+
+    Parameters:
+    -----------
+    name : str
+        Tokenizer name, used to select it at training and prediction time.
+    build_table : callable
+        Returns the (21, n_features) lookup table: row 0 for padding, then one row
+        per amino acid of `ALPHABET`.
+    """
+    TOKENIZERS[name] = build_table
+
+
+def tokenizer_lookup_table(name):
+    """
+    Returns:
+    --------
+    np.ndarray
+        The float32 lookup table of the registered tokenizer `name`.
+    """
+    if name not in TOKENIZERS:
+        raise ValueError(f"Unknown tokenizer '{name}'. Registered tokenizers: {sorted(TOKENIZERS)}")
+    table = np.asarray(TOKENIZERS[name](), dtype=np.float32)
+    if table.shape[0] != len(ALPHABET) + 1:
+        raise ValueError(f"Tokenizer '{name}' table has {table.shape[0]} rows, expected {len(ALPHABET) + 1}")
+    return table
+
+
+def tokenize(dataset, tokenizers):
+    """
+    Encodes peptides with several tokenizers in one pass.
+
+    The peptides are decoded once into a residue index matrix (see
+    `PeptideStore.index_matrix`), and every encoding is a lookup into its table.
+
+    Parameters:
+    -----------
+    dataset : pd.DataFrame or PeptideStore
+        DataFrame with an 'Epitope - Name' column, or a `PeptideStore`.
+    tokenizers : str or list of str
+        Registered tokenizer names.
+
+    Returns:
+    --------
+    dict
+        Tokenizer name -> (n, 25, n_features) float32 array, zero-padded at the end.
+    """
+    if isinstance(tokenizers, str):
+        tokenizers = [tokenizers]
+    tables = {name: tokenizer_lookup_table(name) for name in tokenizers}
+    store = dataset if isinstance(dataset, PeptideStore) else PeptideStore.from_peptides(dataset['Epitope - Name'])
+    index_matrix = store.index_matrix(maxlen=MAX_PEPTIDE_LENGTH)
+    return {name: table[index_matrix] for name, table in tables.items()}
+
+
 def AA_index_tokenizer(dataset):
     """
     Generates PCA-based feature matrices for a list of peptides in a dataset.
 
-    For each peptide in the dataset, this function applies `generate_matrix_for_peptide`
-    to build a matrix representation based on PCA-transformed amino acid properties.
+    Peptides are packed into a `PeptideStore`, decoded into a residue index matrix
+    and mapped through `aa_index_lookup_table`, which gives the same matrices as
+    `generate_matrix_for_peptide` without a Python loop over residues.
 
     Parameters:
     -----------
-    dataset : pd.DataFrame
-        The input DataFrame containing a column 'Epitope - Name' with peptide sequences.
+    dataset : pd.DataFrame or PeptideStore
+        The input DataFrame containing a column 'Epitope - Name' with peptide sequences,
+        or a `PeptideStore`.
 
     Returns:
     --------
-    list of np.ndarray
-        A list where each element is a 2D matrix representing one peptide.
+    np.ndarray
+        (n, 25, n_features) float32 array of per-residue PCA vectors, zero-padded at the end.
     """
-    pca_table = load_dataset3_pca()
-    peptides = dataset['Epitope - Name'].tolist()
-    X_pca_aa = [generate_matrix_for_peptide(p, pca_table) for p in peptides]
-    X_pca_aa_pad = pad_sequences(X_pca_aa, maxlen=25, dtype='float32', padding='post')
-
-    return X_pca_aa_pad
+    # Same result as padding the per-peptide matrices with `pad_sequences(maxlen=25, padding='post')`
+    return tokenize(dataset, 'AA_index_tokenizer')['AA_index_tokenizer']
@@ -0,0 +1,235 @@
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import Input, Model, layers
+from tensorflow.keras.saving import register_keras_serializable
+
+
+def _fold_batch_norm(conv, batch_norm):
+    """
+    Folds an inference-mode BatchNormalization into the preceding convolution.
+
+    Returns:
+        tuple of np.ndarray: Kernel and bias of the equivalent convolution.
+    """
+    kernel, bias = conv.get_weights() if conv.use_bias else (conv.get_weights()[0], None)
+    if bias is None:
+        bias = np.zeros(kernel.shape[-1], dtype=kernel.dtype)
+    gamma, beta, mean, variance = batch_norm.get_weights()
+    scale = gamma / np.sqrt(variance + batch_norm.epsilon)
+    return kernel * scale, (bias - mean) * scale + beta
+
+
+def member_weights(model):
+    """
+    Extracts the inference weights of one `CNN_multimodal_class` model, with batch
+    normalization folded into the convolutions.
+
+    Returns:
+        tuple: (architecture signature, dict of weight arrays)
+    """
+    convs = [layer for layer in model.layers if isinstance(layer, layers.Conv2D)]
+    batch_norms = [layer for layer in model.layers if isinstance(layer, layers.BatchNormalization)]
+    denses = [layer for layer in model.layers if isinstance(layer, layers.Dense)]
+    n_categorical = model.inputs[1].shape[-1]
+
+    output = model.get_layer('classification_output')
+    categorical = next(d for d in denses if d is not output and d.get_weights()[0].shape[0] == n_categorical)
+    dense = next(d for d in denses if d is not output and d is not categorical)
+
+    weights = {}
+    weights['conv1_kernel'], weights['conv1_bias'] = _fold_batch_norm(convs[0], batch_norms[0])
+    weights['conv2_kernel'], weights['conv2_bias'] = _fold_batch_norm(convs[1], batch_norms[1])
+    weights['dense_kernel'], weights['dense_bias'] = dense.get_weights()
+    weights['cat_kernel'], weights['cat_bias'] = categorical.get_weights()
+    weights['output_kernel'], weights['output_bias'] = output.get_weights()
+
+    signature = tuple((name, array.shape) for name, array in sorted(weights.items()))
+    return signature, weights
+
+
+@register_keras_serializable(package='immuno_ready')
+class StackedMembers(layers.Layer):
+    """
+    Runs N `CNN_multimodal_class` members of the same architecture as one computation.
+
+    The first convolution of all members is a single convolution with N times the
+    filters, the second a grouped convolution with one group per member, and the
+    dense layers are batched matrix products over the member axis. Batch
+    normalization is folded into the convolutions and dropout is omitted, so the
+    layer is for inference only.
+
+    Returns the probability of every member, shape (batch, n_members).
+    """
+
+    def __init__(self, n_members, conv1_kernel_shape, conv2_kernel_shape, dense_kernel_shape,
+                 cat_kernel_shape, **kwargs):
+        super().__init__(**kwargs)
+        self.n_members = n_members
+        self.conv1_kernel_shape = tuple(conv1_kernel_shape)
+        self.conv2_kernel_shape = tuple(conv2_kernel_shape)
+        self.dense_kernel_shape = tuple(dense_kernel_shape)
+        self.cat_kernel_shape = tuple(cat_kernel_shape)
+
+    def build(self, input_shape):
+        n = self.n_members
+        kh1, kw1, c_in, f1 = self.conv1_kernel_shape
+        kh2, kw2, _, f2 = self.conv2_kernel_shape
+        d_in, units = self.dense_kernel_shape
+        c_cat, cat_units = self.cat_kernel_shape
+        shapes = {
+            'conv1_kernel': (kh1, kw1, c_in, n * f1), 'conv1_bias': (n * f1,),
+            'conv2_kernel': (kh2, kw2, f1, n * f2), 'conv2_bias': (n * f2,),
+            'dense_kernel': (n, d_in, units), 'dense_bias': (n, units),
+            'cat_kernel': (c_cat, n * cat_units), 'cat_bias': (n * cat_units,),
+            'output_kernel': (n, units + cat_units), 'output_bias': (n,)
+        }
+        for name, shape in shapes.items():
+            setattr(self, name, self.add_weight(name=name, shape=shape, initializer='zeros', trainable=False))
+
+    def call(self, inputs):
+        image, categorical = inputs
+        n = self.n_members
+        f2 = self.conv2_kernel_shape[-1]
+
+        x = tf.nn.relu(tf.nn.conv2d(image, self.conv1_kernel, 1, 'VALID') + self.conv1_bias)
+        # The kernel has f1 input channels and the input n * f1, so TensorFlow runs n groups
+        x = tf.nn.relu(tf.nn.conv2d(x, self.conv2_kernel, 1, 'VALID') + self.conv2_bias)
+        x = tf.nn.max_pool2d(x, ksize=(2, 1), strides=(2, 1), padding='VALID')
+
+        # Split channels per member and flatten each member's (height, width, channel) map
+        height, width = x.shape[1], x.shape[2]
+        x = tf.reshape(x, (-1, height, width, n, f2))
+        x = tf.reshape(tf.transpose(x, (0, 3, 1, 2, 4)), (-1, n, height * width * f2))
+        x = tf.nn.relu(tf.einsum('bnd,ndu->bnu', x, self.dense_kernel) + self.dense_bias)
+
+        y = tf.nn.relu(tf.matmul(categorical, self.cat_kernel) + self.cat_bias)
+        y = tf.reshape(y, (-1, n, self.cat_kernel_shape[-1]))
+
+        combined = tf.concat([x, y], axis=-1)
+        return tf.sigmoid(tf.einsum('bnd,nd->bn', combined, self.output_kernel) + self.output_bias)
+
+    def get_config(self):
+        config = super().get_config()
+        config.update({
+            'n_members': self.n_members,
+            'conv1_kernel_shape': self.conv1_kernel_shape,
+            'conv2_kernel_shape': self.conv2_kernel_shape,
+            'dense_kernel_shape': self.dense_kernel_shape,
+            'cat_kernel_shape': self.cat_kernel_shape
+        })
+        return config
+
+    def compute_output_shape(self, input_shape):
+        return (input_shape[0][0], self.n_members)
+
+
+@register_keras_serializable(package='immuno_ready')
+class MemberStatistic(layers.Layer):
+    """
+    Reduces member probabilities of shape (batch, n_members) to their 'mean' or
+    'variance', of shape (batch, 1).
+    """
+
+    def __init__(self, statistic='mean', **kwargs):
+        super().__init__(**kwargs)
+        self.statistic = statistic
+
+    def call(self, probs):
+        if self.statistic == 'variance':
+            return tf.math.reduce_variance(probs, axis=1, keepdims=True)
+        return tf.reduce_mean(probs, axis=1, keepdims=True)
+
+    def compute_output_shape(self, input_shape):
+        return (input_shape[0], 1)
+
+    def get_config(self):
+        config = super().get_config()
+        config['statistic'] = self.statistic
+        return config
+
+
+def _stack(member_arrays):
+    """
+    Stacks the weights of same-architecture members in the layout of `StackedMembers`.
+    """
+    def along_last(name):
+        return np.concatenate([weights[name] for weights in member_arrays], axis=-1)
+
+    def along_new(name):
+        return np.stack([weights[name] for weights in member_arrays])
+
+    return [
+        along_last('conv1_kernel'), along_last('conv1_bias'),
+        along_last('conv2_kernel'), along_last('conv2_bias'),
+        along_new('dense_kernel'), along_new('dense_bias'),
+        along_last('cat_kernel'), along_last('cat_bias'),
+        along_new('output_kernel')[..., 0], along_new('output_bias')[:, 0]
+    ]
+
+
+def build_ensemble(models, image_shape=(25, 20, 1), categorical_input_shape=(4,)):
+    """
+    Merges trained `CNN_multimodal_class` models (e.g. fold or snapshot models) into
+    a single inference model that shares the inputs.
+
+    Members with the same architecture run together in one `StackedMembers` layer,
+    so the whole ensemble is one forward pass instead of one per model. Members
+    with different architectures are grouped and each group gets its own layer.
+
+    Parameters:
+        models (list): Trained Keras models.
+
+    Returns:
+        keras.Model: Model with two outputs, 'ensemble_mean' and 'ensemble_variance',
+        the mean and variance of the member probabilities, each of shape (batch, 1).
+    """
+    groups = {}
+    for model in models:
+        signature, weights = member_weights(model)
+        groups.setdefault(signature, []).append(weights)
+
+    image_input = Input(shape=image_shape, name="image_input")
+    cat_input = Input(shape=categorical_input_shape, name="categorical_input")
+    member_probs = []
+    for i, member_arrays in enumerate(groups.values()):
+        first = member_arrays[0]
+        stacked = StackedMembers(
+            n_members=len(member_arrays),
+            conv1_kernel_shape=first['conv1_kernel'].shape,
+            conv2_kernel_shape=first['conv2_kernel'].shape,
+            dense_kernel_shape=first['dense_kernel'].shape,
+            cat_kernel_shape=first['cat_kernel'].shape,
+            name=f"stacked_members_{i}"
+        )
+        member_probs.append(stacked([image_input, cat_input]))
+        stacked.set_weights(_stack(member_arrays))
+
+    probs = member_probs[0] if len(member_probs) == 1 else layers.Concatenate()(member_probs)
+    mean = MemberStatistic('mean', name="ensemble_mean")(probs)
+    variance = MemberStatistic('variance', name="ensemble_variance")(probs)
+    return Model(inputs=[image_input, cat_input], outputs=[mean, variance], name="cnn_multimodal_ensemble")
+
+
+def build_ensemble_from_paths(model_paths):
+    """
+    Loads saved models and merges them with `build_ensemble`.
+    """
+    from tensorflow.keras.models import load_model
+    return build_ensemble([load_model(path) for path in model_paths])
+
+
+def load_ensemble(path):
+    """
+    Loads an ensemble saved with `model.save` (usable as a `ModelRegistry` loader).
+    """
+    from tensorflow.keras.models import load_model
+    return load_model(path)
+
+
+def ensemble_predict(ensemble, inputs, batch_size=1024, verbose=0):
+    """
+    Returns:
+        tuple of np.ndarray: Flat mean and variance of the member probabilities.
+    """
+    mean, variance = ensemble.predict(inputs, batch_size=batch_size, verbose=verbose)
+    return mean.ravel().astype(np.float32), variance.ravel().astype(np.float32)
@@ -0,0 +1,291 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from src.config import PROCESSED_DATA_PATH, EPITOPE_INDEX_PATH
+from src.utils import file_fingerprint, fingerprint_matches
+from src.data_processing.feature_engineering import encode_categorical_features
+from src.data_processing.peptide_store import PeptideStore
+from src.data_processing.sequence_tokenizer import MAX_PEPTIDE_LENGTH, tokenizer_lookup_table
+
+
+PENULTIMATE = 'penultimate'
+TRAINING_ROW_KEYS_PATH = PROCESSED_DATA_PATH + "row_keys.joblib"
+# Rows embedded at a time when building, and block sizes of the search: one
+# similarity block is QUERY_BLOCK x REFERENCE_BLOCK float32 (64 MiB)
+EMBED_BLOCK = 8_192
+QUERY_BLOCK = 2_048
+REFERENCE_BLOCK = 8_192
+
+
+def _feature_model(model):
+    """
+    Model returning the input of the output layer (the concatenated peptide and
+    categorical branches) instead of the probability.
+    """
+    import keras
+
+    output_layer = model.layers[-1]
+    return keras.Model(model.inputs, output_layer.input)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def _top_k(queries, vectors, k, reference_block=REFERENCE_BLOCK):
+    """
+    Exact top-k inner products of `queries` against `vectors`, one block of
+    reference rows at a time, keeping only the running k best per query.
+
+    Returns:
+        tuple: (similarities, row indices), both (n_queries, k), best first.
+    """
+    best_sims = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+    for start in range(0, len(vectors), reference_block):
+        sims = queries @ np.asarray(vectors[start:start + reference_block]).T
+        block_k = min(k, sims.shape[1])
+        block_rows = np.argpartition(sims, -block_k, axis=1)[:, -block_k:]
+        sims = np.concatenate([best_sims, np.take_along_axis(sims, block_rows, axis=1)], axis=1)
+        rows = np.concatenate([best_rows, block_rows + start], axis=1)
+        keep = np.argpartition(sims, -k, axis=1)[:, -k:]
+        best_sims = np.take_along_axis(sims, keep, axis=1)
+        best_rows = np.take_along_axis(rows, keep, axis=1)
+    order = np.argsort(-best_sims, axis=1, kind='stable')
+    return np.take_along_axis(best_sims, order, axis=1), np.take_along_axis(best_rows, order, axis=1)
+
+
+class EpitopeIndex:
+    """
+    Cosine-similarity index of the known (training) epitopes.
+
+    Each training peptide is embedded either by a registered tokenizer (its
+    flattened 25 x n_features encoding, e.g. the AA index PCA matrix) or by the
+    model's penultimate layer (`PENULTIMATE`), and stored L2-normalized as one
+    float32 matrix next to the peptides, labels and MHC classes.
+
+    `search` answers a whole batch of queries with blocked matrix products:
+    `QUERY_BLOCK` queries against `REFERENCE_BLOCK` reference rows at a time,
+    keeping a running top-k, so memory stays bounded whatever the size of the
+    index or of the batch. The search is exact.
+
+    On disk, an index is a directory with 'vectors.npy', 'labels.npy',
+    'mhc_classes.npy', the peptide store and 'manifest.json'; it is memory-mapped
+    by default.
+
+    Parameters:
+        path (str): Directory of the index.
+        mmap_mode (str): Passed to `np.load` for the index arrays.
+    """
+
+    def __init__(self, path=EPITOPE_INDEX_PATH, mmap_mode='r'):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as handle:
+            self.manifest = json.load(handle)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode=mmap_mode)
+        self.labels = np.load(os.path.join(path, "labels.npy"))
+        self.mhc_classes = np.load(os.path.join(path, "mhc_classes.npy"))
+        self.peptides = PeptideStore.load(os.path.join(path, "peptides"), mmap_mode=mmap_mode)
+        self._model = None
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def embedding(self):
+        return self.manifest['embedding']
+
+    def is_stale(self):
+        """
+        True if the training set changed since the index was built.
+        """
+        return not fingerprint_matches(TRAINING_ROW_KEYS_PATH, self.manifest['training_row_keys'])
+
+    @classmethod
+    def build(cls, path=EPITOPE_INDEX_PATH, embedding='AA_index_tokenizer', model_name=None, tokenizer=None):
+        """
+        Builds the index of the saved training set (see `prepare_training_set`),
+        embedding `EMBED_BLOCK` peptides at a time straight into the memory-mapped
+        vector file.
+
+        Parameters:
+            path (str): Directory of the index, replaced if it exists.
+            embedding (str): Registered tokenizer name, or `PENULTIMATE`.
+            model_name (str): Registered model for `PENULTIMATE` (default model if None).
+            tokenizer (str): Tokenizer the model was trained with, for `PENULTIMATE`
+                (default: the one registered for it).
+
+        Returns:
+            EpitopeIndex: The new index.
+        """
+        import joblib
+        from src.data_processing.pipeline_prepare_training_set import PEPTIDE_STORE_PATH
+
+        store = PeptideStore.load(PEPTIDE_STORE_PATH)
+        categorical = joblib.load(PROCESSED_DATA_PATH + "X_categorical.joblib")
+        categorical_features = np.asarray(categorical, dtype=np.float32)
+        labels = joblib.load(PROCESSED_DATA_PATH + "Y.joblib")
+        manifest = {'embedding': embedding, 'n_rows': len(store),
+                    'training_row_keys': file_fingerprint(TRAINING_ROW_KEYS_PATH)}
+
+        if embedding == PENULTIMATE:
+            from src.model_registry import get_registry
+            registry = get_registry()
+            tokenizer = tokenizer or registry.tokenizer(model_name)
+            table = tokenizer_lookup_table(tokenizer)
+            model, model_hash = registry.get(model_name)
+            features = _feature_model(model)
+            manifest.update({'model': registry.info(model_name)['name'], 'model_hash': model_hash,
+                             'tokenizer': tokenizer})
+            dim = int(np.prod(features.output.shape[1:]))
+        else:
+            table = tokenizer_lookup_table(embedding)
+            dim = MAX_PEPTIDE_LENGTH * table.shape[1]
+        manifest['dim'] = dim
+
+        tmp_path = path.rstrip('/') + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        print(f"🔎 Embedding {len(store)} training peptides ({embedding}, {dim} dimensions)...")
+        vectors = np.lib.format.open_memmap(os.path.join(tmp_path, "vectors.npy"), mode='w+',
+                                            dtype=np.float32, shape=(len(store), dim))
+        for start in range(0, len(store), EMBED_BLOCK):
+            rows = np.arange(start, min(start + EMBED_BLOCK, len(store)))
+            encoded = table[store.index_matrix(rows, maxlen=MAX_PEPTIDE_LENGTH)]
+            if embedding == PENULTIMATE:
+                encoded = features.predict([encoded[..., np.newaxis], categorical_features[rows]], verbose=0)
+            vectors[rows] = _normalize(encoded.reshape(len(rows), dim))
+        vectors.flush()
+        del vectors
+
+        np.save(os.path.join(tmp_path, "labels.npy"), np.asarray(labels).astype(np.int8))
+        is_class_II = np.asarray(categorical['MHC Restriction - Class_II']).astype(bool)
+        np.save(os.path.join(tmp_path, "mhc_classes.npy"), np.where(is_class_II, 'II', 'I'))
+        store.save(os.path.join(tmp_path, "peptides"))
+        with open(os.path.join(tmp_path, "manifest.json"), 'w') as handle:
+            json.dump(manifest, handle, indent=2)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        print(f"✅ Epitope index written to {path}")
+        return cls(path)
+
+    def embed(self, queries):
+        """
+        Embeds query peptides like the indexed ones.
+
+        Parameters:
+            queries (pd.DataFrame): Peptides with the `INPUT_KEY_COLUMNS` (only
+                'Epitope - Name' for tokenizer embeddings).
+
+        Returns:
+            np.ndarray: (n, dim) L2-normalized float32 vectors.
+        """
+        embedding = self.manifest['embedding']
+        tokenizer = self.manifest.get('tokenizer', embedding)
+        encoded = tokenizer_lookup_table(tokenizer)[
+            PeptideStore.from_peptides(queries['Epitope - Name']).index_matrix(maxlen=MAX_PEPTIDE_LENGTH)]
+        if embedding == PENULTIMATE:
+            if self._model is None:
+                from src.model_registry import get_registry
+                registry = get_registry()
+                model, model_hash = registry.get(self.manifest['model'])
+                if model_hash != self.manifest['model_hash']:
+                    raise ValueError(f"Model '{self.manifest['model']}' changed since the index was built; "
+                                     f"rebuild it with EpitopeIndex.build")
+                self._model = _feature_model(model)
+            encoded = self._model.predict([encoded[..., np.newaxis], encode_categorical_features(queries).to_numpy()],
+                                          verbose=0)
+        return _normalize(encoded.reshape(len(queries), -1).astype(np.float32))
+
+    def search(self, queries, k=5):
+        """
+        Finds the `k` most similar known epitopes of every query.
+
+        Parameters:
+            queries (pd.DataFrame): Peptides with the `INPUT_KEY_COLUMNS` (see `embed`).
+            k (int): Neighbours per query.
+
+        Returns:
+            pd.DataFrame: `k` rows per query, best first, with 'query' (position in
+            `queries`), 'query_peptide', 'rank', 'known_epitope', 'similarity'
+            (cosine), 'known_target_strength', 'known_mhc_class' and 'training_row'.
+        """
+        k = min(k, len(self))
+        queries = queries.reset_index(drop=True)
+        sims, rows = np.empty((len(queries), k), dtype=np.float32), np.empty((len(queries), k), dtype=np.int64)
+        for start in range(0, len(queries), QUERY_BLOCK):
+            block = slice(start, start + QUERY_BLOCK)
+            sims[block], rows[block] = _top_k(self.embed(queries.iloc[block]), self.vectors, k)
+
+        flat_rows = rows.ravel()
+        unique_rows, inverse = np.unique(flat_rows, return_inverse=True)
+        known = np.asarray(self.peptides.decode(unique_rows), dtype=object)[inverse]
+        return pd.DataFrame({
+            'query': np.repeat(np.arange(len(queries)), k),
+            'query_peptide': np.repeat(queries['Epitope - Name'].to_numpy(dtype=object), k),
+            'rank': np.tile(np.arange(1, k + 1), len(queries)),
+            'known_epitope': known,
+            'similarity': sims.ravel(),
+            'known_target_strength': self.labels[flat_rows],
+            'known_mhc_class': self.mhc_classes[flat_rows],
+            'training_row': flat_rows
+        })
+
+
+_epitope_index = None
+
+
+def load_epitope_index(path=EPITOPE_INDEX_PATH):
+    """
+    Returns the epitope index at `path`, memory-mapped and cached per process, or
+    None if it has not been built. A warning is printed if the training set changed
+    since it was built.
+    """
+    global _epitope_index
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        return None
+    if _epitope_index is None or _epitope_index.path != path:
+        _epitope_index = EpitopeIndex(path)
+        if _epitope_index.is_stale():
+            print("⚠️ The training set changed since the epitope index was built; rebuild it with EpitopeIndex.build")
+    return _epitope_index
+
+
+def nearest_known_epitopes(scored, k=5, min_prob=None, index=None):
+    """
+    Finds the `k` most similar known epitopes of the high-scoring candidates of a
+    scored table (see `score_candidates`).
+
+    Parameters:
+        scored (pd.DataFrame): Scored candidates with 'target_prob' and
+            'target_strength'.
+        k (int): Neighbours per candidate.
+        min_prob (float): Candidates with at least this probability are searched
+            (default: those with 'target_strength' 1).
+        index (EpitopeIndex): Index to search (default: `load_epitope_index()`).
+
+    Returns:
+        pd.DataFrame: The searched candidates, `k` rows each, with their columns
+        followed by the neighbour columns of `EpitopeIndex.search`.
+    """
+    if index is None:
+        index = load_epitope_index()
+    if index is None:
+        raise FileNotFoundError(f"No epitope index at {EPITOPE_INDEX_PATH}; build one with EpitopeIndex.build")
+    if min_prob is None:
+        selected = scored['target_strength'].fillna(0).astype(bool)
+    else:
+        selected = scored['target_prob'].fillna(-1) >= min_prob
+    candidates = scored[selected.to_numpy()].reset_index(drop=True)
+    print(f"🔎 Searching the {k} nearest known epitopes of {len(candidates)} candidates...")
+    if candidates.empty:
+        return candidates
+    neighbours = index.search(candidates, k=k)
+    return pd.concat([candidates.iloc[neighbours['query']].reset_index(drop=True),
+                      neighbours.drop(columns=['query', 'query_peptide'])], axis=1)
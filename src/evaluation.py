@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+
+METRICS = ['precision', 'recall', 'accuracy', 'f1']
+
+
+def bootstrap_count_matrix(n_samples, n_resamples, rng):
+    """
+    Draws bootstrap resamples as a count matrix.
+
+    Row b holds how many times each sample was drawn in resample b, so any
+    additive statistic of resample b is a dot product of that row with a
+    per-sample vector.
+
+    Parameters:
+    -----------
+    n_samples : int
+        Number of observations in the original sample.
+    n_resamples : int
+        Number of bootstrap resamples (rows).
+    rng : np.random.Generator
+        Random generator.
+
+    Returns:
+    --------
+    np.ndarray
+        (n_resamples, n_samples) int32 matrix whose rows sum to `n_samples`.
+    """
+    draws = rng.integers(0, n_samples, size=(n_resamples, n_samples))
+    offsets = (np.arange(n_resamples) * n_samples)[:, np.newaxis]
+    counts = np.bincount((draws + offsets).ravel(), minlength=n_resamples * n_samples)
+    return counts.reshape(n_resamples, n_samples).astype(np.int32)
+
+
+def _sorted_groups(y_prob):
+    """
+    Sorts scores in descending order and returns the start of each run of tied scores.
+    """
+    order = np.argsort(-y_prob, kind='mergesort')
+    sorted_prob = y_prob[order]
+    starts = np.flatnonzero(np.r_[True, sorted_prob[1:] != sorted_prob[:-1]])
+    return order, sorted_prob, starts
+
+
+def _confusion_counts(counts, y_true, y_prob, thresholds):
+    """
+    Confusion counts of every resample at every threshold, from a single sort.
+
+    A sample is predicted positive when its score is strictly above the threshold,
+    as in `predict.py`.
+
+    Returns:
+    --------
+    tuple of np.ndarray
+        tp, fp, fn, tn, each of shape (n_resamples, n_thresholds).
+    """
+    order, sorted_prob, _ = _sorted_groups(y_prob)
+    pos = counts[:, order] * y_true[order]
+    neg = counts[:, order] - pos
+
+    # Number of samples scored strictly above each threshold in the descending order
+    n_above = np.searchsorted(-sorted_prob, -np.asarray(thresholds, dtype=np.float64), side='left')
+
+    zero = np.zeros((counts.shape[0], 1), dtype=np.int64)
+    cum_pos = np.concatenate([zero, np.cumsum(pos, axis=1)], axis=1)
+    cum_neg = np.concatenate([zero, np.cumsum(neg, axis=1)], axis=1)
+
+    tp = cum_pos[:, n_above]
+    fp = cum_neg[:, n_above]
+    fn = cum_pos[:, -1:] - tp
+    tn = cum_neg[:, -1:] - fp
+    return tp, fp, fn, tn
+
+
+def _rank_auc(counts, y_true, y_prob):
+    """
+    ROC AUC of every resample at once from the Mann-Whitney rank statistic.
+
+    Tied scores count as half a correctly ranked pair, matching `sklearn.metrics.roc_auc_score`.
+
+    Returns:
+    --------
+    np.ndarray
+        AUC per resample, NaN where a resample contains a single class.
+    """
+    order, _, starts = _sorted_groups(y_prob)
+    pos = counts[:, order] * y_true[order]
+    neg = counts[:, order] - pos
+
+    # Weighted positives and negatives per group of tied scores (descending score order)
+    pos_group = np.add.reduceat(pos, starts, axis=1).astype(np.float64)
+    neg_group = np.add.reduceat(neg, starts, axis=1).astype(np.float64)
+
+    # Negatives scored strictly below each group = all negatives after it in descending order
+    neg_below = neg_group[:, ::-1].cumsum(axis=1)[:, ::-1] - neg_group
+    correct_pairs = (pos_group * (neg_below + 0.5 * neg_group)).sum(axis=1)
+    n_pairs = pos_group.sum(axis=1) * neg_group.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n_pairs > 0, correct_pairs / n_pairs, np.nan)
+
+
+def _threshold_metrics(tp, fp, fn, tn):
+    """
+    Precision, recall, accuracy and F1 from confusion counts.
+
+    Undefined ratios are reported as 0, like sklearn's default `zero_division` behaviour.
+    """
+    tp, fp, fn, tn = (a.astype(np.float64) for a in (tp, fp, fn, tn))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        precision = np.nan_to_num(tp / (tp + fp))
+        recall = np.nan_to_num(tp / (tp + fn))
+        accuracy = np.nan_to_num((tp + tn) / (tp + fp + fn + tn))
+        f1 = np.nan_to_num(2 * tp / (2 * tp + fp + fn))
+    return {'precision': precision, 'recall': recall, 'accuracy': accuracy, 'f1': f1}
+
+
+def _block_statistics(y_true, y_prob, thresholds, n_resamples, seed):
+    """
+    Computes all metrics for one block of bootstrap resamples.
+    """
+    rng = np.random.default_rng(seed)
+    counts = bootstrap_count_matrix(len(y_true), n_resamples, rng)
+    stats = _threshold_metrics(*_confusion_counts(counts, y_true, y_prob, thresholds))
+    stats['roc_auc'] = _rank_auc(counts, y_true, y_prob)
+    return stats
+
+
+def _bootstrap_statistics(y_true, y_prob, thresholds, n_resamples, random_state, block_size, n_jobs):
+    """
+    Runs the resamples in blocks, optionally across a process pool, and stacks the results.
+
+    Block seeds are spawned from `random_state`, so results do not depend on `n_jobs`.
+    """
+    block_sizes = [block_size] * (n_resamples // block_size)
+    if n_resamples % block_size:
+        block_sizes.append(n_resamples % block_size)
+    seeds = np.random.SeedSequence(random_state).spawn(len(block_sizes))
+
+    blocks = Parallel(n_jobs=n_jobs)(
+        delayed(_block_statistics)(y_true, y_prob, thresholds, size, seed)
+        for size, seed in zip(block_sizes, seeds)
+    )
+    return {name: np.concatenate([block[name] for block in blocks]) for name in blocks[0]}
+
+
+def _prepare_inputs(y_true, y_prob):
+    y_true = np.asarray(y_true).astype(np.int64).ravel()
+    y_prob = np.asarray(y_prob, dtype=np.float64).ravel()
+    if y_true.shape != y_prob.shape:
+        raise ValueError("y_true and y_prob must have the same length")
+    return y_true, y_prob
+
+
+def bootstrap_metric_ci(y_true, y_prob, threshold=0.4, n_resamples=10_000, confidence=0.95,
+                        random_state=42, block_size=500, n_jobs=1):
+    """
+    Bootstrap confidence intervals for precision, recall, accuracy, F1 and ROC AUC.
+
+    All resamples are evaluated in vectorized blocks: a resample-count matrix
+    gives the confusion counts of each resample through cumulative sums over a
+    single sort of the scores, and ROC AUC is computed from ranks for the whole
+    block at once.
+
+    Parameters:
+    -----------
+    y_true : array-like
+        Binary true labels.
+    y_prob : array-like
+        Predicted probabilities.
+    threshold : float, optional
+        Probability above which a sample is predicted positive (default 0.4, as in `predict.py`).
+    n_resamples : int, optional
+        Number of bootstrap resamples.
+    confidence : float, optional
+        Confidence level of the percentile intervals.
+    random_state : int, optional
+        Seed for reproducibility.
+    block_size : int, optional
+        Resamples evaluated together; bounds memory to about block_size * n_samples counts.
+    n_jobs : int, optional
+        Number of worker processes (1 runs in-process).
+
+    Returns:
+    --------
+    pd.DataFrame
+        One row per metric with columns 'metric', 'threshold', 'estimate',
+        'ci_lower', 'ci_upper' and 'n_resamples'.
+    """
+    return bootstrap_threshold_sweep(y_true, y_prob, thresholds=[threshold], n_resamples=n_resamples,
+                                     confidence=confidence, random_state=random_state,
+                                     block_size=block_size, n_jobs=n_jobs)
+
+
+def bootstrap_threshold_sweep(y_true, y_prob, thresholds=None, n_resamples=10_000, confidence=0.95,
+                              random_state=42, block_size=500, n_jobs=1):
+    """
+    Bootstrap confidence intervals of the threshold metrics over a sweep of thresholds.
+
+    Parameters are as in `bootstrap_metric_ci`; `thresholds` defaults to 0.05 to 0.95
+    in steps of 0.05. ROC AUC does not depend on the threshold and is reported
+    once with a NaN threshold.
+
+    Returns:
+    --------
+    pd.DataFrame
+        Tidy table with one row per (metric, threshold).
+    """
+    y_true, y_prob = _prepare_inputs(y_true, y_prob)
+    if thresholds is None:
+        thresholds = np.round(np.arange(0.05, 1.0, 0.05), 2)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+
+    # Point estimates use the same code path with every sample counted once
+    ones = np.ones((1, len(y_true)), dtype=np.int32)
+    point = _threshold_metrics(*_confusion_counts(ones, y_true, y_prob, thresholds))
+    point['roc_auc'] = _rank_auc(ones, y_true, y_prob)
+
+    boot = _bootstrap_statistics(y_true, y_prob, thresholds, n_resamples, random_state, block_size, n_jobs)
+
+    alpha = (1 - confidence) / 2
+    rows = []
+    for metric in METRICS:
+        lower, upper = np.nanquantile(boot[metric], [alpha, 1 - alpha], axis=0)
+        for i, threshold in enumerate(thresholds):
+            rows.append((metric, threshold, point[metric][0, i], lower[i], upper[i]))
+    lower, upper = np.nanquantile(boot['roc_auc'], [alpha, 1 - alpha])
+    rows.append(('roc_auc', np.nan, point['roc_auc'][0], lower, upper))
+
+    table = pd.DataFrame(rows, columns=['metric', 'threshold', 'estimate', 'ci_lower', 'ci_upper'])
+    table['n_resamples'] = n_resamples
+    return table
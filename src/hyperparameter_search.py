@@ -0,0 +1,398 @@
+import json
+import math
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from src.config import HPARAM_SEARCH_PATH, PROCESSED_DATA_PATH
+from src.utils import file_fingerprint, fingerprint_matches
+
+
+# Choices for each hyperparameter; architecture keys are passed to `CNN_multimodal_class`
+SEARCH_SPACE = {
+    'conv1_filters': [8, 16, 32],
+    'conv1_kernel': [[2, 12], [3, 12], [2, 20], [3, 20], [2, 6]],
+    'conv2_filters': [16, 32, 64],
+    'conv2_kernel': [[2, 1], [3, 1]],
+    'conv_dropout': [0.2, 0.3, 0.4, 0.5],
+    'dense_units': [64, 128, 256],
+    'dense_dropout': [0.2, 0.3, 0.4, 0.5],
+    'cat_units': [16, 32, 64],
+    'cat_dropout': [0.1, 0.3],
+    'optimizer': ['adam', 'rmsprop'],
+    'learning_rate': [3e-4, 1e-3, 3e-3],
+    'batch_size': [32, 64, 128]
+}
+TRAINING_KEYS = ['optimizer', 'learning_rate', 'batch_size']
+DATASET_ARRAYS = ['X_train', 'X_val', 'X_cat_train', 'X_cat_val', 'y_train', 'y_val', 'w_train', 'w_val']
+DATASET_MANIFEST_FILE = "dataset.json"
+TRAINING_ROW_KEYS_PATH = PROCESSED_DATA_PATH + "row_keys.joblib"
+
+_worker_dataset = None
+
+
+def sample_hyperparameters(trial_id, random_state=42, space=SEARCH_SPACE):
+    """
+    Draws one configuration from `space`. The draw only depends on `trial_id` and
+    `random_state`, so a resumed search proposes the same trials.
+    """
+    rng = np.random.default_rng([random_state, trial_id])
+    return {name: choices[rng.integers(len(choices))] for name, choices in space.items()}
+
+
+def build_model(hyperparameters):
+    """
+    Builds and compiles `CNN_multimodal_class` from a configuration of `SEARCH_SPACE`.
+    """
+    from tensorflow.keras.optimizers import Adam, RMSprop
+    from models.cnn_multimodal_classifier import CNN_multimodal_class
+
+    architecture = {name: value for name, value in hyperparameters.items() if name not in TRAINING_KEYS}
+    model = CNN_multimodal_class(**architecture)
+    optimizers = {'adam': Adam, 'rmsprop': RMSprop}
+    model.compile(
+        optimizer=optimizers[hyperparameters.get('optimizer', 'adam')](
+            learning_rate=hyperparameters.get('learning_rate', 1e-3)
+        ),
+        loss='binary_crossentropy',
+        metrics=['accuracy']
+    )
+    return model
+
+
+def prepare_search_dataset(dataset_dir, grouping='random'):
+    """
+    Saves the training/validation split as uncompressed `.npy` files, so that every
+    trial process memory-maps the same copy instead of loading its own.
+
+    The files are only written once, with a manifest of the `grouping` and the
+    fingerprint of the training set (its row keys) they were split from; a '_DONE'
+    marker is written last. If the saved split was made with another grouping, or
+    the training set changed since (see `prepare_training_set` and
+    `update_training_set`), its trials are not comparable with new ones, so an
+    error asks for a new search name instead of reusing it.
+
+    Returns:
+        dict: The manifest, {'grouping': str, 'training_row_keys': fingerprint}.
+    """
+    done_marker = os.path.join(dataset_dir, "_DONE")
+    manifest_path = os.path.join(dataset_dir, DATASET_MANIFEST_FILE)
+    if os.path.exists(done_marker):
+        if not os.path.exists(manifest_path):
+            raise ValueError(f"The split in {dataset_dir} has no manifest, so what it was built from is unknown; "
+                             f"start a search with a new name")
+        with open(manifest_path) as handle:
+            manifest = json.load(handle)
+        if manifest['grouping'] != grouping:
+            raise ValueError(f"The split in {dataset_dir} uses grouping '{manifest['grouping']}', not "
+                             f"'{grouping}'; start a search with a new name")
+        if not fingerprint_matches(TRAINING_ROW_KEYS_PATH, manifest['training_row_keys']):
+            raise ValueError(f"The training set changed since the split in {dataset_dir} was made; "
+                             f"start a search with a new name")
+        return manifest
+    from src.data_processing.pipeline_prepare_training_set import separate_train_val
+
+    os.makedirs(dataset_dir, exist_ok=True)
+    for name, array in zip(DATASET_ARRAYS, separate_train_val(grouping=grouping)):
+        np.save(os.path.join(dataset_dir, name + ".npy"), np.ascontiguousarray(array, dtype=np.float32))
+    manifest = {'grouping': grouping, 'training_row_keys': file_fingerprint(TRAINING_ROW_KEYS_PATH)}
+    with open(manifest_path, 'w') as handle:
+        json.dump(manifest, handle, indent=2)
+    open(done_marker, 'w').close()
+    return manifest
+
+
+def _memmap_batches(x, x_cat, y, w, batch_size, shuffle, seed):
+    """
+    Keras dataset reading batches from memory-mapped arrays, so a trial never holds
+    more than one batch of the shared dataset in its own memory.
+    """
+    from tensorflow.keras.utils import PyDataset
+
+    class MemmapBatches(PyDataset):
+        def __init__(self):
+            super().__init__()
+            self.rng = np.random.default_rng(seed)
+            self.order = np.arange(len(y))
+            self.on_epoch_end()
+
+        def __len__(self):
+            return math.ceil(len(y) / batch_size)
+
+        def __getitem__(self, index):
+            # Sorted indices keep reads from the memory map sequential
+            rows = np.sort(self.order[index * batch_size:(index + 1) * batch_size])
+            return (x[rows], x_cat[rows]), y[rows], w[rows]
+
+        def on_epoch_end(self):
+            if shuffle:
+                self.rng.shuffle(self.order)
+
+    return MemmapBatches()
+
+
+def _init_trial_worker(dataset_dir, intra_op_threads, inter_op_threads):
+    """
+    Configures TensorFlow threading and memory-maps the dataset once per worker process.
+    """
+    global _worker_dataset
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    _worker_dataset = {name: np.load(os.path.join(dataset_dir, name + ".npy"), mmap_mode='r')
+                       for name in DATASET_ARRAYS}
+
+
+def _run_trial(trial_id, hyperparameters, model_path, start_epoch, end_epoch, patience):
+    """
+    Trains a trial from `start_epoch` to `end_epoch`, continuing from its saved
+    model if it was promoted from a lower rung, and saves it again.
+
+    Returns:
+        dict: Best validation loss so far and epochs actually run.
+    """
+    from tensorflow.keras.callbacks import EarlyStopping
+    from tensorflow.keras.models import load_model
+
+    start = time.perf_counter()
+    data = _worker_dataset
+    model = load_model(model_path) if start_epoch > 0 else build_model(hyperparameters)
+    batch_size = hyperparameters.get('batch_size', 32)
+
+    history = model.fit(
+        _memmap_batches(data['X_train'], data['X_cat_train'], data['y_train'], data['w_train'],
+                        batch_size, shuffle=True, seed=trial_id),
+        validation_data=_memmap_batches(data['X_val'], data['X_cat_val'], data['y_val'], data['w_val'],
+                                        1024, shuffle=False, seed=0),
+        epochs=end_epoch,
+        initial_epoch=start_epoch,
+        callbacks=[EarlyStopping(monitor='val_loss', patience=patience)],
+        verbose=0
+    )
+    # Keras only saves to paths ending in '.keras'; the rename keeps the previous rung's model intact until then
+    model.save(model_path + ".tmp.keras")
+    os.replace(model_path + ".tmp.keras", model_path)
+    val_losses = history.history['val_loss']
+    return {'val_loss': float(min(val_losses)), 'epochs': len(val_losses), 'seconds': time.perf_counter() - start}
+
+
+class TrialDatabase:
+    """
+    SQLite record of a search: one row per trial with its configuration, the last
+    completed rung and its status, plus the validation loss of every (trial, rung).
+
+    Statuses: 'running', 'paused' (rung completed, waiting for promotion), 'done'
+    (top rung completed) and 'failed'.
+
+    The settings the trials are compared under (grouping and training set of the
+    validation split) are kept in a `settings` table, see `check_settings`.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS trials (
+                trial_id INTEGER PRIMARY KEY,
+                hyperparameters TEXT NOT NULL,
+                rung INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS rung_results (
+                trial_id INTEGER NOT NULL,
+                rung INTEGER NOT NULL,
+                val_loss REAL NOT NULL,
+                epochs INTEGER NOT NULL,
+                seconds REAL NOT NULL,
+                PRIMARY KEY (trial_id, rung)
+            );
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        self.connection.commit()
+
+    def execute(self, sql, parameters=()):
+        cursor = self.connection.execute(sql, parameters)
+        self.connection.commit()
+        return cursor
+
+    def check_settings(self, settings):
+        """
+        Records `settings` on first use; afterwards raises ValueError if they differ
+        from the recorded ones, so that a resumed search never mixes trials scored on
+        different validation splits.
+        """
+        recorded = dict(self.execute("SELECT key, value FROM settings").fetchall())
+        if not recorded:
+            if self.n_trials():
+                raise ValueError("The trial database predates recorded search settings, so its trials cannot be "
+                                 "checked against the current split; start a search with a new name")
+            for key, value in settings.items():
+                self.execute("INSERT INTO settings VALUES (?, ?)", (key, json.dumps(value)))
+            return
+        recorded = {key: json.loads(value) for key, value in recorded.items()}
+        if recorded != settings:
+            raise ValueError(f"The trials were run with {recorded}, not {settings}; start a search with a new name")
+
+    def n_trials(self):
+        return self.execute("SELECT COUNT(*) FROM trials").fetchone()[0]
+
+    def add_trial(self, trial_id, hyperparameters):
+        self.execute("INSERT INTO trials VALUES (?, ?, -1, 'running', NULL, ?)",
+                     (trial_id, json.dumps(hyperparameters), time.time()))
+
+    def hyperparameters(self, trial_id):
+        return json.loads(self.execute("SELECT hyperparameters FROM trials WHERE trial_id = ?",
+                                       (trial_id,)).fetchone()[0])
+
+    def set_status(self, trial_id, status, rung=None, error=None):
+        self.execute("UPDATE trials SET status = ?, rung = COALESCE(?, rung), error = ?, updated_at = ? "
+                     "WHERE trial_id = ?", (status, rung, error, time.time(), trial_id))
+
+    def record_rung(self, trial_id, rung, result):
+        self.execute("INSERT OR REPLACE INTO rung_results VALUES (?, ?, ?, ?, ?)",
+                     (trial_id, rung, result['val_loss'], result['epochs'], result['seconds']))
+
+    def interrupted(self):
+        return [row[0] for row in self.execute("SELECT trial_id FROM trials WHERE status = 'running'")]
+
+    def promotable(self, rung, eta):
+        """
+        Returns a paused trial of `rung` ranking in the top 1/eta of the trials that
+        completed this rung, or None.
+        """
+        losses = self.execute("SELECT trial_id, val_loss FROM rung_results WHERE rung = ? ORDER BY val_loss",
+                              (rung,)).fetchall()
+        top = {trial_id for trial_id, _ in losses[:len(losses) // eta]}
+        paused = self.execute("SELECT trial_id FROM trials WHERE status = 'paused' AND rung = ?", (rung,))
+        for (trial_id,) in paused:
+            if trial_id in top:
+                return trial_id
+        return None
+
+    def results(self):
+        return pd.read_sql_query(
+            """
+            SELECT t.trial_id, t.status, t.rung, r.val_loss, r.epochs, t.hyperparameters
+            FROM trials t LEFT JOIN rung_results r ON r.trial_id = t.trial_id AND r.rung = t.rung
+            ORDER BY t.rung DESC, r.val_loss
+            """,
+            self.connection
+        )
+
+
+def run_hyperparameter_search(name='default', n_trials=27, min_epochs=2, max_epochs=60, eta=3,
+                              n_workers=None, intra_op_threads=None, inter_op_threads=1,
+                              grouping='random', patience=5, random_state=42):
+    """
+    Searches `SEARCH_SPACE` with asynchronous successive halving (ASHA).
+
+    Every trial first trains for `min_epochs`. Rung r trains up to
+    `min_epochs * eta**r` epochs (capped at `max_epochs`). Whenever a worker is free,
+    the best-ranked paused trial that is in the top 1/eta of its rung is promoted and
+    continues from its saved model; otherwise a new trial starts. Poor configurations
+    therefore stop after a few epochs, and no worker waits for a whole rung to finish.
+
+    Trials run in `n_workers` processes that memory-map one shared copy of the
+    training data (see `prepare_search_dataset`), each with `intra_op_threads`
+    TensorFlow threads (default: CPUs divided by workers), so that workers do not
+    oversubscribe the cores. Progress is stored in a SQLite trial database under
+    `HPARAM_SEARCH_PATH/<name>/`; calling the function again with the same name
+    resumes the search, rerunning only the rungs that were interrupted. A search
+    is tied to its `grouping` and to the training set it started on: resuming it
+    after either changed raises an error, and a new name starts a new search.
+
+    Returns:
+        pd.DataFrame: One row per trial with its status, last rung, validation loss
+        and hyperparameters, best trials first.
+    """
+    search_dir = os.path.join(HPARAM_SEARCH_PATH, name)
+    dataset_dir = os.path.join(search_dir, "dataset")
+    model_dir = os.path.join(search_dir, "trials")
+    os.makedirs(model_dir, exist_ok=True)
+    dataset = prepare_search_dataset(dataset_dir, grouping=grouping)
+
+    n_rungs = max(1, int(math.floor(math.log(max_epochs / min_epochs, eta))) + 1)
+    budgets = [min(max_epochs, min_epochs * eta ** r) for r in range(n_rungs)]
+    budgets[-1] = max_epochs
+
+    n_cpus = os.cpu_count() or 1
+    n_workers = n_workers or n_cpus
+    intra_op_threads = intra_op_threads or max(1, n_cpus // n_workers)
+
+    database = TrialDatabase(os.path.join(search_dir, "trials.sqlite"))
+    database.check_settings({'grouping': grouping, 'training_row_keys': dataset['training_row_keys']['sha256']})
+    # Interrupted rungs are rerun from the trial's last saved model
+    queue = [(trial_id, database.execute("SELECT rung FROM trials WHERE trial_id = ?",
+                                         (trial_id,)).fetchone()[0] + 1)
+             for trial_id in database.interrupted()]
+    print(f"🔬 Search '{name}': rungs at {budgets} epochs, {n_workers} workers x {intra_op_threads} threads, "
+          f"{database.n_trials()} trials so far" + (f", resuming {len(queue)}" if queue else ""))
+
+    def next_job():
+        if queue:
+            return queue.pop(0)
+        for rung in reversed(range(n_rungs - 1)):
+            trial_id = database.promotable(rung, eta)
+            if trial_id is not None:
+                return trial_id, rung + 1
+        trial_id = database.n_trials()
+        if trial_id < n_trials:
+            database.add_trial(trial_id, sample_hyperparameters(trial_id, random_state))
+            return trial_id, 0
+        return None
+
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_trial_worker,
+                             initargs=(dataset_dir, intra_op_threads, inter_op_threads)) as pool:
+        running = {}
+        while True:
+            while len(running) < n_workers:
+                job = next_job()
+                if job is None:
+                    break
+                trial_id, rung = job
+                database.set_status(trial_id, 'running')
+                start_epoch = budgets[rung - 1] if rung > 0 else 0
+                future = pool.submit(_run_trial, trial_id, database.hyperparameters(trial_id),
+                                     os.path.join(model_dir, f"trial_{trial_id:04d}.keras"),
+                                     start_epoch, budgets[rung], patience)
+                running[future] = (trial_id, rung)
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                trial_id, rung = running.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    # Running trials stay 'running' and are resumed on the next call
+                    raise
+                except Exception as error:
+                    database.set_status(trial_id, 'failed', error=repr(error))
+                    print(f"❌ Trial {trial_id} failed at rung {rung}: {error!r}")
+                    continue
+                database.record_rung(trial_id, rung, result)
+                status = 'done' if rung == n_rungs - 1 or result['epochs'] < budgets[rung] - (
+                    budgets[rung - 1] if rung > 0 else 0) else 'paused'
+                database.set_status(trial_id, status, rung=rung)
+                print(f"✅ Trial {trial_id} rung {rung} ({budgets[rung]} epochs): "
+                      f"val_loss {result['val_loss']:.4f} in {result['seconds']:.0f}s")
+
+    results = database.results()
+    if len(results):
+        best = results.iloc[0]
+        print(f"🏆 Best trial {best['trial_id']} (rung {best['rung']}): val_loss {best['val_loss']:.4f}")
+    return results
@@ -0,0 +1,321 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from src.config import JOBS_PATH, SMALL_JOB_MAX_ROWS
+from src.candidate_io import read_candidates
+from src.model_registry import get_registry
+
+
+# Lanes in the order workers serve them
+LANES = ('interactive', 'bulk')
+RESULT_COLUMNS = ['id', 'Epitope - Name', 'MHC Restriction - Class', 'mhc_status',
+                  'valid', 'target_prob', 'target_strength']
+
+
+class JobQueue:
+    """
+    Persistent SQLite queue of scoring jobs.
+
+    A job's candidates are written to a CSV file under `JOBS_PATH` when it is
+    submitted, and its results are stored row by row in the database, so they can
+    be read back in pages while the job is still running. Jobs of at most
+    `small_job_max_rows` rows go to the 'interactive' lane, larger ones to 'bulk'.
+
+    Parameters:
+        path (str): Location of the SQLite database file.
+        small_job_max_rows (int): Largest job sent to the interactive lane.
+    """
+
+    def __init__(self, path=JOBS_PATH + "jobs.sqlite", small_job_max_rows=SMALL_JOB_MAX_ROWS):
+        self.input_dir = os.path.join(os.path.dirname(path) or '.', "inputs")
+        os.makedirs(self.input_dir, exist_ok=True)
+        self.path = path
+        self.small_job_max_rows = small_job_max_rows
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                lane TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                threshold REAL NOT NULL,
+                n_rows INTEGER NOT NULL,
+                rows_done INTEGER NOT NULL DEFAULT 0,
+                input_path TEXT NOT NULL,
+                submitted_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, lane, submitted_at);
+            CREATE TABLE IF NOT EXISTS results (
+                job_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                id TEXT,
+                peptide TEXT NOT NULL,
+                mhc_class TEXT NOT NULL,
+                mhc_status TEXT,
+                valid INTEGER NOT NULL,
+                target_prob REAL,
+                target_strength INTEGER,
+                PRIMARY KEY (job_id, position)
+            ) WITHOUT ROWID;
+            """
+        )
+        self.connection.commit()
+
+    def submit(self, candidates, model_name=None, threshold=None):
+        """
+        Queues a table of candidates (see `prepare_candidates` for columns) to be
+        scored by the registered model `model_name` (see `get_registry`).
+
+        `threshold` defaults to the model's registered threshold at submission time.
+
+        Returns:
+            dict: The job's status (see `status`).
+        """
+        model_info = get_registry().info(model_name)
+        if threshold is None:
+            threshold = model_info['threshold']
+
+        job_id = uuid.uuid4().hex
+        input_path = os.path.join(self.input_dir, job_id + ".csv")
+        candidates.to_csv(input_path + ".tmp", index=False)
+        os.replace(input_path + ".tmp", input_path)
+
+        lane = LANES[0] if len(candidates) <= self.small_job_max_rows else LANES[1]
+        with self._lock:
+            self.connection.execute(
+                "INSERT INTO jobs (job_id, status, lane, model_name, threshold, n_rows, input_path, submitted_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (job_id, lane, model_info['name'], float(threshold), len(candidates), input_path, time.time())
+            )
+            self.connection.commit()
+        return self.status(job_id)
+
+    def claim(self, lanes=LANES):
+        """
+        Marks the oldest queued job of the first non-empty lane in `lanes` as running.
+
+        Returns:
+            dict: The claimed job's row, or None if no job is waiting.
+        """
+        placeholders = ', '.join('?' * len(lanes))
+        lane_order = ' '.join(f"WHEN '{lane}' THEN {i}" for i, lane in enumerate(LANES))
+        with self._lock:
+            row = self.connection.execute(
+                f"SELECT job_id FROM jobs WHERE status = 'queued' AND lane IN ({placeholders}) "
+                f"ORDER BY CASE lane {lane_order} END, submitted_at LIMIT 1",
+                tuple(lanes)
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE job_id = ?", (time.time(), row[0])
+            )
+            self.connection.commit()
+        return self._job(row[0])
+
+    def record_results(self, job_id, position, scored):
+        """
+        Stores a chunk of scored rows starting at row `position` of the job.
+        """
+        ids = scored['id'].astype(str).to_numpy() if 'id' in scored.columns else np.full(len(scored), None)
+        strengths = scored['target_strength'].astype(object).where(scored['target_strength'].notna(), None)
+        probs = scored['target_prob'].astype(object).where(scored['target_prob'].notna(), None)
+        rows = zip(
+            range(position, position + len(scored)),
+            ids,
+            scored['Epitope - Name'].astype(str),
+            scored['MHC Restriction - Class'].astype(str),
+            scored['mhc_status'].where(scored['mhc_status'].notna(), None),
+            scored['valid'].astype(int),
+            (None if p is None else float(p) for p in probs),
+            (None if s is None else int(s) for s in strengths)
+        )
+        with self._lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((job_id,) + tuple(row) for row in rows)
+            )
+            self.connection.execute(
+                "UPDATE jobs SET rows_done = ? WHERE job_id = ?", (position + len(scored), job_id)
+            )
+            self.connection.commit()
+
+    def finish(self, job_id, error=None):
+        """
+        Marks a running job as done, or as failed with `error`.
+        """
+        with self._lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE job_id = ? AND status = 'running'",
+                ('failed' if error else 'done', time.time(), error, job_id)
+            )
+            self.connection.commit()
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued or running job; a running job stops after its current chunk.
+
+        Returns:
+            bool: Whether the job was cancelled.
+        """
+        with self._lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? "
+                "WHERE job_id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id)
+            )
+            self.connection.commit()
+        return cursor.rowcount > 0
+
+    def requeue_interrupted(self):
+        """
+        Puts jobs left 'running' by a stopped process back in the queue.
+
+        Their partial results are kept and overwritten when the job runs again.
+
+        Returns:
+            int: Number of jobs requeued.
+        """
+        with self._lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, rows_done = 0 WHERE status = 'running'"
+            )
+            self.connection.commit()
+        return cursor.rowcount
+
+    def _job(self, job_id):
+        with self._lock:
+            cursor = self.connection.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+            row = cursor.fetchone()
+            names = [column[0] for column in cursor.description]
+        return None if row is None else dict(zip(names, row))
+
+    def status(self, job_id):
+        """
+        Returns:
+            dict: Status, lane, progress and timings of the job, or None if it does not exist.
+        """
+        job = self._job(job_id)
+        if job is None:
+            return None
+        job.pop('input_path')
+        if job['status'] == 'queued':
+            with self._lock:
+                job['queue_position'] = self.connection.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND lane = ? AND submitted_at < ?",
+                    (job['lane'], job['submitted_at'])
+                ).fetchone()[0]
+        return job
+
+    def results(self, job_id, offset=0, limit=1000):
+        """
+        Reads one page of a job's results, in input order.
+
+        Returns:
+            pd.DataFrame: Up to `limit` rows starting at row `offset`, with `RESULT_COLUMNS`.
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT id, peptide, mhc_class, mhc_status, valid, target_prob, target_strength "
+                "FROM results WHERE job_id = ? AND position >= ? ORDER BY position LIMIT ?",
+                (job_id, int(offset), int(limit))
+            ).fetchall()
+        page = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+        page['valid'] = page['valid'].astype(bool)
+        return page
+
+    def is_cancelled(self, job_id):
+        job = self._job(job_id)
+        return job is None or job['status'] == 'cancelled'
+
+    def close(self):
+        self.connection.close()
+
+
+class JobWorkerPool:
+    """
+    Background threads that run the jobs of a `JobQueue`.
+
+    The first worker only serves the interactive lane, so small jobs never wait
+    behind a large one; the others serve both lanes, interactive jobs first. Jobs are
+    scored in chunks of `chunksize` rows, and results are stored after each chunk so
+    clients can page through them while the job runs. Models come from the shared
+    model registry as warmed-up `ServingModel`s, so jobs for an already loaded model
+    start without loading or tracing it again.
+
+    Parameters:
+        queue (JobQueue): Queue to serve.
+        n_workers (int): Number of worker threads.
+        chunksize (int): Rows scored at a time.
+        batch_size (int): Batch size for `model.predict` (default: tuned, see `autotune`).
+        poll_interval (float): Seconds an idle worker waits before checking the queue again.
+    """
+
+    def __init__(self, queue, n_workers=2, chunksize=10_000, batch_size=None, poll_interval=0.5):
+        self.queue = queue
+        self.n_workers = n_workers
+        self.chunksize = chunksize
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        requeued = self.queue.requeue_interrupted()
+        if requeued:
+            print(f"♻️ Requeued {requeued} interrupted jobs")
+        self._stop.clear()
+        for i in range(self.n_workers):
+            lanes = LANES[:1] if i == 0 and self.n_workers > 1 else LANES
+            thread = threading.Thread(target=self._run, args=(lanes,), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        Stops the workers after their current chunk; unfinished jobs are requeued on the next start.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self, lanes):
+        while not self._stop.is_set():
+            job = self.queue.claim(lanes)
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            try:
+                self._process(job)
+            except Exception as error:
+                print(f"❌ Job {job['job_id']} failed: {error!r}")
+                self.queue.finish(job['job_id'], error=repr(error))
+
+    def _process(self, job):
+        from src.scoring import score_candidates
+
+        registry = get_registry()
+        model, _ = registry.get_serving(job['model_name'])
+        tokenizer = registry.tokenizer(job['model_name'])
+        position = 0
+        for chunk in read_candidates(job['input_path'], chunksize=self.chunksize):
+            if self._stop.is_set() or self.queue.is_cancelled(job['job_id']):
+                return
+            scored = score_candidates(model, chunk, threshold=job['threshold'], tokenizer=tokenizer,
+                                      batch_size=self.batch_size)
+            self.queue.record_results(job['job_id'], position, scored)
+            position += len(scored)
+        self.queue.finish(job['job_id'])
@@ -0,0 +1,215 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import joblib
+
+from src.config import SAVED_MODELS_PATH, DEFAULT_MODEL_NAME, MODEL_REGISTRY_FILE, MODEL_REGISTRY_MAX_LOADED
+from src.utils import path_sha256, manifest_path_for
+
+
+DEFAULT_THRESHOLD = 0.4
+DEFAULT_TOKENIZER = 'AA_index_tokenizer'
+
+
+def _load_keras_model(path):
+    from src.serving import is_serving_export, load_serving_model
+    if is_serving_export(path):
+        return load_serving_model(path)
+    from tensorflow.keras.models import load_model
+    return load_model(path)
+
+
+def manifest_tokenizer(path):
+    """
+    Tokenizer recorded in the training manifest of the model at `path`
+    (`DEFAULT_TOKENIZER` if the model has no manifest).
+    """
+    manifest_path = manifest_path_for(path)
+    if not os.path.exists(manifest_path):
+        return DEFAULT_TOKENIZER
+    return joblib.load(manifest_path).get('tokenizer', DEFAULT_TOKENIZER)
+
+
+class ModelRegistry:
+    """
+    In-process registry of scoring models, keyed by the SHA-256 of their content.
+
+    Models are registered under a name with their threshold, the tokenizer their
+    inputs must be encoded with and metadata, and loaded on first use. At most `max_loaded` models stay in memory; the least
+    recently used one is dropped when another is loaded. Names are resolved to a
+    content hash on every lookup, so a retrained file at the same path is picked up
+    as a new model while an unchanged one is never loaded twice.
+
+    Registrations are read from, and can be saved to, `registry_file`, so every
+    entry point (scorers, CLI, API) sees the same names and thresholds. The default
+    model is always available as `DEFAULT_MODEL_NAME`.
+
+    Directories written by `ServingModel.export` are loaded as `ServingModel`s;
+    `get_serving` wraps any model in one for long-running services.
+
+    Parameters:
+        registry_file (str): JSON file of registered models.
+        max_loaded (int): Maximum number of models kept in memory.
+    """
+
+    def __init__(self, registry_file=MODEL_REGISTRY_FILE, max_loaded=MODEL_REGISTRY_MAX_LOADED):
+        self.registry_file = registry_file
+        self.max_loaded = max_loaded
+        self._lock = threading.RLock()
+        self._entries = {DEFAULT_MODEL_NAME: {
+            'path': SAVED_MODELS_PATH + DEFAULT_MODEL_NAME + ".h5",
+            'threshold': DEFAULT_THRESHOLD,
+            'metadata': {}
+        }}
+        self._loaders = {}
+        self._loaded = OrderedDict()
+        self._serving = {}
+        if os.path.exists(registry_file):
+            with open(registry_file) as handle:
+                self._entries.update(json.load(handle).get('models', {}))
+
+    def register(self, name, path, threshold=DEFAULT_THRESHOLD, metadata=None, loader=None, save=False,
+                 tokenizer=None):
+        """
+        Registers (or updates) a model under `name`.
+
+        Parameters:
+            name (str): Name used to select the model.
+            path (str): Keras model file or exported model directory.
+            threshold (float): Probability threshold for this model's binary calls.
+            metadata (dict): Free-form JSON-serializable information about the model.
+            loader (callable): Loads the model from `path` (default: Keras `load_model`).
+            save (bool): Also write the registration to `registry_file`.
+            tokenizer (str): Tokenizer the model was trained with (default: the one
+                recorded in its training manifest, see `manifest_tokenizer`).
+
+        Returns:
+            str: Content hash of the model.
+        """
+        tokenizer = tokenizer or manifest_tokenizer(path)
+        with self._lock:
+            self._entries[name] = {'path': path, 'threshold': float(threshold), 'tokenizer': tokenizer,
+                                   'metadata': dict(metadata or {})}
+            if loader is not None:
+                self._loaders[name] = loader
+            if save:
+                self.save()
+        return self.model_hash(name)
+
+    def save(self):
+        """
+        Writes the registered models (except their loaders) to `registry_file`.
+        """
+        with self._lock:
+            os.makedirs(os.path.dirname(self.registry_file) or '.', exist_ok=True)
+            with open(self.registry_file + ".tmp", 'w') as handle:
+                json.dump({'models': self._entries}, handle, indent=2)
+            os.replace(self.registry_file + ".tmp", self.registry_file)
+
+    def _entry(self, name):
+        if name is None:
+            name = DEFAULT_MODEL_NAME
+        if name not in self._entries:
+            raise KeyError(f"Unknown model '{name}'. Registered models: {sorted(self._entries)}")
+        return name, self._entries[name]
+
+    def model_hash(self, name=None):
+        """
+        Returns:
+            str: SHA-256 of the current content of the model registered as `name`.
+        """
+        return path_sha256(self._entry(name)[1]['path'])
+
+    def threshold(self, name=None):
+        return self._entry(name)[1]['threshold']
+
+    def tokenizer(self, name=None):
+        """
+        Returns:
+            str: Tokenizer the model registered as `name` expects its peptides
+            encoded with. Entries registered before tokenizers were recorded fall
+            back to the model's training manifest.
+        """
+        name, entry = self._entry(name)
+        if 'tokenizer' not in entry:
+            entry['tokenizer'] = manifest_tokenizer(entry['path'])
+        return entry['tokenizer']
+
+    def info(self, name=None):
+        """
+        Returns:
+            dict: Name, path, hash (None if the file is missing), threshold, tokenizer,
+            metadata and whether the model is in memory.
+        """
+        name, entry = self._entry(name)
+        model_hash = self.model_hash(name) if os.path.exists(entry['path']) else None
+        return dict(entry, name=name, model_hash=model_hash, tokenizer=self.tokenizer(name),
+                    loaded=model_hash in self._loaded)
+
+    def names(self):
+        return sorted(self._entries)
+
+    def get(self, name=None):
+        """
+        Returns the model registered as `name`, loading it if it is not in memory.
+
+        Returns:
+            tuple: (model, content hash)
+        """
+        with self._lock:
+            name, entry = self._entry(name)
+            model_hash = self.model_hash(name)
+            if model_hash in self._loaded:
+                self._loaded.move_to_end(model_hash)
+                return self._loaded[model_hash], model_hash
+
+            print(f"📦 Loading model '{name}' ({model_hash[:12]})...")
+            model = self._loaders.get(name, _load_keras_model)(entry['path'])
+            self._loaded[model_hash] = model
+            while len(self._loaded) > self.max_loaded:
+                evicted_hash, _ = self._loaded.popitem(last=False)
+                self._serving.pop(evicted_hash, None)
+            return model, model_hash
+
+    def get_serving(self, name=None):
+        """
+        Returns the model registered as `name` wrapped in a warmed-up `ServingModel`,
+        built once per loaded model.
+
+        Returns:
+            tuple: (ServingModel, content hash)
+        """
+        from src.serving import ServingModel
+
+        with self._lock:
+            model, model_hash = self.get(name)
+            if model_hash not in self._serving:
+                serving = model if isinstance(model, ServingModel) else ServingModel(model)
+                self._serving[model_hash] = serving.warmup()
+            return self._serving[model_hash], model_hash
+
+    def evict(self, name=None):
+        """
+        Drops a model from memory; it is loaded again on next use.
+        """
+        with self._lock:
+            model_hash = self.model_hash(name)
+            self._loaded.pop(model_hash, None)
+            self._serving.pop(model_hash, None)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Returns the process-wide `ModelRegistry`, creating it on first use.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
@@ -0,0 +1,181 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from src.scoring import score_candidates
+
+
+MIN_WINDOW_LENGTH = 8
+MAX_WINDOW_LENGTH = 25
+MUTATION_PATTERN = re.compile(r'^(?:P\.)?([A-Z])(\d+)(?:_([A-Z])(\d+))?(DELINS|DEL|INS)?([A-Z]*)$')
+
+
+def parse_mutation(mutation):
+    """
+    Parses a protein-level mutation in HGVS-like notation (an optional 'p.' prefix
+    is accepted):
+
+    - substitution: 'G12D'
+    - deletion: 'K45del', 'K45_L47del'
+    - insertion: 'K45_L46insGS' (between the two residues)
+    - deletion-insertion: 'K45delinsGS', 'K45_L47delinsGS'
+
+    Positions are 1-based. Frameshifts and stop gains are not parsed; give the
+    altered sequence as a deletion-insertion instead.
+
+    Returns:
+        tuple: (start, end, reference, alternate) with 0-based `start`/`end`, such that
+        the mutant protein is `protein[:start] + alternate + protein[end:]`, and the
+        reference residues named by the notation ('' when they are implicit).
+    """
+    match = MUTATION_PATTERN.match(str(mutation).strip().upper())
+    if match is None:
+        raise ValueError(f"Cannot parse mutation '{mutation}'")
+    first_aa, first_pos, last_aa, last_pos, kind, alternate = match.groups()
+    kind = kind.lower() if kind else None
+    first_pos = int(first_pos)
+    last_pos = int(last_pos) if last_pos else first_pos
+
+    if kind is None:
+        if last_aa or len(alternate) != 1:
+            raise ValueError(f"Cannot parse mutation '{mutation}'")
+        return first_pos - 1, first_pos, first_aa, alternate
+    if kind == 'del' and alternate:
+        raise ValueError(f"Cannot parse mutation '{mutation}'")
+    if kind == 'ins':
+        if last_pos != first_pos + 1 or not alternate:
+            raise ValueError(f"Insertion '{mutation}' must name two adjacent residues and the inserted ones")
+        return first_pos, first_pos, '', alternate
+    if kind == 'delins' and not alternate:
+        raise ValueError(f"Cannot parse mutation '{mutation}'")
+    reference = first_aa + (last_aa or '') if last_pos > first_pos else first_aa
+    return first_pos - 1, last_pos, reference, alternate
+
+
+def _check_reference(protein, start, end, reference, mutation):
+    if end > len(protein) or start < 0:
+        raise ValueError(f"Mutation '{mutation}' lies outside the protein ({len(protein)} residues)")
+    # The notation names the first and last deleted residues only
+    named = protein[start] + (protein[end - 1] if end - start > 1 else '') if end > start else ''
+    if reference and reference != named:
+        raise ValueError(f"Mutation '{mutation}' expects '{reference}' but the protein has '{named}'")
+
+
+def mutation_windows(protein, mutation, min_length=MIN_WINDOW_LENGTH, max_length=MAX_WINDOW_LENGTH):
+    """
+    Enumerates the mutant windows that overlap a mutation, with their wild-type
+    counterparts.
+
+    Only `max_length - 1` residues on each side of the mutation are read, so the
+    cost depends on the size of the change, not on the length of the protein. For a
+    deletion, the windows are those spanning the junction it creates.
+
+    The wild-type counterpart of a window is the wild-type window with the same
+    start and length. For substitutions it differs only at the mutated residues;
+    for indels it is the wild-type sequence read from the same start, and is
+    missing when it would run past the end of the protein.
+
+    Parameters:
+        protein (str): Wild-type protein sequence.
+        mutation (str): Mutation (see `parse_mutation`).
+        min_length (int): Shortest window.
+        max_length (int): Longest window.
+
+    Returns:
+        pd.DataFrame: One row per window with 'start' (1-based, in the mutant
+        protein), 'length', 'mutant_peptide' and 'wild_type_peptide'.
+    """
+    protein = str(protein).strip().upper()
+    start, end, reference, alternate = parse_mutation(mutation)
+    _check_reference(protein, start, end, reference, mutation)
+
+    # Local context of the mutant protein, in mutant coordinates offset by `lo`
+    lo = max(0, start - max_length + 1)
+    hi = min(len(protein), end + max_length - 1)
+    mutant = protein[lo:start] + alternate + protein[end:hi]
+    wild_type = protein[lo:min(len(protein), start + len(alternate) + max_length - 1)]
+    mutant_length = len(protein) - (end - start) + len(alternate)
+    # Last start of a window that still touches the change (or spans a deletion)
+    last_touching = start + len(alternate) - 1 if alternate else start - 1
+
+    rows = []
+    for length in range(min_length, max_length + 1):
+        first = max(0, start - length + 1)
+        last = min(last_touching, mutant_length - length)
+        for s in range(first, last + 1):
+            local = s - lo
+            wt_window = wild_type[local:local + length]
+            rows.append((s + 1, length, mutant[local:local + length],
+                         wt_window if len(wt_window) == length else None))
+    return pd.DataFrame(rows, columns=['start', 'length', 'mutant_peptide', 'wild_type_peptide'])
+
+
+def score_variants(model, variants, threshold=0.4, min_length=MIN_WINDOW_LENGTH, max_length=MAX_WINDOW_LENGTH,
+                   top_n=1, **scoring_kwargs):
+    """
+    Scores protein variants by the mutant windows overlapping each mutation.
+
+    Windows are enumerated with `mutation_windows`; all mutant and wild-type
+    windows of all variants are then scored together in one `score_candidates` call,
+    so windows shared between variants (or between a mutant and a wild-type
+    window) go through the model once.
+
+    Parameters:
+        model (keras.Model): Trained model.
+        variants (pd.DataFrame): One row per variant with 'protein' (wild-type
+            sequence) and 'mutation'; optional 'variant_id' and
+            'MHC Restriction - Class' (default 'I').
+        threshold (float): Probability threshold for 'target_strength'.
+        min_length (int): Shortest window.
+        max_length (int): Longest window.
+        top_n (int): Best windows kept per variant.
+        **scoring_kwargs: Passed to `score_candidates` (cache, batch_size, ...).
+
+    Returns:
+        tuple: (best windows per variant, all scored windows). Both have
+        'variant_id', 'mutation', 'start', 'length', 'mutant_peptide',
+        'wild_type_peptide', 'mutant_prob', 'wild_type_prob',
+        'delta' (mutant minus wild-type probability) and 'target_strength'.
+    """
+    variants = variants.reset_index(drop=True)
+    variant_ids = variants['variant_id'] if 'variant_id' in variants.columns else pd.Series(variants.index)
+    mhc_classes = (variants['MHC Restriction - Class'] if 'MHC Restriction - Class' in variants.columns
+                   else pd.Series('I', index=variants.index))
+
+    windows = []
+    for i, (protein, mutation) in enumerate(zip(variants['protein'], variants['mutation'])):
+        variant_windows = mutation_windows(protein, mutation, min_length=min_length, max_length=max_length)
+        variant_windows.insert(0, 'variant_id', variant_ids.iloc[i])
+        variant_windows.insert(1, 'mutation', mutation)
+        variant_windows['variant'] = i
+        variant_windows['MHC Restriction - Class'] = mhc_classes.iloc[i]
+        windows.append(variant_windows)
+    windows = pd.concat(windows, ignore_index=True) if windows else pd.DataFrame(
+        columns=['variant_id', 'mutation', 'start', 'length', 'mutant_peptide', 'wild_type_peptide',
+                 'MHC Restriction - Class', 'variant'])
+    print(f"🧬 {len(variants)} variants -> {len(windows)} mutant windows")
+
+    has_wild_type = windows['wild_type_peptide'].notna().to_numpy()
+    candidates = pd.DataFrame({
+        'peptide': np.concatenate([windows['mutant_peptide'].to_numpy(dtype=object),
+                                   windows['wild_type_peptide'].to_numpy(dtype=object)[has_wild_type]]),
+        'MHC Restriction - Class': np.concatenate([windows['MHC Restriction - Class'].to_numpy(dtype=object),
+                                                   windows['MHC Restriction - Class'].to_numpy(dtype=object)[has_wild_type]])
+    })
+    scored = score_candidates(model, candidates, threshold=threshold, **scoring_kwargs)
+    probs = scored['target_prob'].to_numpy()
+
+    windows['mutant_prob'] = probs[:len(windows)]
+    wild_type_probs = np.full(len(windows), np.nan, dtype=np.float32)
+    wild_type_probs[has_wild_type] = probs[len(windows):]
+    windows['wild_type_prob'] = wild_type_probs
+    windows['delta'] = windows['mutant_prob'] - windows['wild_type_prob']
+    windows['target_strength'] = scored['target_strength'].iloc[:len(windows)].to_numpy()
+
+    # Best windows first within each variant, variants in input order
+    best = (windows.sort_values(['mutant_prob', 'delta'], ascending=False, na_position='last', kind='stable')
+            .groupby('variant', sort=False).head(top_n)
+            .sort_values('variant', kind='stable')
+            .drop(columns='variant').reset_index(drop=True))
+    return best, windows.drop(columns='variant')
@@ -1,74 +1,62 @@
 import joblib
 import numpy as np
-import re
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-from tensorflow.keras.models import load_model
 from sklearn.metrics import (
     precision_score, recall_score, accuracy_score, f1_score,
     confusion_matrix, roc_curve, auc
 )
 
-from src.config import SAVED_MODELS_PATH
-from src.data_processing.sequence_tokenizer import AA_index_tokenizer
-from src.data_processing.cancer_data_cleaning import load_clean_cancer
-from src.data_processing.target_engineering import create_target_features
+from src.model_registry import get_registry
+from src.scoring import score_unique_inputs, scoring_report
+from src.score_cache import ScoreCache
+from src.evaluation import bootstrap_metric_ci
+from src.data_processing.pipeline_prepare_test_set import load_or_create_test_set
 
 
-def predict_new_samples_cnn_multimodal_classificator(tokenizer='AA_index_tokenizer', threshold=0.4):
+def predict_new_samples_cnn_multimodal_classificator(tokenizer=None, threshold=None, use_cache=True,
+                                                       n_bootstrap=0, model_name=None):
     """
     Predicts immunogenic classification outcomes for new peptide samples using a pretrained
     multimodal CNN model with fixed architecture.
 
+    The cancer benchmark is loaded from the prepared test set (see
+    `load_or_create_test_set`), so only the forward pass runs for a new model file.
+    Repeated (peptide, MHC class, mhc_status) inputs are scored once, and scores from
+    previous runs of the same model file are reused from the persistent score cache
+    unless `use_cache` is False.
+
+    The model is taken from the model registry (see `get_registry`) as a
+    `ServingModel`, so it is only loaded and traced once per process; `tokenizer`
+    and `threshold` default to the ones registered for it.
+
+    If `n_bootstrap` is positive, percentile bootstrap confidence intervals of the
+    metrics are computed from that many resamples and printed as a table.
+
     Returns:
         pd.DataFrame: DataFrame with predicted probabilities, binary predictions, and true labels.
     """
     print("📦 Loading model and test data...")
-    model_path = SAVED_MODELS_PATH + "cnn_multimodal_class.h5"
-    model = load_model(model_path)
-
-    cancer_df = load_clean_cancer()
-    target_cancer = create_target_features(cancer_df)
-
-    print("🔍 Filtering valid peptide sequences...")
-    valid_aa_pattern = re.compile(r'^[ACDEFGHIKLMNPQRSTVWY]{9,20}$')
-    target_cancer = target_cancer[target_cancer['Epitope - Name'].apply(lambda x: bool(valid_aa_pattern.match(str(x))))]
-
-    if tokenizer == 'AA_index_tokenizer':
-        print("🧬 Tokenizing peptide sequences...")
-        X_cancer = AA_index_tokenizer(target_cancer)
-
-    print("📊 Encoding categorical features...")
-    categorical_features = ['MHC Restriction - Class', 'mhc_status']
-    expected_ohe_columns = [
-        'MHC Restriction - Class_Class I',
-        'MHC Restriction - Class_Class II',
-        'mhc_status_neg',
-        'mhc_status_pos'
-    ]
-
-    X_cancer_cat = pd.get_dummies(target_cancer, columns=categorical_features)
-
-    drop_cols = [
-        'Epitope - Name', 'target_strength',
-        '1st in vivo Process - Process Type',
-        'Assay - Qualitative Measurement',
-        'averaged_number_positive_subjects_tested'
-    ]
-    X_cancer_cat = X_cancer_cat.drop(columns=[col for col in drop_cols if col in X_cancer_cat.columns], errors='ignore')
-
-    for col in expected_ohe_columns:
-        if col not in X_cancer_cat.columns:
-            X_cancer_cat[col] = 0
-    X_cancer_cat = X_cancer_cat[expected_ohe_columns]
-
-    Y_cancer = target_cancer['target_strength'].astype(int)
+    registry = get_registry()
+    model, model_hash = registry.get_serving(model_name)
+    if threshold is None:
+        threshold = registry.threshold(model_name)
+    tokenizer = tokenizer or registry.tokenizer(model_name)
+
+    test_set = load_or_create_test_set(tokenizer)
+    Y_cancer = pd.Series(test_set['y'])
+    keys = list(zip(test_set['peptides'], test_set['mhc_classes'], test_set['mhc_statuses']))
 
     print("📈 Predicting...")
-    pred_probs = model.predict([X_cancer, X_cancer_cat], verbose=1)
-    y_pred_prob = pred_probs.flatten()
+    cache = ScoreCache() if use_cache else None
+    unique_scores, n_scored = score_unique_inputs(
+        model, keys, lambda idx: [test_set['X_tokenized'][idx], test_set['X_categorical'][idx]],
+        model_hash=model_hash, cache=cache, verbose=1
+    )
+    scoring_report(len(Y_cancer), len(keys), n_scored)
+    y_pred_prob = unique_scores[test_set['inverse']]
     y_pred_label = (y_pred_prob > threshold).astype(int)
 
     # Evaluation
@@ -89,6 +77,12 @@ def predict_new_samples_cnn_multimodal_classificator(tokenizer='AA_index_tokeniz
     print(f"⚖️ F1 Score: {f1:.2f} — Harmonic mean of precision and recall; balances both.")
     print(f"📈 ROC AUC: {roc_auc:.2f} — Probability the model ranks a random positive above a random negative.")
 
+    if n_bootstrap > 0:
+        print()
+        print(f"🎲 95% bootstrap confidence intervals ({n_bootstrap} resamples):")
+        ci_table = bootstrap_metric_ci(Y_cancer, y_pred_prob, threshold=threshold, n_resamples=n_bootstrap)
+        print(ci_table.to_string(index=False, float_format='{:.3f}'.format))
+
     # Confusion matrix
     cm = confusion_matrix(Y_cancer, y_pred_label)
     plt.figure(figsize=(6, 6))
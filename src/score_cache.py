@@ -0,0 +1,148 @@
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from src.config import CACHE_PATH, SCORE_CACHE_MAX_ENTRIES
+
+
+class ScoreCache:
+    """
+    Persistent SQLite cache of model scores.
+
+    Each entry is keyed by the SHA-256 of the model file plus the
+    (peptide, MHC class, mhc_status) input tuple, so a retrained model never
+    reuses scores from a previous one. When the cache grows beyond `max_entries`,
+    the least recently used entries are evicted.
+
+    Parameters:
+        path (str): Location of the SQLite database file.
+        max_entries (int): Maximum number of cached scores kept on disk.
+    """
+
+    def __init__(self, path=CACHE_PATH + "score_cache.sqlite", max_entries=SCORE_CACHE_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scores (
+                model_hash TEXT NOT NULL,
+                peptide TEXT NOT NULL,
+                mhc_class TEXT NOT NULL,
+                mhc_status TEXT NOT NULL,
+                score REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model_hash, peptide, mhc_class, mhc_status)
+            ) WITHOUT ROWID
+            """
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_scores_last_used ON scores (last_used)")
+        self.connection.commit()
+
+    def lookup(self, model_hash, keys):
+        """
+        Looks up cached scores for a list of input tuples.
+
+        Parameters:
+            model_hash (str): Digest of the model file.
+            keys (list of tuple): (peptide, mhc_class, mhc_status) tuples.
+
+        Returns:
+            np.ndarray: Float array aligned with `keys`, NaN where the score is not cached.
+        """
+        scores = np.full(len(keys), np.nan, dtype=np.float32)
+        if not keys:
+            return scores
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS lookup_keys "
+            "(position INTEGER, peptide TEXT, mhc_class TEXT, mhc_status TEXT)"
+        )
+        cursor.execute("DELETE FROM lookup_keys")
+        cursor.executemany(
+            "INSERT INTO lookup_keys VALUES (?, ?, ?, ?)",
+            ((i, str(p), str(c), str(s)) for i, (p, c, s) in enumerate(keys))
+        )
+        rows = cursor.execute(
+            """
+            SELECT k.position, s.score FROM lookup_keys k
+            JOIN scores s ON s.model_hash = ? AND s.peptide = k.peptide
+                AND s.mhc_class = k.mhc_class AND s.mhc_status = k.mhc_status
+            """,
+            (model_hash,)
+        ).fetchall()
+
+        if rows:
+            found = np.array(rows, dtype=np.float64)
+            scores[found[:, 0].astype(np.int64)] = found[:, 1]
+            # Refresh recency of the hits so they survive eviction
+            cursor.execute(
+                """
+                UPDATE scores SET last_used = ? WHERE model_hash = ? AND EXISTS (
+                    SELECT 1 FROM lookup_keys k WHERE k.peptide = scores.peptide
+                    AND k.mhc_class = scores.mhc_class AND k.mhc_status = scores.mhc_status)
+                """,
+                (time.time(), model_hash)
+            )
+        cursor.execute("DELETE FROM lookup_keys")
+        self.connection.commit()
+
+        n_hits = len(rows)
+        self.hits += n_hits
+        self.misses += len(keys) - n_hits
+        return scores
+
+    def store(self, model_hash, keys, scores):
+        """
+        Stores newly computed scores and evicts old entries if the cache is full.
+
+        Parameters:
+            model_hash (str): Digest of the model file.
+            keys (list of tuple): (peptide, mhc_class, mhc_status) tuples.
+            scores (array-like): Scores aligned with `keys`.
+        """
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)",
+            ((model_hash, str(p), str(c), str(s), float(score), now)
+             for (p, c, s), score in zip(keys, scores))
+        )
+        self.connection.commit()
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries beyond `max_entries`.
+        """
+        (n_entries,) = self.connection.execute("SELECT COUNT(*) FROM scores").fetchone()
+        excess = n_entries - self.max_entries
+        if excess > 0:
+            self.connection.execute(
+                """
+                DELETE FROM scores WHERE (model_hash, peptide, mhc_class, mhc_status) IN (
+                    SELECT model_hash, peptide, mhc_class, mhc_status FROM scores
+                    ORDER BY last_used LIMIT ?)
+                """,
+                (excess,)
+            )
+            self.connection.commit()
+
+    def hit_rate(self):
+        """
+        Fraction of lookups answered from the cache since this object was created.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
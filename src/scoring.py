@@ -0,0 +1,240 @@
+import numpy as np
+import pandas as pd
+
+from src.data_processing.feature_engineering import encode_categorical_features, fill_group_II_status
+from src.data_processing.sequence_tokenizer import tokenize
+from src.data_processing.containment_index import load_reference_index
+from src.autotune import inference_batch_size
+
+
+INPUT_KEY_COLUMNS = ['Epitope - Name', 'MHC Restriction - Class', 'mhc_status']
+VALID_PEPTIDE_PATTERN = r'[ACDEFGHIKLMNPQRSTVWY]{8,25}'
+
+
+def deduplicate_inputs(data_frame):
+    """
+    Collapses repeated (peptide, MHC class, mhc_status) tuples.
+
+    Parameters:
+    -----------
+    data_frame : pd.DataFrame
+        DataFrame with the `INPUT_KEY_COLUMNS`.
+
+    Returns:
+    --------
+    tuple
+        - unique_df : pd.DataFrame with one row per distinct input tuple,
+          in order of first appearance.
+        - inverse : np.ndarray mapping every row of `data_frame` to its row in `unique_df`.
+    """
+    inverse = data_frame.groupby(INPUT_KEY_COLUMNS, sort=False, dropna=False).ngroup().to_numpy()
+    unique_df = data_frame.drop_duplicates(subset=INPUT_KEY_COLUMNS).reset_index(drop=True)
+    return unique_df, inverse
+
+
+def encode_inputs(data_frame, tokenizer='AA_index_tokenizer'):
+    """
+    Builds the two model inputs for every row of `data_frame`, embedding peptides
+    with the registered tokenizer `tokenizer` (see `TOKENIZERS`).
+
+    Returns:
+    --------
+    list of np.ndarray
+        [peptide embeddings of shape (n, 25, 20, 1), categorical features of shape (n, 4)]
+    """
+    X_tokenized = tokenize(data_frame, tokenizer)[tokenizer][..., np.newaxis]
+    X_cat = encode_categorical_features(data_frame).to_numpy()
+    return [X_tokenized, X_cat]
+
+
+def predicted_probabilities(pred_probs):
+    """
+    Flattens `model.predict` output to one probability per row. For models with
+    several outputs, such as ensembles (mean, variance), the first output is used.
+    """
+    if isinstance(pred_probs, (list, tuple)):
+        pred_probs = pred_probs[0]
+    return np.asarray(pred_probs).flatten().astype(np.float32)
+
+
+def run_model(model, data_frame, tokenizer='AA_index_tokenizer', batch_size=None, verbose=0):
+    """
+    Tokenizes, encodes and scores every row of `data_frame` with `model`.
+
+    Returns:
+    --------
+    np.ndarray
+        Flat float32 array of predicted probabilities.
+    """
+    pred_probs = model.predict(encode_inputs(data_frame, tokenizer), batch_size=inference_batch_size(batch_size),
+                               verbose=verbose)
+    return predicted_probabilities(pred_probs)
+
+
+def score_unique_inputs(model, keys, encode, model_hash=None, cache=None, batch_size=None, verbose=0):
+    """
+    Scores distinct input tuples, answering from the cache where possible.
+
+    Parameters:
+    -----------
+    model : keras.Model
+        Trained multimodal CNN.
+    keys : list of tuple
+        Distinct (peptide, MHC class, mhc_status) tuples.
+    encode : callable
+        Maps an array of positions in `keys` to the model inputs of those tuples.
+    model_hash : str, optional
+        Digest of the model file, used as part of the cache key.
+    cache : ScoreCache, optional
+        Persistent score cache.
+
+    Returns:
+    --------
+    tuple
+        - scores : np.ndarray of probabilities aligned with `keys`.
+        - n_scored : number of tuples that went through the model.
+    """
+    scores = np.full(len(keys), np.nan, dtype=np.float32)
+    use_cache = cache is not None and model_hash is not None
+    if use_cache:
+        scores = cache.lookup(model_hash, keys)
+
+    missing = np.flatnonzero(np.isnan(scores))
+    if len(missing):
+        pred_probs = model.predict(encode(missing), batch_size=inference_batch_size(batch_size), verbose=verbose)
+        scores[missing] = predicted_probabilities(pred_probs)
+        if use_cache:
+            cache.store(model_hash, [keys[i] for i in missing], scores[missing])
+    return scores, len(missing)
+
+
+def scoring_report(n_rows, n_unique, n_scored, print_report=True):
+    """
+    Summarizes and prints how much work deduplication and caching saved.
+
+    Returns:
+    --------
+    dict
+        Row counts, the dedup ratio and the cache hit rate.
+    """
+    stats = {
+        'n_rows': n_rows,
+        'n_unique': n_unique,
+        'n_scored': n_scored,
+        'dedup_ratio': n_rows / n_unique if n_unique else 1.0,
+        'cache_hit_rate': (n_unique - n_scored) / n_unique if n_unique else 0.0
+    }
+    if print_report:
+        print(f"♻️ {n_rows} rows -> {n_unique} unique inputs (dedup ratio {stats['dedup_ratio']:.2f}), "
+              f"cache hit rate {stats['cache_hit_rate']:.1%}, {n_scored} scored by the model")
+    return stats
+
+
+def score_peptides(model, data_frame, model_hash=None, cache=None,
+                   tokenizer='AA_index_tokenizer', batch_size=None, verbose=0, report=True):
+    """
+    Scores peptides, running the model only once per distinct input tuple.
+
+    Rows are deduplicated on (peptide, MHC class, mhc_status) before the model call,
+    and scores are broadcast back to all rows afterwards. If a `ScoreCache` and the
+    model digest are given, tuples scored in previous runs skip the model entirely.
+
+    Parameters:
+    -----------
+    model : keras.Model
+        Trained multimodal CNN.
+    data_frame : pd.DataFrame
+        Peptides to score, with the `INPUT_KEY_COLUMNS`.
+    model_hash : str, optional
+        Digest of the model file, used as part of the cache key.
+    cache : ScoreCache, optional
+        Persistent score cache.
+    tokenizer : str, optional
+        Tokenizer used to embed peptide sequences.
+    batch_size : int, optional
+        Batch size for `model.predict` (default: the tuned one, see `autotune`).
+    verbose : int, optional
+        Verbosity passed to `model.predict`.
+    report : bool, optional
+        Print the dedup ratio and cache hit rate.
+
+    Returns:
+    --------
+    tuple
+        - scores : np.ndarray of probabilities aligned with the rows of `data_frame`.
+        - stats : dict with row counts, the dedup ratio and the cache hit rate.
+    """
+    unique_df, inverse = deduplicate_inputs(data_frame)
+    keys = list(unique_df[INPUT_KEY_COLUMNS].itertuples(index=False, name=None))
+
+    unique_scores, n_scored = score_unique_inputs(
+        model, keys, lambda idx: encode_inputs(unique_df.iloc[idx], tokenizer),
+        model_hash=model_hash, cache=cache, batch_size=batch_size, verbose=verbose
+    )
+    stats = scoring_report(len(data_frame), len(unique_df), n_scored, print_report=report)
+
+    return unique_scores[inverse], stats
+
+
+def prepare_candidates(data_frame, reference_index=None):
+    """
+    Normalizes a table of candidate peptides into the model's input columns.
+
+    - A 'peptide' column is accepted in place of 'Epitope - Name'.
+    - 'MHC Restriction - Class' defaults to 'I'; values like 'Class II' become 'II'.
+    - Peptides are upper-cased, and those that are not 8 to 25 standard amino acids
+      are flagged in a 'valid' column instead of being dropped.
+    - If 'mhc_status' is missing, it is looked up in the reference containment
+      index (`reference_index`, or the one built by `update_reference_index`), so it
+      does not depend on the other candidates. Without an index, it is computed with
+      `fill_group_II_status` among the valid candidates of `data_frame`.
+
+    Returns:
+    --------
+    pd.DataFrame
+        Copy of `data_frame` with the `INPUT_KEY_COLUMNS` and 'valid'.
+    """
+    frame = data_frame.rename(columns={'peptide': 'Epitope - Name'})
+    frame['Epitope - Name'] = frame['Epitope - Name'].astype(str).str.strip().str.upper()
+    if 'MHC Restriction - Class' not in frame.columns:
+        frame['MHC Restriction - Class'] = 'I'
+    frame['MHC Restriction - Class'] = (frame['MHC Restriction - Class'].fillna('I').astype(str)
+                                        .str.replace('Class ', '', regex=False).str.strip())
+    frame['valid'] = frame['Epitope - Name'].str.fullmatch(VALID_PEPTIDE_PATTERN)
+
+    if 'mhc_status' not in frame.columns:
+        frame['mhc_status'] = None
+        valid = frame[frame['valid']]
+        if reference_index is None:
+            reference_index = load_reference_index()
+        if len(valid) and reference_index is not None:
+            frame.loc[frame['valid'], 'mhc_status'] = reference_index.mhc_status(
+                valid['Epitope - Name'].to_numpy(), valid['MHC Restriction - Class'].to_numpy()
+            )
+        elif len(valid):
+            frame.loc[frame['valid'], 'mhc_status'] = fill_group_II_status(valid[INPUT_KEY_COLUMNS[:2]].copy())['mhc_status']
+    return frame
+
+
+def score_candidates(model, data_frame, threshold=0.4, model_hash=None, cache=None,
+                     tokenizer='AA_index_tokenizer', batch_size=None, report=False, reference_index=None):
+    """
+    Scores a table of candidate peptides (see `prepare_candidates`).
+
+    Returns:
+    --------
+    pd.DataFrame
+        The prepared candidates with 'target_prob' and the binary 'target_strength'
+        at `threshold`; both are missing for invalid peptides.
+    """
+    frame = prepare_candidates(data_frame, reference_index=reference_index)
+    valid = frame['valid'].to_numpy()
+
+    probs = np.full(len(frame), np.nan, dtype=np.float32)
+    if valid.any():
+        probs[valid], _ = score_peptides(model, frame[valid], model_hash=model_hash, cache=cache,
+                                         tokenizer=tokenizer, batch_size=batch_size, report=report)
+
+    frame['target_prob'] = probs
+    frame['target_strength'] = pd.array(np.where(valid, probs > threshold, pd.NA), dtype='Int8')
+    return frame
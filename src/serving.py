@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+from collections import Counter
+
+import numpy as np
+import tensorflow as tf
+
+from src.config import SERVING_BUCKETS, SERVING_JIT_COMPILE
+
+
+SERVING_CONFIG_FILE = "serving.json"
+
+
+def is_serving_export(path):
+    """
+    True if `path` is a directory written by `ServingModel.export`.
+    """
+    return os.path.isfile(os.path.join(path, SERVING_CONFIG_FILE))
+
+
+class ServingModel:
+    """
+    Inference wrapper for long-running services, with a compiled forward pass that
+    is traced once.
+
+    Calls go through a `tf.function` with a fixed input signature (any batch size),
+    so varying request sizes never trigger a new trace. Each request is split into
+    batches of at most the largest bucket, and each batch is padded with zeros up to
+    the smallest bucket that fits, so the forward pass only ever sees
+    `len(buckets)` batch shapes: with XLA (`jit_compile=True`), that is at most one
+    compilation per bucket, all done by `warmup`. Small requests skip the
+    per-call setup of `model.predict` entirely.
+
+    `predict` mirrors `model.predict`, so a `ServingModel` can be passed wherever the
+    scorers expect a Keras model. `trace_count` counts traces of the forward pass
+    and `bucket_calls` the batches run per bucket.
+
+    Parameters:
+        model (keras.Model): Trained model (None when `function` is given).
+        buckets (sequence of int): Padded batch sizes.
+        jit_compile (bool): Compile the forward pass with XLA.
+        function (callable): Already compiled forward pass, e.g. a loaded export.
+        input_shapes (tuple): Shapes of one embedding and one categorical row
+            (taken from `model` when it is given).
+    """
+
+    def __init__(self, model=None, buckets=SERVING_BUCKETS, jit_compile=SERVING_JIT_COMPILE, function=None,
+                 input_shapes=None):
+        self.model = model
+        self.buckets = tuple(sorted(int(b) for b in buckets))
+        self.jit_compile = jit_compile
+        self.trace_count = 0
+        self.bucket_calls = Counter()
+        self._lock = threading.Lock()
+
+        if model is not None:
+            input_shapes = tuple(tuple(model_input.shape[1:]) for model_input in model.inputs)
+        self.input_shapes = tuple(tuple(shape) for shape in input_shapes)
+        if function is None:
+            input_signature = [tf.TensorSpec((None,) + self.input_shapes[0], tf.float32, name="image_input"),
+                               tf.TensorSpec((None,) + self.input_shapes[1], tf.float32, name="categorical_input")]
+            function = tf.function(self._forward, input_signature=input_signature, jit_compile=jit_compile)
+        self._function = function
+
+    def _forward(self, image, categorical):
+        # Python side effects only run while tracing
+        self.trace_count += 1
+        return self.model([image, categorical], training=False)
+
+    def bucket_size(self, n_rows):
+        """
+        Smallest bucket holding `n_rows` rows (the largest bucket if none does).
+        """
+        for bucket in self.buckets:
+            if n_rows <= bucket:
+                return bucket
+        return self.buckets[-1]
+
+    def _run_padded(self, image, categorical):
+        n_rows = len(image)
+        bucket = self.bucket_size(n_rows)
+        if n_rows < bucket:
+            image = np.concatenate([image, np.zeros((bucket - n_rows,) + image.shape[1:], dtype=np.float32)])
+            categorical = np.concatenate(
+                [categorical, np.zeros((bucket - n_rows,) + categorical.shape[1:], dtype=np.float32)])
+        outputs = self._function(tf.constant(image), tf.constant(categorical))
+        with self._lock:
+            self.bucket_calls[bucket] += 1
+        return tf.nest.map_structure(lambda output: output.numpy()[:n_rows], outputs)
+
+    def predict(self, inputs, batch_size=None, verbose=0):
+        """
+        Runs the model on [embeddings, categorical features] like `model.predict`.
+
+        `batch_size` and `verbose` are accepted for compatibility; batches are set by
+        the buckets.
+
+        Returns:
+            np.ndarray or list of np.ndarray: The model outputs for every row.
+        """
+        image = np.asarray(inputs[0], dtype=np.float32)
+        categorical = np.asarray(inputs[1], dtype=np.float32)
+        largest = self.buckets[-1]
+        batches = [self._run_padded(image[start:start + largest], categorical[start:start + largest])
+                   for start in range(0, len(image), largest)]
+        if not batches:
+            batches = [self._run_padded(image[:0], categorical[:0])]
+        return tf.nest.map_structure(lambda *parts: np.concatenate(parts), *batches)
+
+    def warmup(self):
+        """
+        Runs every bucket once, so tracing and XLA compilation happen before the
+        first request.
+        """
+        image_shape, categorical_shape = self.input_shapes
+        for bucket in self.buckets:
+            self._run_padded(np.zeros((bucket,) + image_shape, dtype=np.float32),
+                             np.zeros((bucket,) + categorical_shape, dtype=np.float32))
+        return self
+
+    def export(self, path):
+        """
+        Writes the forward pass as a SavedModel with a 'serve' endpoint, plus the
+        buckets in 'serving.json'. Load it with `load_serving_model`.
+        """
+        from keras.export import ExportArchive
+
+        if self.model is None:
+            raise ValueError("Only a ServingModel built from a Keras model can be exported.")
+        archive = ExportArchive()
+        archive.track(self.model)
+        archive.add_endpoint('serve', self._function)
+        archive.write_out(path, verbose=False)
+        config = {
+            'buckets': list(self.buckets),
+            'jit_compile': self.jit_compile,
+            'input_shapes': [list(shape) for shape in self.input_shapes]
+        }
+        with open(os.path.join(path, SERVING_CONFIG_FILE), 'w') as handle:
+            json.dump(config, handle, indent=2)
+        print(f"✅ Serving model exported to {path}")
+
+
+def load_serving_model(path):
+    """
+    Loads a `ServingModel` written by `ServingModel.export` (usable as a
+    `ModelRegistry` loader). The restored endpoint is already compiled, so it is
+    never traced again.
+    """
+    with open(os.path.join(path, SERVING_CONFIG_FILE)) as handle:
+        config = json.load(handle)
+    restored = tf.saved_model.load(path)
+    serving = ServingModel(buckets=config['buckets'], jit_compile=config['jit_compile'], function=restored.serve,
+                           input_shapes=config['input_shapes'])
+    # The endpoint only lives as long as the restored object
+    serving.restored = restored
+    return serving
@@ -1,52 +1,171 @@
 import os
+from datetime import datetime
 import joblib
+import numpy as np
 from tensorflow.keras.callbacks import EarlyStopping
-from models.cnn_multimodal_classifier import CNN_multimodal_class
-from src.data_processing.pipeline_prepare_training_set import separate_train_val
+from tensorflow.keras.models import load_model
+from tensorflow.keras.optimizers import Adam
+from src.hyperparameter_search import build_model
+from src.checkpointing import TrainingCheckpoint
+from src.data_processing.pipeline_prepare_training_set import (
+    separate_train_val, load_or_create_training_data, load_training_row_keys, update_training_set
+)
 import matplotlib.pyplot as plt
-from src.config import SAVED_MODELS_PATH
+from src.config import SAVED_MODELS_PATH, PROCESSED_DATA_PATH
+from src.utils import manifest_path_for
 
-def train_model_cnn_multimodal_classificator(save_path=SAVED_MODELS_PATH+"cnn_multimodal_class.h5"):
 
-    # Load data splits
+def write_training_manifest(model_path, mode, tokenizer='AA_index_tokenizer'):
+    """
+    Records which training rows a saved model has seen, the weight scaler it used
+    and the tokenizer its inputs were encoded with.
+
+    Parameters:
+        model_path (str): Path of the saved model.
+        mode (str): 'full' or 'incremental'.
+        tokenizer (str): Registered tokenizer name.
+    """
+    manifest = {
+        'row_keys': np.sort(load_training_row_keys()),
+        'weight_scaler': joblib.load(PROCESSED_DATA_PATH + 'weight_scaler.joblib'),
+        'tokenizer': tokenizer,
+        'mode': mode,
+        'trained_at': datetime.now().isoformat(timespec='seconds')
+    }
+    joblib.dump(manifest, manifest_path_for(model_path), compress=3)
+
+
+def load_training_manifest(model_path):
+    path = manifest_path_for(model_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"No training manifest at {path}; run train_model_cnn_multimodal_classificator() first."
+        )
+    return joblib.load(path)
+
+
+def train_model_cnn_multimodal_classificator(save_path=SAVED_MODELS_PATH+"cnn_multimodal_class.h5", grouping='random',
+                                             resume=False, checkpoint_every=1, hyperparameters=None,
+                                             tokenizer='AA_index_tokenizer'):
+    """
+    Trains the multimodal CNN from scratch and saves it to `save_path`.
+
+    Training state is checkpointed every `checkpoint_every` epochs next to the model
+    (see `TrainingCheckpoint`). With `resume=True`, training continues from the last
+    checkpoint instead of starting over, e.g. after the node was preempted. The
+    checkpoint is removed once the final model is saved.
+
+    `hyperparameters` (e.g. the best configuration from `run_hyperparameter_search`)
+    overrides the default architecture, optimizer, learning rate and batch size.
+
+    `tokenizer` selects the saved peptide encoding to train on (see `TOKENIZERS`);
+    it is recorded in the model's manifest, and the same name must be passed when
+    scoring with the model.
+    """
+
+    # Load data splits ('homology' keeps similar peptides on the same side of the split)
     X_train, X_pca_val,  \
     X_cat_train, X_cat_val, \
     y_train, y_val, \
-    w_train, w_val = separate_train_val()
+    w_train, w_val = separate_train_val(grouping=grouping, tokenizer=tokenizer)
 
-    model = CNN_multimodal_class()
-
-    model.compile(
-        optimizer='adam',
-        loss='binary_crossentropy',
-        metrics=['accuracy']
-    )
+    hyperparameters = hyperparameters or {}
+    model = build_model(hyperparameters)
 
     es = EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)
+    checkpoint = TrainingCheckpoint(os.path.splitext(save_path)[0] + ".ckpt.joblib",
+                                    early_stopping=es, every=checkpoint_every)
+    initial_epoch = checkpoint.restore(model) if resume else 0
 
-    history = model.fit(
+    model.fit(
     x=[X_train, X_cat_train],
     y=y_train,
     sample_weight=w_train,
     validation_data=([X_pca_val, X_cat_val], y_val, w_val),
     epochs=60,
-    callbacks=[es],
+    batch_size=hyperparameters.get('batch_size', 32),
+    initial_epoch=initial_epoch,
+    callbacks=[es, checkpoint],
     verbose=1
     )
 
     # Save the trained model
     os.makedirs(os.path.dirname(save_path), exist_ok=True)
     model.save(save_path)
+    write_training_manifest(save_path, mode='full', tokenizer=tokenizer)
+    checkpoint.clear()
 
-    # Plot loss curves
+    # Plot loss curves (including epochs run before a resume)
+    history = checkpoint.history
     plt.figure(figsize=(12, 5))
-    plt.plot(history.history['loss'], label='Loss training')
-    plt.plot(history.history['val_loss'], label='Loss validation')
+    plt.plot(history['loss'], label='Loss training')
+    plt.plot(history['val_loss'], label='Loss validation')
     plt.title('Loss Curve')
     plt.xlabel('Epoch')
     plt.ylabel('Loss')
     plt.legend()
     plt.show()
 
+def finetune_model_cnn_multimodal_classificator(model_path=SAVED_MODELS_PATH+"cnn_multimodal_class.h5",
+                                                replay_ratio=2.0, epochs=5, learning_rate=1e-4, random_state=42):
+    """
+    Warm-starts the saved model on rows that are new since its last training.
+
+    The saved training set is first brought up to date with `update_training_set`,
+    which only tokenizes new peptides and scales their weights with the scaler
+    recorded in the model's manifest. The model is then fine-tuned on the new rows
+    mixed with a random replay sample of previously seen rows, which limits
+    forgetting, and the manifest is updated.
+
+    Parameters:
+        model_path (str): Saved model to update in place.
+        replay_ratio (float): Number of replayed old rows per new row.
+        epochs (int): Maximum number of fine-tuning epochs.
+        learning_rate (float): Adam learning rate, lower than for training from scratch.
+        random_state (int): Seed for the replay sample.
+    """
+    manifest = load_training_manifest(model_path)
+    tokenizer = manifest.get('tokenizer', 'AA_index_tokenizer')
+    update_training_set(manifest['weight_scaler'], tokenizer)
+
+    X, X_categorical, Y, sample_weights = load_or_create_training_data(tokenizer)
+    row_keys = load_training_row_keys()
+
+    is_new = ~np.isin(row_keys, manifest['row_keys'])
+    new_idx = np.flatnonzero(is_new)
+    if len(new_idx) == 0:
+        print("✅ No new rows since the last training, nothing to do.")
+        return
+
+    rng = np.random.default_rng(random_state)
+    old_idx = np.flatnonzero(~is_new)
+    n_replay = min(len(old_idx), int(replay_ratio * len(new_idx)))
+    idx = rng.permutation(np.concatenate([new_idx, rng.choice(old_idx, size=n_replay, replace=False)]))
+    print(f"🔁 Fine-tuning on {len(new_idx)} new rows + {n_replay} replayed rows")
+
+    model = load_model(model_path)
+    model.compile(
+        optimizer=Adam(learning_rate=learning_rate),
+        loss='binary_crossentropy',
+        metrics=['accuracy']
+    )
+
+    es = EarlyStopping(monitor='val_loss', patience=2, restore_best_weights=True)
+
+    model.fit(
+        x=[np.asarray(X)[idx].astype(np.float32)[..., np.newaxis],
+           np.asarray(X_categorical)[idx].astype(np.float32)],
+        y=np.asarray(Y)[idx].astype(np.float32),
+        sample_weight=np.asarray(sample_weights)[idx].astype(np.float32),
+        validation_split=0.1,
+        epochs=epochs,
+        callbacks=[es],
+        verbose=1
+    )
+
+    model.save(model_path)
+    write_training_manifest(model_path, mode='incremental', tokenizer=tokenizer)
+
+
 if __name__ == "__main__":
     train_model_cnn_multimodal_classificator()
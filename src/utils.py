@@ -1 +1,89 @@
+import hashlib
+import os
 
+
+_FILE_HASHES = {}
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """
+    Computes the SHA-256 digest of a file, reading it in chunks.
+
+    Digests are memoized per (path, size, mtime) so that repeated calls on an
+    unchanged model file do not re-read it from disk.
+
+    Parameters:
+        path (str): Path to the file.
+        chunk_size (int): Number of bytes read per iteration.
+
+    Returns:
+        str: Hexadecimal SHA-256 digest of the file content.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _FILE_HASHES:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(chunk_size), b''):
+                digest.update(chunk)
+        _FILE_HASHES[key] = digest.hexdigest()
+    return _FILE_HASHES[key]
+
+
+def manifest_path_for(model_path):
+    """
+    Path of the training manifest written next to a saved model (see
+    `write_training_manifest`).
+    """
+    return os.path.splitext(model_path)[0] + ".manifest.joblib"
+
+
+def path_sha256(path):
+    """
+    Computes the SHA-256 digest of a file, or of a directory (such as an exported
+    SavedModel) from the relative names and digests of all its files.
+
+    Returns:
+        str: Hexadecimal SHA-256 digest.
+    """
+    if not os.path.isdir(path):
+        return file_sha256(path)
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).encode())
+            digest.update(file_sha256(file_path).encode())
+    return digest.hexdigest()
+
+
+def file_fingerprint(path):
+    """
+    Records the size, modification time and SHA-256 digest of a file.
+
+    Returns:
+        dict: {'size': int, 'mtime_ns': int, 'sha256': str}
+    """
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': file_sha256(path)}
+
+
+def fingerprint_matches(path, recorded):
+    """
+    Checks whether a file still matches a fingerprint from `file_fingerprint`.
+
+    Size and modification time are compared first; the content digest is only
+    recomputed when the file was touched without changing size.
+
+    Returns:
+        bool: True if the file content is unchanged.
+    """
+    if not os.path.exists(path):
+        return False
+    stat = os.stat(path)
+    if stat.st_size != recorded['size']:
+        return False
+    if stat.st_mtime_ns == recorded['mtime_ns']:
+        return True
+    return file_sha256(path) == recorded['sha256']
@@ -0,0 +1,271 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from tensorflow.keras import layers
+
+from src.ensemble import member_weights
+from src.scoring import prepare_candidates
+from src.data_processing.feature_engineering import encode_categorical_features
+from src.data_processing.peptide_store import _ASCII_TO_INDEX
+from src.data_processing.sequence_tokenizer import tokenizer_lookup_table
+
+
+MAX_PEPTIDE_LENGTH = 25
+
+
+def _shift(array, offset):
+    """
+    Returns `array[q + offset]` for every q, with zeros past the end.
+    """
+    if offset == 0:
+        return array
+    return np.concatenate([array[offset:], np.zeros((offset,) + array.shape[1:], dtype=array.dtype)])
+
+
+def _relu(array):
+    return np.maximum(array, 0, out=array)
+
+
+class IncrementalWindowScorer:
+    """
+    Scores many overlapping windows of the same protein sequences with a trained
+    `CNN_multimodal_class` model, sharing the convolution work between windows.
+
+    Peptides are padded at the end, so every row of the second convolution of a
+    window starting at residue s is one of:
+
+    - an interior row, which sees only residues of the window and depends only on
+      its position s + r in the protein;
+    - a tail row, which sees the last t residues of the window and padding, and
+      depends only on s + r and t;
+    - a padding row, which is the same for every window.
+
+    Interior and tail rows are computed once per protein position, and the pooled
+    interior rows are pushed through their slice of the dense layer once per
+    position as well, so each window only sums precomputed partial results and
+    multiplies its few boundary rows. Batch normalization is folded into the
+    convolutions and dropout is omitted, as in inference.
+
+    Parameters:
+        model (keras.Model): Trained `CNN_multimodal_class` model.
+        tokenizer (str): Registered tokenizer the model was trained with (see `TOKENIZERS`).
+    """
+
+    def __init__(self, model, tokenizer='AA_index_tokenizer'):
+        convs = [layer for layer in model.layers if isinstance(layer, layers.Conv2D)]
+        pools = [layer for layer in model.layers if isinstance(layer, layers.MaxPool2D)]
+        if len(convs) != 2 or len(pools) != 1 or tuple(pools[0].pool_size) != (2, 1) \
+                or tuple(pools[0].strides) != (2, 1) or convs[1].kernel_size[1] != 1:
+            raise ValueError("IncrementalWindowScorer only supports CNN_multimodal_class models; "
+                             "use score_candidates for other models.")
+        _, weights = member_weights(model)
+
+        self.lookup_table = tokenizer_lookup_table(tokenizer)
+        conv1_kernel = weights['conv1_kernel'].astype(np.float32)
+        self.k1, self.kw1, _, self.f1 = conv1_kernel.shape
+        # (kw1, k1 * f1): one product gives the contribution of a residue to every kernel row
+        self.conv1_kernel = conv1_kernel[:, :, 0, :].transpose(1, 0, 2).reshape(self.kw1, self.k1 * self.f1)
+        self.conv1_bias = weights['conv1_bias'].astype(np.float32)
+        self.conv2_kernel = weights['conv2_kernel'][:, 0].astype(np.float32)
+        self.k2, _, self.f2 = self.conv2_kernel.shape
+        self.conv2_bias = weights['conv2_bias'].astype(np.float32)
+
+        # Receptive field of a second-layer row, in residues
+        self.span = self.k1 + self.k2 - 1
+        self.width = self.lookup_table.shape[1] - self.kw1 + 1
+        self.n_pooled = (MAX_PEPTIDE_LENGTH - self.span + 1) // 2
+        self.row_features = self.width * self.f2
+
+        dense_kernel = weights['dense_kernel'].astype(np.float32)
+        self.units = dense_kernel.shape[1]
+        self.dense_kernel = dense_kernel.reshape(self.n_pooled, self.row_features, self.units)
+        self.dense_bias = weights['dense_bias'].astype(np.float32)
+        self.cat_kernel = weights['cat_kernel'].astype(np.float32)
+        self.cat_bias = weights['cat_bias'].astype(np.float32)
+        output_kernel = weights['output_kernel'][:, 0].astype(np.float32)
+        self.output_kernel, self.output_cat_kernel = output_kernel[:self.units], output_kernel[self.units:]
+        self.output_bias = float(weights['output_bias'][0])
+
+        # Rows that see only padding are the same for every window
+        pad_conv1 = _relu(self.conv1_bias.copy())
+        self.pad_row = _relu(pad_conv1 @ self.conv2_kernel.sum(axis=0) + self.conv2_bias)
+        pad_contributions = np.einsum('f,jfu->ju', np.tile(self.pad_row, self.width), self.dense_kernel)
+        # pad_suffix[j]: contribution of pooled rows j.. when they are all padding
+        self.pad_suffix = np.concatenate([np.cumsum(pad_contributions[::-1], axis=0)[::-1],
+                                          np.zeros((1, self.units), dtype=np.float32)])
+
+    def _pooled_rows(self, length):
+        """
+        Splits the pooled rows of a window of `length` residues into interior rows,
+        boundary rows (with the number of residues they still see) and the index of
+        the first padding row.
+        """
+        rows = np.arange(self.n_pooled)
+        remaining = length - 2 * rows
+        n_interior = int(np.sum(remaining > self.span))
+        boundary = [(j, int(remaining[j])) for j in rows if 1 <= remaining[j] <= self.span]
+        first_pad = n_interior + len(boundary)
+        return n_interior, boundary, first_pad
+
+    def _second_layer_rows(self, residues):
+        """
+        Computes, for every start position q of the residue stream, the second-layer
+        rows that see t residues from q on, for t = 1..span (t = span is the interior row).
+
+        Returns:
+            list of np.ndarray: Index t holds an array of shape (n, width, f2); index 0 is None.
+        """
+        embedded = self.lookup_table[residues]
+        patches = sliding_window_view(embedded, self.kw1, axis=1)
+        n = len(residues)
+        contributions = (patches.reshape(-1, self.kw1) @ self.conv1_kernel).reshape(n, self.width, self.k1, self.f1)
+
+        # first[u][q]: first-layer row at q that sees u residues (u = 0 is pure padding)
+        first = [None]
+        partial = np.broadcast_to(self.conv1_bias, (n, self.width, self.f1)).copy()
+        for u in range(1, self.k1 + 1):
+            partial += _shift(contributions[:, :, u - 1], u - 1)
+            first.append(_relu(partial.copy()))
+        pad_first = _relu(self.conv1_bias.copy())
+
+        second = [None]
+        for t in range(1, self.span + 1):
+            total = np.broadcast_to(self.conv2_bias, (n, self.width, self.f2)).copy()
+            for i in range(self.k2):
+                u = min(max(t - i, 0), self.k1)
+                if u == 0:
+                    total += pad_first @ self.conv2_kernel[i]
+                else:
+                    total += _shift(first[u], i) @ self.conv2_kernel[i]
+            second.append(_relu(total))
+        return second
+
+    def _boundary_row(self, second, starts, remaining):
+        row = second[remaining][starts]
+        below = second[remaining - 1][starts + 1] if remaining > 1 else self.pad_row
+        return np.maximum(row, below).reshape(len(starts), self.row_features)
+
+    def score(self, residues, starts, lengths, categorical):
+        """
+        Scores windows of a residue stream.
+
+        Parameters:
+            residues (np.ndarray): Residue indices (see `PeptideStore.index_matrix`)
+                of the concatenated sequences. Windows must not extend past the end.
+            starts (np.ndarray): Start of every window in `residues`.
+            lengths (np.ndarray): Length of every window (at most 25).
+            categorical (np.ndarray): Categorical features of every window, (n, 4).
+
+        Returns:
+            np.ndarray: Float32 probabilities, the same as the model's up to rounding.
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        second = self._second_layer_rows(np.asarray(residues))
+        interior = np.maximum(second[self.span], _shift(second[self.span], 1)).reshape(len(residues), -1)
+
+        # interior_sum[q]: dense-layer contribution of the first n_done pooled interior
+        # rows of a window starting at q, grown row by row as longer windows need them
+        interior_sum = np.zeros((len(residues), self.units), dtype=np.float32)
+        n_done = 0
+        hidden = np.empty((len(starts), self.units), dtype=np.float32)
+        for length in np.unique(lengths):
+            windows = np.flatnonzero(lengths == length)
+            window_starts = starts[windows]
+            n_interior, boundary, first_pad = self._pooled_rows(length)
+            for j in range(n_done, n_interior):
+                interior_sum += _shift(interior @ self.dense_kernel[j], 2 * j)
+            n_done = max(n_done, n_interior)
+
+            total = interior_sum[window_starts] + (self.dense_bias + self.pad_suffix[first_pad])
+            for j, remaining in boundary:
+                total += self._boundary_row(second, window_starts + 2 * j, remaining) @ self.dense_kernel[j]
+            hidden[windows] = _relu(total)
+
+        categorical_hidden = _relu(np.asarray(categorical, dtype=np.float32) @ self.cat_kernel + self.cat_bias)
+        logits = hidden @ self.output_kernel + categorical_hidden @ self.output_cat_kernel + self.output_bias
+        return (1.0 / (1.0 + np.exp(-logits))).astype(np.float32)
+
+
+def _window_starts(offsets, sizes, length):
+    """
+    Starts of every window of `length` residues inside each sequence.
+
+    Returns:
+        tuple of np.ndarray: Sequence index and start (in the stream) of every window.
+    """
+    n_windows = np.maximum(sizes - length + 1, 0)
+    owners = np.repeat(np.arange(len(sizes)), n_windows)
+    positions = np.arange(n_windows.sum()) - np.repeat(np.cumsum(n_windows) - n_windows, n_windows)
+    return owners, offsets[owners] + positions
+
+
+def scan_proteins(model, proteins, lengths=range(8, 12), mhc_class='I', threshold=0.4,
+                  reference_index=None, chunk_residues=16_384, scorer=None):
+    """
+    Scores every window of the given lengths in every protein (a dense proteome scan).
+
+    Windows are scored with `IncrementalWindowScorer`, which computes the
+    convolutions once per protein position instead of once per window. Proteins are
+    processed in chunks of about `chunk_residues` residues to bound memory. Windows
+    are annotated like `score_candidates` (see `prepare_candidates`); windows with
+    non-standard residues are kept with 'valid' False and no score.
+
+    Parameters:
+        model (keras.Model): Trained `CNN_multimodal_class` model.
+        proteins (pd.DataFrame): 'id' and 'sequence' columns ('peptide' is accepted
+            for 'sequence', as read by `read_candidates` from FASTA).
+        lengths (iterable of int): Window lengths (8 to 25).
+        mhc_class (str): MHC class of every window.
+        threshold (float): Probability threshold for 'target_strength'.
+        reference_index (ContainmentIndex): Index for 'mhc_status' (see `prepare_candidates`).
+        chunk_residues (int): Residues per chunk.
+        scorer (IncrementalWindowScorer): Reused scorer (built from `model` if None).
+
+    Returns:
+        pd.DataFrame: One row per window with 'id', 'start' (1-based), 'length', the
+        prepared candidate columns, 'target_prob' and 'target_strength'.
+    """
+    scorer = scorer or IncrementalWindowScorer(model)
+    lengths = sorted(set(int(length) for length in lengths))
+    sequences = proteins['sequence'] if 'sequence' in proteins.columns else proteins['peptide']
+    sequences = sequences.astype(str).str.strip().str.upper().to_numpy()
+    ids = proteins['id'].to_numpy() if 'id' in proteins.columns else np.arange(len(proteins))
+    sizes = np.fromiter((len(s) for s in sequences), dtype=np.int64, count=len(sequences))
+
+    # Group whole proteins into chunks of about `chunk_residues` residues
+    chunk_ids = np.cumsum(sizes) // chunk_residues
+    results = []
+    for chunk in np.unique(chunk_ids):
+        members = np.flatnonzero(chunk_ids == chunk)
+        stream = ''.join(sequences[members])
+        residues = _ASCII_TO_INDEX[np.frombuffer(stream.encode('ascii', errors='replace'), dtype=np.uint8)]
+        offsets = np.concatenate([[0], np.cumsum(sizes[members])[:-1]]).astype(np.int64)
+
+        owners, starts, window_lengths = [], [], []
+        for length in lengths:
+            owner, start = _window_starts(offsets, sizes[members], length)
+            owners.append(owner)
+            starts.append(start)
+            window_lengths.append(np.full(len(start), length, dtype=np.int64))
+        owners, starts, window_lengths = (np.concatenate(a) for a in (owners, starts, window_lengths))
+
+        frame = prepare_candidates(pd.DataFrame({
+            'id': ids[members][owners],
+            'start': starts - offsets[owners] + 1,
+            'length': window_lengths,
+            'peptide': [stream[s:s + n] for s, n in zip(starts, window_lengths)],
+            'MHC Restriction - Class': mhc_class
+        }), reference_index=reference_index)
+        valid = frame['valid'].to_numpy(dtype=bool)
+
+        probs = np.full(len(frame), np.nan, dtype=np.float32)
+        if valid.any():
+            categorical = encode_categorical_features(frame[valid]).to_numpy()
+            probs[valid] = scorer.score(residues, starts[valid], window_lengths[valid], categorical)
+        frame['target_prob'] = probs
+        frame['target_strength'] = pd.array(np.where(valid, probs > threshold, pd.NA), dtype='Int8')
+        results.append(frame)
+        print(f"🔬 Scanned {len(members)} proteins: {len(frame)} windows")
+
+    return pd.concat(results, ignore_index=True) if results else pd.DataFrame()